@@ -1,9 +1,24 @@
-import noise
+import math
+
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 
+from terrain_gen.clipmap import Clipmap
+from terrain_gen.config import NoiseConfig, random_seed
+from terrain_gen.culling import FrustumCuller
+from terrain_gen.lod import LodTerrain
+from terrain_gen.loop import FixedStepLoop
+from terrain_gen.mesh import displaced_range
+from terrain_gen.overlay import draw_text
+from terrain_gen.pipeline import ScrollingTerrain
+from terrain_gen.profiling import Profiler
+from terrain_gen.renderer import ClipmapRenderer, HeightfieldRenderer, MeshRenderer
+from terrain_gen.scheduler import TileScheduler
+from terrain_gen.store import TileStore
+from terrain_gen.tiles import TiledWorld
+
 movement_speed = 0.3
 rotation_angle = 0.3
 class Vector(object):
@@ -24,83 +39,185 @@ scale = 15.0
 height_scale = 10
 
 octaves = 8
-octaveOffsets = []
 
 persistence = 0.5
 lacunarity = 2
 
 flattening_threshold = 0.0125
 
-for i in range(octaves):
-    octaveOffsets.append(
-        Vector(np.random.randint(-10000, 10000), np.random.randint(-10000, 10000)))
+# stream only heights and let the vertex shader displace the grid, instead of full vertices
+gpu_displacement = True
+# blend between the color bands instead of hard edges
+smooth_colors = False
+# levels of detail: above 0, draw view_distance cells around the camera as patches that get
+# coarser with distance instead of the terrain_size grid, full detail up to lod_distance
+lod_levels = 0
+view_distance = 1000
+lod_distance = 128
+# clipmap levels: above 0, draw clipmap_levels nested grids of clipmap_size cells around the
+# camera instead, each twice as coarse and as wide as the one inside it (takes over from lod_levels)
+clipmap_levels = 0
+clipmap_size = 128
+# cells per side of the blocks the terrain_size grid is frustum culled in
+cull_block = 25
+# 'p' toggles the timing overlay; set profile_output to a .csv or .json path to
+# record every frame from the start and write them there on exit
+show_profile = False
+profile_output = None
+profiler = Profiler(enabled=profile_output is not None, record=profile_output is not None)
+# the terrain scrolls by movement_speed per tick, tick_rate ticks a second whatever the frame
+# rate; tile and patch work stops after work_budget seconds a frame and carries on the next
+tick_rate = 60
+work_budget = 0.008
+loop = FixedStepLoop(1.0 / tick_rate, budget=work_budget)
+
+# the same seed gives the same world on every launch, None a new one each time
+seed = 0
+# set to e.g. "terrain.tiles" to bake generated tiles there and read them back on the
+# next launch with the same noise settings instead of regenerating them
+tile_store_path = None
+noise = NoiseConfig(random_seed() if seed is None else seed, octaves, scale, persistence, lacunarity)
 
 terrain_size = 200
-terrain = []
 offset = Vector(0, 0, 50)
-normals = np.zeros((terrain_size, terrain_size, 3), dtype=np.float32)
+# offset before the last tick, display() draws in between the two
+previous_offset = Vector(0, 0)
+tile_size = 64
+# clipmap levels stitch their edges on heights shared with the coarser level, so keep every octave
+world = TiledWorld(tile_size, noise, decimate=lod_levels > 0 and clipmap_levels == 0)
+clipmap = Clipmap(world, clipmap_size, clipmap_levels) if clipmap_levels > 0 else None
+lod_terrain = (LodTerrain(world, tile_size, lod_levels, lod_distance)
+               if lod_levels > 0 and clipmap is None else None)
+# set in __main__, generates tiles in the background instead of inside GLUT callbacks
+scheduler = None
+last_offset = Vector(0, 0)
+culler = FrustumCuller()
+# created in initGL once there is a GL context
+renderer = None
 
 
 def animate(_):
-    global offset
-    offset.y += movement_speed
+    for _ in range(loop.advance()):
+        previous_offset.x, previous_offset.y = offset.x, offset.y
+        offset.x += movement_speed
+        offset.y += movement_speed
     calculate_terrain()
-    glutPostRedisplay()
-    glutTimerFunc(16, animate, 0)
+    # nothing moved and no new terrain arrived: the last frame is still current
+    if loop.take_redraw():
+        glutPostRedisplay()
+    glutTimerFunc(4, animate, 0)
 
 
 def calculate_terrain():
-    global terrain
-    terrain = []
-    for y in range(terrain_size):
-        terrain.append([])
-        for x in range(terrain_size):
-            terrain[-1].append(0)
-
-    for y in range(terrain_size):
-        for x in range(terrain_size):
-            amplitude = 1
-            frequency = 1
-            noiseHeight = 0
-            for i in range(octaves):
-                sampleX = frequency * \
-                    (x + octaveOffsets[i].x + offset.x) / scale
-                sampleY = frequency * \
-                    (y + octaveOffsets[i].y + offset.y) / scale
-                noiseHeight += amplitude * noise.pnoise2(sampleX, sampleY)
-                amplitude *= persistence
-                frequency *= lacunarity
-            terrain[x][y] = noiseHeight
-
-    min_val = np.min(terrain)
-    max_val = np.max(terrain)
-
-    terrain = np.array(terrain)
-    np.clip(terrain, -0.71, max_val)
-
-    calculate_normals()
+    if world.noise.scale != scale:
+        world.noise = world.noise.replace(scale=scale)
+        world.clear()
+        if scheduler is not None:
+            scheduler.cancel()
+        heightfield.reset()
+        if lod_terrain is not None:
+            lod_terrain.clear()
+        if clipmap is not None:
+            clipmap.clear()
+    if clipmap is not None:
+        with profiler.stage("tiles"):
+            if scheduler is not None:
+                scheduler.poll(deadline=loop.deadline)
+        with profiler.stage("generate"):
+            clipmap.update(viewer_position())
+        dirty = clipmap.take_dirty()
+        if dirty:
+            loop.invalidate()
+        with profiler.stage("upload"):
+            for level, xs, ys in dirty:
+                heights = clipmap.heights[level, xs, ys]
+                np.clip(heights, -0.71, None, out=heights)
+                profiler.count("bytes", renderer.upload(heights, level, xs, ys))
+        return
+    if lod_terrain is not None:
+        with profiler.stage("tiles"):
+            if scheduler is not None:
+                scheduler.poll(deadline=loop.deadline)
+        with profiler.stage("generate"):
+            changed = lod_terrain.update(viewer_position(), view_distance, deadline=loop.deadline)
+        if changed:
+            loop.invalidate()
+        with profiler.stage("upload"):
+            for slot in changed:
+                heights = lod_terrain.heights[slot]
+                np.clip(heights, -0.71, None, out=heights)
+                profiler.count("bytes", renderer.upload(heights, slot=slot))
+        return
+    with profiler.stage("tiles"):
+        if scheduler is not None:
+            scheduler.poll(deadline=loop.deadline)
+            velocity = (offset.x - last_offset.x, offset.y - last_offset.y)
+            scheduler.prefetch(offset.x, offset.y, terrain_size, terrain_size, velocity)
+    last_offset.x, last_offset.y = offset.x, offset.y
+    with profiler.stage("generate"):
+        # reads, clips and bounds only the blocks that scrolled in, terrain is updated in place
+        changed = scrolling_terrain.scroll_to(offset.x, offset.y)
+    if not changed:
+        return
+    loop.invalidate()
+
+    if gpu_displacement:
+        with profiler.stage("upload"):
+            for xs, ys in heightfield.dirty:
+                profiler.count("bytes", renderer.upload(terrain[xs, ys], 0, xs, ys))
+        return
+    with profiler.stage("normals"):
+        calculate_normals()
+    with profiler.stage("colors"):
+        calculate_colors()
+    with profiler.stage("mesh"):
+        scrolling_terrain.update_mesh()
+    with profiler.stage("upload"):
+        profiler.count("bytes", renderer.upload())
+
+def viewer_position():
+    # the camera of display() in world cells, undoing its translation and 60 degree tilt
+    tilt = math.radians(60)
+    return (offset.x + terrain_size / 2.0,
+            offset.y + 25 * math.cos(tilt) - 6 * math.sin(tilt),
+            25 * math.sin(tilt) + 6 * math.cos(tilt))
 
 color_heights = [-0.7078, -0.6518, -0.5057, -
                  0.27, -0.07, 0.1765, 0.3725, 0.5686, 0.9608]
+# one color per band: below color_heights[0], between consecutive heights, above color_heights[7]
+color_palette = [(42 / 255.0, 93 / 255.0, 186 / 255.0), (51 / 255.0, 102 / 255.0, 195 / 255.0),
+                 (207 / 255.0, 215 / 255.0, 127 / 255.0), (91 / 255.0, 169 / 255.0, 24 / 255.0),
+                 (63 / 255.0, 119 / 255.0, 17 / 255.0), (89 / 255.0, 68 / 255.0, 61 / 255.0),
+                 (74 / 255.0, 59 / 255.0, 55 / 255.0), (250 / 255.0, 250 / 255.0, 250 / 255.0),
+                 (1, 1, 1)]
+
+# every array of the flat terrain, allocated once and updated in place: terrain is the toroidal
+# heightfield, normals and colors are laid out like it, the mesh is in view order
+scrolling_terrain = ScrollingTerrain(terrain_size, world, color_heights, color_palette, height_scale,
+                                     flattening_threshold, block=cull_block, smooth=smooth_colors)
+heightfield = scrolling_terrain.field
+terrain = scrolling_terrain.heights
+normals = scrolling_terrain.normals
+colors = scrolling_terrain.colors
+mesh = scrolling_terrain.mesh
 
 def calculate_normals():
-    global normals
-    normals = np.zeros((terrain_size, terrain_size, 3), dtype=np.float32)
-
-    for y in range(terrain_size):
-        for x in range(terrain_size):
-            dx = terrain[(x + 1) % terrain_size][y] - terrain[x][y]
-            dy = terrain[x][(y + 1) % terrain_size] - terrain[x][y]
-
-            normal = Vector(dy, -dx, 2.0)
-            normal.normalize()
+    scrolling_terrain.update_normals()
 
-            normals[x][y] = [normal.x, normal.y, normal.z]
+def calculate_colors():
+    scrolling_terrain.update_colors()
 
 def keyboard(bkey, x, y):
-    global offset, scale
+    global offset, scale, show_profile
     key = bkey.decode("utf-8")
-    if key == 'w':
+    if key == 'p':
+        show_profile = not show_profile
+        # while recording, the profiler stays on and only the overlay toggles
+        if profile_output is None:
+            profiler.toggle()
+        loop.invalidate()
+        return
+    elif key == 'w':
         offset.y += offset.z
         calculate_terrain()
     elif key == 'a':
@@ -118,6 +235,7 @@ def keyboard(bkey, x, y):
     elif key == 'down':
         scale /= 1.3
         calculate_terrain()
+    jump()
 
 
 def keyboard_special(key, x, y):
@@ -127,13 +245,38 @@ def keyboard_special(key, x, y):
     elif key == GLUT_KEY_DOWN:
         scale /= 1.3
     calculate_terrain()
+    jump()
+
+def jump():
+    # moved by a key, not by ticks: draw the new place straight away instead of sliding there
+    previous_offset.x, previous_offset.y = offset.x, offset.y
+    loop.invalidate()
 
 def initGL():
+    global renderer
+    if clipmap is not None:
+        renderer = ClipmapRenderer(clipmap_size, clipmap_levels, color_heights, color_palette,
+                                   height_scale, flattening_threshold, smooth=smooth_colors)
+    elif lod_terrain is not None:
+        patch_vertices = tile_size + 1
+        renderer = HeightfieldRenderer(patch_vertices, patch_vertices, color_heights, color_palette,
+                                       height_scale, flattening_threshold, smooth=smooth_colors,
+                                       slots=lod_terrain.heights.shape[0])
+    elif gpu_displacement:
+        # the toroidal heightfield is a one level clipmap
+        renderer = ClipmapRenderer(terrain_size - 1, 1, color_heights, color_palette,
+                                   height_scale, flattening_threshold, smooth=smooth_colors,
+                                   block=cull_block)
+    else:
+        renderer = MeshRenderer(mesh)
     calculate_terrain()
     glClear(GL_COLOR_BUFFER_BIT)
     glClearDepth(1.0)
     glEnable(GL_DEPTH_TEST)
     glDepthFunc(GL_LEQUAL)
+    # the terrain is only ever seen from above, skip triangles facing away
+    glEnable(GL_CULL_FACE)
+    glCullFace(GL_BACK)
     glShadeModel(GL_SMOOTH)
     glHint(GL_PERSPECTIVE_CORRECTION_HINT, GL_NICEST)
     glEnable(GL_LIGHTING)
@@ -142,27 +285,6 @@ def initGL():
     glEnable(GL_COLOR_MATERIAL)
     glColorMaterial(GL_FRONT, GL_DIFFUSE)
 
-def getColor(value):
-    global color_heights
-    if value < color_heights[0]:
-        return 42 / 255.0, 93 / 255.0, 186 / 255.0
-    elif color_heights[0] <= value < color_heights[1]:
-        return 51 / 255.0, 102 / 255.0, 195 / 255.0
-    elif color_heights[1] <= value < color_heights[2]:
-        return 207 / 255.0, 215 / 255.0, 127 / 255.0
-    elif color_heights[2] <= value < color_heights[3]:
-        return 91 / 255.0, 169 / 255.0, 24 / 255.0
-    elif color_heights[3] <= value < color_heights[4]:
-        return 63 / 255.0, 119 / 255.0, 17 / 255.0
-    elif color_heights[4] <= value < color_heights[5]:
-        return 89 / 255.0, 68 / 255.0, 61 / 255.0
-    elif color_heights[5] <= value < color_heights[6]:
-        return 74 / 255.0, 59 / 255.0, 55 / 255.0
-    elif color_heights[6] <= value < color_heights[7]:
-        return 250 / 255.0, 250 / 255.0, 250 / 255.0
-    elif value >= color_heights[7]:
-        return 1, 1, 1
-
 def display():
     glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
     glMatrixMode(GL_MODELVIEW)
@@ -170,76 +292,65 @@ def display():
 
     glTranslatef(-terrain_size / 2.0, -25, -6)
     glRotate(60, -1, 0, 0)
-    glEnableClientState(GL_NORMAL_ARRAY)
-    glNormalPointer(GL_FLOAT, 0, normals)
-    offset.x += movement_speed
-    glBegin(GL_TRIANGLES)
-    for y in range(1, terrain_size - 1):
-        for x in range(1, terrain_size - 1):
-            if terrain[x][y + 1] < flattening_threshold:
-                glNormal3fv(normals[x][y + 1])
-                color = getColor(terrain[x][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex(x, (y + 1), 0)
-            else:
-                glNormal3fv(normals[x][y])
-                color = getColor(terrain[x][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f(x, (y + 1), (terrain[x][y + 1] * height_scale))
-
-            if terrain[x][y] < flattening_threshold:
-                color = getColor(terrain[x][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f(x, y, 0)
+    # between the offsets before and after the last tick, by how far the clock is into the next
+    x = loop.interpolate(previous_offset.x, offset.x)
+    y = loop.interpolate(previous_offset.y, offset.y)
+    if clipmap is not None:
+        # levels are placed relative to the whole world cell under the offset, like patches
+        origin_x, origin_y = math.floor(offset.x), math.floor(offset.y)
+        glTranslatef(origin_x - x, origin_y - y, 0)
+        with profiler.stage("draw"):
+            vertices = renderer.draw(clipmap.draws(origin_x, origin_y))
+    elif lod_terrain is not None:
+        # patches are placed relative to the whole world cell under the offset
+        origin_x, origin_y = math.floor(offset.x), math.floor(offset.y)
+        glTranslatef(origin_x - x, origin_y - y, 0)
+        with profiler.stage("cull"):
+            culler.begin(clip_matrix())
+            lo, hi = lod_terrain.boxes()
+            lo[:, :2] -= (origin_x, origin_y)
+            hi[:, :2] -= (origin_x, origin_y)
+            lo[:, 2], hi[:, 2] = displaced_range(lo[:, 2], hi[:, 2], height_scale, flattening_threshold)
+            visible = culler.cull(lo, hi)
+        with profiler.stage("draw"):
+            vertices = renderer.draw([(slot, patch.x - origin_x, patch.y - origin_y, 2 ** patch.lod)
+                                      for (patch, slot), shown in zip(lod_terrain.visible, visible) if shown])
+    else:
+        # heights are sampled on whole world cells, slide the mesh by the remainder
+        frac_x, frac_y = heightfield.fraction(x, y)
+        glTranslatef(-frac_x, -frac_y, 0)
+        with profiler.stage("cull"):
+            blocks = visible_blocks()
+        with profiler.stage("draw"):
+            if gpu_displacement:
+                vertices = renderer.draw([(0, 0.0, 0.0, 1, heightfield.wrap(), blocks)])
             else:
-                color = getColor(terrain[x][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f(x, y, (terrain[x][y] * height_scale))
-
-            if terrain[x + 1][y + 1] < flattening_threshold:
-                glNormal3fv(normals[x + 1][y + 1])
-                color = getColor(terrain[x + 1][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), (y + 1), 0)
-            else:
-                color = getColor(terrain[x + 1][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), (y + 1),
-                           (terrain[x + 1][y + 1] * height_scale))
-    glEnd()
-
-    glBegin(GL_TRIANGLES)
-    for y in range(1, terrain_size - 1):
-        for x in range(1, terrain_size - 1):
-            if terrain[x + 1][y + 1] < flattening_threshold:
-                color = getColor(terrain[x + 1][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), (y + 1), 0)
-            else:
-                color = getColor(terrain[x + 1][y + 1])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), (y + 1),
-                           (terrain[x + 1][y + 1] * height_scale))
-
-            if terrain[x + 1][y] < flattening_threshold:
-                color = getColor(terrain[x + 1][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), y, 0)
-            else:
-                color = getColor(terrain[x + 1][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f((x + 1), y, (terrain[x + 1][y] * height_scale))
-
-            if terrain[x][y] < flattening_threshold:
-                color = getColor(terrain[x][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f(x, y, 0)
-            else:
-                color = getColor(terrain[x][y])
-                glColor3f(color[0], color[1], color[2])
-                glVertex3f(x, y, (terrain[x][y] * height_scale))
-    glEnd()
+                vertices = renderer.draw(blocks=blocks)
+    profiler.count("vertices", vertices)
+    profiler.count("drawn", culler.frame_drawn)
+    profiler.count("culled", culler.frame_culled)
+    if show_profile:
+        draw_text(profiler.lines())
     glutSwapBuffers()
+    profiler.frame()
+
+def clip_matrix():
+    # glGetFloatv gives column-major matrices, transposed they multiply as written
+    projection = np.asarray(glGetFloatv(GL_PROJECTION_MATRIX)).reshape(4, 4).T
+    modelview = np.asarray(glGetFloatv(GL_MODELVIEW_MATRIX)).reshape(4, 4).T
+    return projection @ modelview
+
+def visible_blocks():
+    # ids of the cull_block blocks of the terrain grid inside the view frustum
+    culler.begin(clip_matrix())
+    if heightfield.origin is None:
+        return None
+    bounds = scrolling_terrain.bounds
+    z_lo, z_hi = displaced_range(bounds.lo.ravel(), bounds.hi.ravel(), height_scale, flattening_threshold)
+    extents = mesh.block_extents
+    lo = np.column_stack([extents[:, 0], extents[:, 1], z_lo])
+    hi = np.column_stack([extents[:, 2], extents[:, 3], z_hi])
+    return np.flatnonzero(culler.cull(lo, hi))
 
 def reshape(width, height):
     if height == 0:
@@ -248,9 +359,28 @@ def reshape(width, height):
     glViewport(0, 0, width, height)
     glMatrixMode(GL_PROJECTION)
     glLoadIdentity()
-    gluPerspective(45.0, aspect, 0.1, 100.0)
+    far = 100.0
+    if clipmap is not None:
+        far = float(clipmap.radius())
+    elif lod_terrain is not None:
+        far = float(view_distance)
+    gluPerspective(45.0, aspect, 0.1, far)
+    loop.invalidate()
+
+def main():
+    global scheduler
+
+    if tile_store_path is not None:
+        world.store = TileStore(tile_store_path, (tile_size, tile_size))
+
+    # start the worker processes before GLUT opens a window
+    scheduler = TileScheduler(world)
+    heightfield.source = scheduler
+    if lod_terrain is not None:
+        lod_terrain.source = scheduler
+    if clipmap is not None:
+        clipmap.source = scheduler
 
-if __name__ == '__main__':
     glutInit()
     glutInitDisplayMode(GLUT_DOUBLE | GLUT_DEPTH)
     glutInitWindowSize(800, 600)
@@ -260,7 +390,20 @@ if __name__ == '__main__':
     glutReshapeFunc(reshape)
     glutKeyboardFunc(keyboard)
     glutSpecialFunc(keyboard_special)
+    # return from glutMainLoop when the window closes so the cleanup below runs (freeglut only)
+    if bool(glutSetOption):
+        glutSetOption(GLUT_ACTION_ON_WINDOW_CLOSE, GLUT_ACTION_GLUTMAINLOOP_RETURNS)
     initGL()
     glutTimerFunc(0, animate, 0)
 
-    glutMainLoop()
+    try:
+        glutMainLoop()
+    finally:
+        scheduler.shutdown()
+        if world.store is not None:
+            world.store.close()
+        if profile_output is not None:
+            profiler.dump(profile_output)
+
+if __name__ == '__main__':
+    main()
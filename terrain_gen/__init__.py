@@ -0,0 +1,43 @@
+"""
+Terrain generation library used by main.py and terraingeneration.py.
+
+Importing the package or any of its generation modules never imports
+OpenGL, so worker processes, benchmarks and batch jobs can use it without a
+display. The GL modules (renderer, shaders, overlay) are only loaded when one of
+their names is first accessed.
+"""
+import importlib
+
+from .backends import noise_backend
+from .clipmap import Clipmap
+from .colors import colorize, palette_bands
+from .config import NoiseConfig
+from .culling import FrustumCuller, boxes_in_frustum, frustum_planes
+from .lod import LodTerrain, Patch
+from .loop import FixedStepLoop
+from .mesh import BlockBounds, GridMesh, block_bounds, block_indices, grid_indices, grid_positions
+from .normals import ScrollingNormals, normal_map, scroll_normals
+from .perlin import FBM_TOLERANCE, PNOISE2_TOLERANCE, fbm, pnoise2
+from .pipeline import ScrollingTerrain
+from .profiling import Profiler
+from .scroll import ScrollingHeightfield
+from .store import TileStore
+from .streaming import RowRing
+from .tiles import TileCache, TiledWorld, TileKey, lod_octaves
+
+# name -> module for the parts that need OpenGL
+_GL_EXPORTS = {
+    "MeshRenderer": "renderer",
+    "HeightfieldRenderer": "renderer",
+    "ClipmapRenderer": "renderer",
+    "createShader": "shaders",
+    "createProgram": "shaders",
+    "draw_text": "overlay",
+}
+
+
+def __getattr__(name):
+    module = _GL_EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{module}", __name__), name)
@@ -0,0 +1,29 @@
+"""
+Command line entry point:
+
+    python -m terrain_gen export PATH --width W --height H [options]
+    python -m terrain_gen bench [options]
+"""
+import sys
+
+COMMANDS = {
+    "export": "terrain_gen.export",
+    "bench": "terrain_gen.bench",
+}
+
+
+def main(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in COMMANDS:
+        sys.stderr.write(__doc__.strip() + "\n")
+        return 2
+
+    import importlib
+
+    importlib.import_module(COMMANDS[argv[0]]).main(argv[1:])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
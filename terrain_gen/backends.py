@@ -0,0 +1,112 @@
+"""
+Noise backends for the terraingeneration.py flyover.
+
+A backend evaluates single-octave 2D noise over a whole grid at once:
+grid(xs, ys) returns the noise at every (xs[i], ys[j]) as [i, j], so each
+lattice point the flyover mesh needs is computed once per grid or row
+instead of once for every triangle corner on it.
+
+    numpy         perlin.pnoise2 over the whole grid in a few array passes
+    pnoise2       the `noise` C extension, one call per point
+    perlin_noise  the pure Python perlin_noise package the flyover used to
+                  call, one call per point, for the flyovers it used to draw
+
+numpy and pnoise2 are the same noise to within 2e-6 and are seeded the same
+way, by moving the samples by an offset drawn from the seed. perlin_noise is
+a different noise function with its own seeding.
+
+The numpy backend can spread bands of rows of a grid over workers threads
+(see kernel.run_bands), with the same result for any number of them; the
+other two call Python per point and hold the GIL, so they ignore workers.
+"""
+import numpy as np
+
+try:
+    import noise
+except ImportError:
+    noise = None
+
+try:
+    import perlin_noise
+except ImportError:
+    perlin_noise = None
+
+from .config import octave_offsets_for_seed
+from .kernel import run_bands
+from .perlin import pnoise2
+
+# pnoise2 repeats every 1024 units, seed offsets are taken modulo that to keep float32 precision
+PERIOD = 1024
+
+
+class NumpyNoise(object):
+
+    def __init__(self, seed=1, workers=None):
+        self.seed = seed
+        self.workers = workers
+        self.offset = tuple(o % PERIOD for o in octave_offsets_for_seed(seed, 1)[0])
+
+    def grid(self, xs, ys):
+        """
+        :param xs: 1D array of sample x coordinates (first axis of the result)
+        :param ys: 1D array of sample y coordinates (second axis of the result)
+        :return: float64 array of shape (len(xs), len(ys))
+        """
+        xs = np.asarray(xs, dtype=np.float64) + self.offset[0]
+        ys = np.asarray(ys, dtype=np.float64) + self.offset[1]
+        out = np.empty((xs.size, ys.size), dtype=np.float64)
+
+        def band(rows):
+            out[rows] = pnoise2(xs[rows, None], ys[None, :])
+
+        run_bands(xs.size, self.workers, band)
+        return out
+
+
+class CNoise(NumpyNoise):
+
+    def grid(self, xs, ys):
+        xs = np.asarray(xs, dtype=np.float64) + self.offset[0]
+        ys = np.asarray(ys, dtype=np.float64) + self.offset[1]
+        out = np.empty((xs.size, ys.size), dtype=np.float64)
+        for i, x in enumerate(xs):
+            for j, y in enumerate(ys):
+                out[i, j] = noise.pnoise2(x, y)
+        return out
+
+
+class PackageNoise(object):
+
+    def __init__(self, seed=1, workers=None):
+        self.seed = seed
+        self.noise = perlin_noise.PerlinNoise(seed=seed)
+
+    def grid(self, xs, ys):
+        out = np.empty((len(xs), len(ys)), dtype=np.float64)
+        for i, x in enumerate(xs):
+            for j, y in enumerate(ys):
+                out[i, j] = self.noise([x, y])
+        return out
+
+
+# name -> backend class, only the ones whose module is installed
+BACKENDS = {
+    "numpy": NumpyNoise,
+}
+if noise is not None:
+    BACKENDS["pnoise2"] = CNoise
+if perlin_noise is not None:
+    BACKENDS["perlin_noise"] = PackageNoise
+
+
+def noise_backend(name="numpy", seed=1, workers=None):
+    """
+    :param name: one of BACKENDS
+    :param seed: positive integer, the same seed gives the same noise on every run
+    :param workers: threads evaluating bands of rows of a grid, None for one
+    :return: backend object with a grid(xs, ys) method
+    """
+    backend = BACKENDS.get(name)
+    if backend is None:
+        raise ValueError(f"unknown or unavailable noise backend {name!r}, expected one of {tuple(BACKENDS)}")
+    return backend(seed, workers)
@@ -0,0 +1,293 @@
+"""
+Headless benchmark of the terrain pipeline stages.
+
+Times height generation, normals, coloring, mesh building and the upload
+copy separately over a range of grid sizes, octave counts and noise
+backends, without opening a window, and prints the results as JSON:
+
+    python -m terrain_gen.bench --sizes 64 256 1024 --octaves 4 8 --output bench.json
+
+The numba backend (kernel.fbm, listed when Numba is installed) is timed
+once per --threads count, 1 and all CPUs by default, to show how its row
+parallel kernel scales. So is the bands backend, kernel.fbm(workers=n) with
+the rows cut into one band per thread of a thread pool, which also runs the
+NumPy fbm when Numba is missing. The other backends run on one thread.
+
+Each result has the best wall time of --repeat runs, the cells per second
+that gives, and the peak memory allocated during one extra traced run. The
+upload stage copies the vertex bytes into a preallocated staging buffer,
+which is what glBufferSubData costs on the CPU side without a GL context.
+
+With --steady FRAMES, a pipeline.ScrollingTerrain of each size also flies
+FRAMES ticks around a closed loop over a TiledWorld, once to cache every
+tile on it, once traced to settle and once more traced for the result: the
+peak bytes allocated during the lap and the bytes of NumPy arrays it left
+allocated. Its arrays are updated in place, so the peak is the few KiB of
+Python objects (slices, tuples) a tick creates, the same for every size
+above 256 (smaller ones index with cached ints), and no arrays are left;
+a peak that grows with the size is a temporary array. tests/test_pipeline.py
+asserts both:
+
+    python -m terrain_gen.bench --sizes 256 1024 --octaves 8 --backends numpy --steady 240
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import noise
+except ImportError:
+    noise = None
+
+from . import kernel
+from .colors import colorize
+from .config import NoiseConfig
+from .mesh import GridMesh
+from .normals import normal_map
+from .perlin import fbm
+from .pipeline import ScrollingTerrain
+from .tiles import TiledWorld
+
+# the main.py terrain settings
+SCALE = 15.0
+PERSISTENCE = 0.5
+LACUNARITY = 2.0
+HEIGHT_SCALE = 10
+FLATTENING_THRESHOLD = 0.0125
+COLOR_HEIGHTS = [-0.7078, -0.6518, -0.5057, -0.27, -0.07, 0.1765, 0.3725, 0.5686, 0.9608]
+PALETTE = [(42 / 255.0, 93 / 255.0, 186 / 255.0), (51 / 255.0, 102 / 255.0, 195 / 255.0),
+           (207 / 255.0, 215 / 255.0, 127 / 255.0), (91 / 255.0, 169 / 255.0, 24 / 255.0),
+           (63 / 255.0, 119 / 255.0, 17 / 255.0), (89 / 255.0, 68 / 255.0, 61 / 255.0),
+           (74 / 255.0, 59 / 255.0, 55 / 255.0), (250 / 255.0, 250 / 255.0, 250 / 255.0),
+           (1, 1, 1)]
+
+
+def _numpy_backend(size, octave_offsets, threads):
+    cells = np.arange(size)
+    return fbm(cells, cells, octave_offsets, (0.0, 0.0), SCALE, PERSISTENCE, LACUNARITY)
+
+
+def _pnoise2_backend(size, octave_offsets, threads):
+    # the per-pixel loop calculate_terrain used to run
+    heights = np.empty((size, size), dtype=np.float32)
+    for x in range(size):
+        for y in range(size):
+            amplitude = 1
+            frequency = 1
+            noiseHeight = 0
+            for ox, oy in octave_offsets:
+                noiseHeight += amplitude * noise.pnoise2(frequency * (x + ox) / SCALE,
+                                                         frequency * (y + oy) / SCALE)
+                amplitude *= PERSISTENCE
+                frequency *= LACUNARITY
+            heights[x, y] = noiseHeight
+    return heights
+
+
+def _numba_backend(size, octave_offsets, threads):
+    # threads are Numba's, set through kernel.set_threads
+    cells = np.arange(size)
+    return kernel.fbm(cells, cells, octave_offsets, (0.0, 0.0), SCALE, PERSISTENCE, LACUNARITY)
+
+
+def _bands_backend(size, octave_offsets, threads):
+    cells = np.arange(size)
+    return kernel.fbm(cells, cells, octave_offsets, (0.0, 0.0), SCALE, PERSISTENCE, LACUNARITY,
+                      workers=threads)
+
+
+# name -> (function(size, octave_offsets, threads) returning a heightfield, largest size worth timing)
+BACKENDS = {
+    "numpy": (_numpy_backend, None),
+}
+if kernel.KERNEL == "numba":
+    BACKENDS["numba"] = (_numba_backend, None)
+BACKENDS["bands"] = (_bands_backend, None)
+# backends whose generate stage is timed once per thread count
+THREADED = ("numba", "bands")
+if noise is not None:
+    BACKENDS["pnoise2"] = (_pnoise2_backend, 256)
+
+
+def _measure(function, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def _stages(backend, size, octave_offsets):
+    """
+    :return: list of (stage name, function(threads)), run in this order
+    """
+    generate = BACKENDS[backend][0]
+    heights = generate(size, octave_offsets, 1)
+    normals = np.empty((size, size, 3), dtype=np.float32)
+    colors = np.empty((size, size, 3), dtype=np.float32)
+    normal_map(heights, normals)
+    colorize(heights, COLOR_HEIGHTS, PALETTE, out=colors)
+    mesh = GridMesh(size, size)
+    staging = np.empty_like(mesh.vertices)
+
+    return [
+        ("generate", lambda threads: generate(size, octave_offsets, threads)),
+        ("normals", lambda threads: normal_map(heights, normals)),
+        ("colors", lambda threads: colorize(heights, COLOR_HEIGHTS, PALETTE, out=colors)),
+        ("mesh", lambda threads: mesh.update(heights, normals, colors, HEIGHT_SCALE, FLATTENING_THRESHOLD)),
+        ("upload", lambda threads: np.copyto(staging, mesh.vertices)),
+    ]
+
+
+def run(sizes, octave_counts, backends, repeat=3, seed=0, log=None, thread_counts=(1,)):
+    """
+    :param thread_counts: numbers of threads the THREADED backends are timed with
+    :return: list of result dicts, one per backend, size, octave count, stage
+        and thread count
+    """
+    rng = np.random.default_rng(seed)
+    all_offsets = rng.integers(-10000, 10000, size=(max(octave_counts), 2)).astype(float)
+
+    results = []
+    # only the compiled backends need Numba, the others time without loading it
+    threaded = [backend for backend in backends if backend in THREADED]
+    initial_threads = kernel.threads() if threaded else None
+    for backend in backends:
+        limit = BACKENDS[backend][1]
+        for size in sizes:
+            if limit is not None and size > limit:
+                continue
+            for octaves in octave_counts:
+                offsets = [tuple(o) for o in all_offsets[:octaves]]
+                for stage, function in _stages(backend, size, offsets):
+                    timed = backend in THREADED and stage == "generate"
+                    for threads in thread_counts if timed else (1,):
+                        if timed:
+                            kernel.set_threads(threads)
+                        seconds, peak = _measure(functools.partial(function, threads), repeat)
+                        result = {
+                            "stage": stage,
+                            "backend": backend,
+                            "size": size,
+                            "octaves": octaves,
+                            "threads": 1 if backend not in THREADED
+                            else threads if backend == "bands" else kernel.threads(),
+                            "seconds": seconds,
+                            "cells_per_second": size * size / seconds if seconds > 0 else None,
+                            "peak_bytes": peak,
+                        }
+                        results.append(result)
+                        if log is not None:
+                            log.write(f"{backend:>8} {size:>5}^2 {octaves} octaves {stage:>8} "
+                                      f"{result['threads']:>2} threads: "
+                                      f"{seconds * 1000:10.3f} ms {peak / 2 ** 20:9.2f} MiB\n")
+    if threaded:
+        kernel.set_threads(initial_threads)
+    return results
+
+
+def steady(size, frames, octaves=8, seed=0, tile_size=64):
+    """
+    Trace what a ScrollingTerrain allocates per tick once the tiles it reads
+    are cached: the main.py flat path of scroll, normals, colors, mesh and
+    the upload copy, ticking around a circle of frames steps.
+    :return: result dict with the peak bytes allocated during a lap and the
+        bytes of arrays still allocated after it
+    """
+    world = TiledWorld(tile_size, NoiseConfig(seed, octaves, SCALE, PERSISTENCE, LACUNARITY))
+    terrain = ScrollingTerrain(size, world, COLOR_HEIGHTS, PALETTE, HEIGHT_SCALE, FLATTENING_THRESHOLD)
+    staging = np.empty_like(terrain.mesh.vertices)
+    # a few cells a tick in every direction, and standing still at the ends of the diagonal
+    radius = frames / math.pi
+
+    def lap():
+        for frame in range(frames):
+            angle = 2 * math.pi * frame / frames
+            if terrain.scroll_to(radius * math.cos(angle), radius * math.sin(2 * angle)):
+                terrain.update_normals()
+                terrain.update_colors()
+                terrain.update_mesh()
+                np.copyto(staging, terrain.mesh.vertices)
+
+    def array_bytes():
+        arrays = tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)
+        return sum(trace.size for trace in tracemalloc.take_snapshot().filter_traces([arrays]).traces)
+
+    lap()
+    tracemalloc.start()
+    # replaces the objects the ticks keep (the last dirty slices...) that predate tracing
+    lap()
+    start, _ = tracemalloc.get_traced_memory()
+    arrays = array_bytes()
+    tracemalloc.reset_peak()
+    lap()
+    peak = tracemalloc.get_traced_memory()[1] - start
+    arrays = array_bytes() - arrays
+    tracemalloc.stop()
+    return {
+        "size": size,
+        "octaves": octaves,
+        "frames": frames,
+        "peak_bytes": peak,
+        "array_bytes": arrays,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 256, 1024, 4096])
+    parser.add_argument("--octaves", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, os.cpu_count() or 1}),
+                        help="thread counts the numba and bands backends are timed with")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--steady", type=int, default=0, metavar="FRAMES",
+                        help="also trace the allocations of FRAMES scrolled ticks per size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--quiet", action="store_true", help="no progress on stderr")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.octaves, args.backends, args.repeat, args.seed,
+                  log=None if args.quiet else sys.stderr, thread_counts=args.threads)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "kernel": kernel.KERNEL,
+        "cpus": os.cpu_count(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.steady:
+        report["steady"] = []
+        for size in args.sizes:
+            result = steady(size, args.steady, max(args.octaves), args.seed)
+            report["steady"].append(result)
+            if not args.quiet:
+                sys.stderr.write(f"  steady {size:>5}^2 {args.steady} ticks: {result['peak_bytes']:>8} bytes peak, "
+                                 f"{result['array_bytes']} bytes of arrays left\n")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Geometry clipmap around the viewer.
+
+A Clipmap is levels nested square grids of size x size cells centred on the
+viewer, level l sampling every 2**l world cells. Each level covers twice the
+width of the one inside it with the same number of vertices, so the view
+distance doubles with every level added while the vertex count only grows by
+one ring.
+
+Every level keeps its (size + 1)**2 heights in a toroidal array: world
+sample (x, y) of level l, in units of 2**l cells, lives at
+heights[l, x % n, y % n] with n = size + 1. When the viewer moves, a level's
+window moves by whole samples and only the rows and columns that entered it
+are read from the source, into the places of the ones that left it; nothing
+is shifted or regenerated. The array blocks written are collected in dirty
+for the renderer to upload as they are.
+
+The window of level l starts at 2 * floor(v / 2**(l + 1)) - size / 2 of its
+samples, v the viewer position. Windows thus start on even samples, a finer
+level lies on the samples of the coarser one and covers its cells
+[h, h + size / 2) along each axis, with h size / 4 or size / 4 + 1
+depending on the viewer. level_indices() orders each level's cells in 5 x 5
+blocks so that the ring around that hole is a few index ranges whichever way
+it falls, see Clipmap.blocks().
+
+Vertices on the outer edge of a finer level at odd samples lie halfway along
+an edge of the coarser level, the renderer averages their neighbours there as
+lod.py does on patch edges, so no cracks open between levels. That needs the
+same height for a world cell at every level, a TiledWorld with decimate=False.
+"""
+import math
+
+import numpy as np
+
+from .mesh import grid_indices
+from .scroll import wrap_runs
+
+
+def ring_segments(size):
+    """
+    :return: the (first, last + 1) cells of the five segments each axis of a
+        level is cut into; the hole of a finer level always spans the middle
+        one and one of the two single cells either side of it
+    """
+    m = size // 4
+    return ((0, m), (m, m + 1), (m + 1, 3 * m), (3 * m, 3 * m + 1), (3 * m + 1, size))
+
+
+def level_indices(size):
+    """
+    Triangle indices of a level's (size + 1) x (size + 1) vertex lattice,
+    ordered block by block over the 5 x 5 blocks of ring_segments(), block
+    (i, j) being block id i * 5 + j.
+    :return: (uint32 indices, int (25, 2) first index and index count per block)
+    """
+    cells = grid_indices(size + 1, size + 1).reshape(size, size, 6)
+    segments = ring_segments(size)
+    parts = []
+    ranges = []
+    first = 0
+    for x0, x1 in segments:
+        for y0, y1 in segments:
+            part = cells[x0:x1, y0:y1].ravel()
+            parts.append(part)
+            ranges.append((first, part.size))
+            first += part.size
+    return np.concatenate(parts), np.array(ranges)
+
+
+class Clipmap(object):
+
+    def __init__(self, source, size, levels):
+        """
+        :param source: tiles.TiledWorld or scheduler.TileScheduler, read with lod=
+        :param size: cells per level side, a multiple of 4
+        :param levels: number of levels, 0 .. levels - 1
+        """
+        if size % 4:
+            raise ValueError(f"size must be a multiple of 4, not {size}")
+        self.source = source
+        self.size = size
+        self.levels = levels
+        self.samples = size + 1
+
+        n = self.samples
+        self.heights = np.zeros((levels, n, n), dtype=np.float32)
+        # first sample (x, y) of each level's window in its own samples, None until the first update
+        self.origins = [None] * levels
+        # (level, xs, ys) slices of heights written since the last take_dirty()
+        self.dirty = []
+        # (level, x0, y0, width, height) sample blocks the source could not fully provide yet
+        self.pending = []
+        # number of samples read by the last update
+        self.generated = 0
+
+    def radius(self):
+        """
+        :return: distance in world cells from the viewer to the edge of the coarsest level
+        """
+        return self.size // 2 * 2 ** (self.levels - 1)
+
+    def origin_for(self, viewer, level):
+        """
+        :return: first sample (x, y) of the window of level around viewer
+        """
+        span = 2 ** (level + 1)
+        return (2 * math.floor(viewer[0] / span) - self.size // 2,
+                2 * math.floor(viewer[1] / span) - self.size // 2)
+
+    def update(self, viewer):
+        """
+        Move every level's window to the viewer and read the samples that entered it.
+        :param viewer: (x, y, ...) position of the viewer in world cells
+        :return: number of samples read
+        """
+        n = self.samples
+        self.generated = 0
+        self._retry()
+        for level in range(self.levels):
+            old = self.origins[level]
+            new = self.origin_for(viewer, level)
+            if new == old:
+                continue
+            self.origins[level] = new
+            if old is not None:
+                dx = new[0] - old[0]
+                dy = new[1] - old[1]
+            if old is None or abs(dx) >= n or abs(dy) >= n:
+                self.pending = [block for block in self.pending if block[0] != level]
+                self._fill(level, new[0], new[1], n, n)
+                continue
+
+            # columns that entered along x, then rows along y over the columns kept
+            if dx > 0:
+                self._fill(level, old[0] + n, new[1], dx, n)
+            elif dx < 0:
+                self._fill(level, new[0], new[1], -dx, n)
+            kept = max(new[0], old[0])
+            if dy > 0:
+                self._fill(level, kept, old[1] + n, n - abs(dx), dy)
+            elif dy < 0:
+                self._fill(level, kept, new[1], n - abs(dx), -dy)
+        return self.generated
+
+    def _fill(self, level, x0, y0, width, height):
+        n = self.samples
+        for x, w, i in wrap_runs(x0, width, n):
+            for y, h, j in wrap_runs(y0, height, n):
+                xs = slice(i, i + w)
+                ys = slice(j, j + h)
+                if not self.source.read(x, y, self.heights[level, xs, ys], lod=level):
+                    self.pending.append((level, x, y, w, h))
+                self.dirty.append((level, xs, ys))
+                self.generated += w * h
+
+    def _retry(self):
+        pending, self.pending = self.pending, []
+        n = self.samples
+        for level, x0, y0, width, height in pending:
+            # only the part still inside the window matters, samples leave it before their slots are reused
+            ox, oy = self.origins[level]
+            lo_x, hi_x = max(x0, ox), min(x0 + width, ox + n)
+            lo_y, hi_y = max(y0, oy), min(y0 + height, oy + n)
+            if lo_x < hi_x and lo_y < hi_y:
+                self._fill(level, lo_x, lo_y, hi_x - lo_x, hi_y - lo_y)
+
+    def take_dirty(self):
+        """
+        :return: list of (level, xs, ys) slices of heights written since the last call
+        """
+        dirty, self.dirty = self.dirty, []
+        return dirty
+
+    def window(self, level):
+        """
+        :return: the heights of level's window in world order, a copy
+        """
+        ox, oy = self.origins[level]
+        n = self.samples
+        return np.roll(self.heights[level], (-(ox % n), -(oy % n)), axis=(0, 1))
+
+    def blocks(self, level):
+        """
+        :return: ids of the level_indices() blocks of level that are not under
+            the finer level, None (all of them) for level 0
+        """
+        if level == 0:
+            return None
+        segments = ring_segments(self.size)
+        fine = self.origins[level - 1]
+        origin = self.origins[level]
+        covered = []
+        for axis in (0, 1):
+            hole = fine[axis] // 2 - origin[axis]
+            covered.append([hole <= lo and hi <= hole + self.size // 2 for lo, hi in segments])
+        return [i * 5 + j for i in range(5) for j in range(5) if not (covered[0][i] and covered[1][j])]
+
+    def draws(self, origin_x=0, origin_y=0):
+        """
+        :param origin_x: world cell the draw positions are relative to, along x
+        :param origin_y: the same along y
+        :return: list of (level, x, y, step, (first x, first y array index), blocks),
+            placing vertex (i, j) of level at (x + i * step, y + j * step), for
+            ClipmapRenderer.draw
+        """
+        n = self.samples
+        draws = []
+        for level, (ox, oy) in enumerate(self.origins):
+            step = 2 ** level
+            draws.append((level, ox * step - origin_x, oy * step - origin_y, step,
+                          (ox % n, oy % n), self.blocks(level)))
+        return draws
+
+    def clear(self):
+        """
+        Forget every level, call after changing the noise parameters.
+        """
+        self.origins = [None] * self.levels
+        self.dirty = []
+        self.pending = []
+
+    def stats(self):
+        """
+        :return: number of samples read by the last update and blocks still pending
+        """
+        return {"generated": self.generated, "pending": len(self.pending)}
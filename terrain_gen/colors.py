@@ -0,0 +1,81 @@
+"""
+Height to color mapping with lookup tables.
+
+A palette of n colors goes with n - 1 increasing thresholds: heights below
+the first threshold get palette[0], heights from threshold k - 1 up to
+threshold k get palette[k], the same bands getColor in main.py used to walk
+with an if chain. Thresholds beyond n - 1 are ignored.
+"""
+import numpy as np
+
+
+def _table(palette, dtype):
+    # a palette array already of dtype is used as it is
+    if np.dtype(dtype) == np.uint8:
+        return np.round(np.asarray(palette, dtype=np.float64) * 255).astype(np.uint8)
+    return np.asarray(palette, dtype=dtype)
+
+
+def _anchors(thresholds):
+    # each color sits in the middle of its band, the outer two on the first/last threshold
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    return np.concatenate([thresholds[:1], (thresholds[:-1] + thresholds[1:]) * 0.5, thresholds[-1:]])
+
+
+def colorize(heights, color_heights, palette, out=None, smooth=False, dtype=np.float32, mask=None):
+    """
+    Color a whole heightfield in one pass.
+    :param heights: array of heights, any shape
+    :param color_heights: band thresholds
+    :param palette: RGB colors in 0..1, one per band
+    :param out: optional array of shape heights.shape + (3,) to write into
+    :param smooth: blend linearly between band colors instead of hard bands
+    :param dtype: np.float32 for 0..1 colors or np.uint8 for 0..255
+    :param mask: bool array of the heights' shape to color band by band
+        through instead of looking the bands up, which allocates nothing
+        when color_heights and palette are arrays of the dtypes used
+        (see pipeline.ScrollingTerrain); not used with smooth
+    :return: colors of shape heights.shape + (3,)
+    """
+    heights = np.asarray(heights)
+    # compare at the precision of the heights, as getColor did on float32 terrain
+    thresholds = np.asarray(color_heights[:len(palette) - 1], dtype=np.result_type(heights.dtype, np.float32))
+    table = _table(palette, dtype)
+    if out is None:
+        out = np.empty(heights.shape + (3,), dtype=table.dtype)
+
+    if not smooth and mask is not None:
+        # every band from the lowest up paints over the heights at or above its threshold
+        np.copyto(out, table[0])
+        for band, threshold in enumerate(thresholds, 1):
+            np.greater_equal(heights, threshold, out=mask)
+            np.copyto(out, table[band], where=mask[..., None])
+        return out
+    if not smooth:
+        np.take(table, np.searchsorted(thresholds, heights, side="right"), axis=0, out=out)
+        return out
+
+    anchors = _anchors(thresholds)
+    colors = np.asarray(palette, dtype=np.float64)
+    scale = 255.0 if table.dtype == np.uint8 else 1.0
+    for channel in range(3):
+        values = np.interp(heights, anchors, colors[:, channel]) * scale
+        out[..., channel] = np.round(values) if table.dtype == np.uint8 else values
+    return out
+
+
+def palette_bands(color_heights, palette, smooth=False):
+    """
+    The color mapping as a 1D texture of one texel per color plus the
+    heights where the shader moves between texels. Hard bands: texel k for
+    heights from threshold k - 1 on, compared at float32 like colorize does
+    on float32 heights, so every band edge is exactly where colorize puts it.
+    Smooth: texel k + t, t from 0 to 1 between anchor k and k + 1, sampled
+    with linear filtering to the same blend as colorize's interpolation.
+    :return: (float32 (n, 3) colors, float32 thresholds or anchors)
+    """
+    colors = np.asarray(palette, dtype=np.float32)
+    thresholds = np.asarray(color_heights[:len(palette) - 1], dtype=np.float32)
+    if smooth:
+        return colors, _anchors(thresholds).astype(np.float32)
+    return colors, thresholds
@@ -0,0 +1,105 @@
+"""
+Seeded noise settings.
+
+A NoiseConfig holds everything an fbm heightfield depends on: the seed, the
+number of octaves, scale, persistence, lacunarity and the per-octave offsets
+drawn from the seed. Equal configs give bit-identical heights in every run
+and every worker process, and config.key is a short string that is the same
+for equal configs across runs, so tiles generated under one config can be
+cached, baked into a store.TileStore and shared between processes:
+
+    noise = NoiseConfig(seed=7, octaves=8)
+    heights = noise.fbm(xs, ys)
+    store.load(noise.key, key, lambda: noise.fbm(xs, ys))
+
+The offsets come from numpy's SeedSequence, whose output for a given seed is
+fixed by design, rather than from a random Generator, whose streams numpy
+may change between releases.
+"""
+import numpy as np
+
+from .kernel import fbm
+from .store import params_key
+
+# octave offsets are drawn from [-OFFSET_RANGE, OFFSET_RANGE), the range main.py always used
+OFFSET_RANGE = 10000
+
+
+def octave_offsets_for_seed(seed, octaves):
+    """
+    :return: list of octaves (x, y) float offsets, the same for the same seed on every run
+    """
+    words = np.random.SeedSequence(seed).generate_state(2 * octaves, dtype=np.uint32)
+    offsets = (words % (2 * OFFSET_RANGE)).astype(np.int64) - OFFSET_RANGE
+    return [(float(x), float(y)) for x, y in offsets.reshape(octaves, 2)]
+
+
+def random_seed():
+    """
+    :return: a fresh seed for a world that differs from launch to launch
+    """
+    return int(np.random.SeedSequence().entropy % 2 ** 32)
+
+
+class NoiseConfig(object):
+
+    def __init__(self, seed=0, octaves=8, scale=15.0, persistence=0.5, lacunarity=2.0, offsets=None):
+        """
+        :param seed: non-negative integer the octave offsets are drawn from
+        :param offsets: explicit (x, y) offset per octave instead of the seeded ones
+        """
+        if offsets is None:
+            offsets = octave_offsets_for_seed(seed, octaves)
+        if len(offsets) != octaves:
+            raise ValueError(f"{len(offsets)} octave offsets given for {octaves} octaves")
+        self.seed = int(seed)
+        self.octaves = int(octaves)
+        # floats throughout, so scale=15 and scale=15.0 are the same config with the same key
+        self.scale = float(scale)
+        self.persistence = float(persistence)
+        self.lacunarity = float(lacunarity)
+        self.offsets = tuple((float(ox), float(oy)) for ox, oy in offsets)
+
+    def params(self):
+        """
+        :return: tuple of every setting the heights depend on, in argument order
+        """
+        return (self.seed, self.octaves, self.scale, self.persistence, self.lacunarity, self.offsets)
+
+    @property
+    def key(self):
+        """
+        Stable hash of params(), equal for equal configs in any run or process.
+        """
+        return params_key(self.params())
+
+    def replace(self, **changes):
+        """
+        :return: a copy with some settings changed, e.g. replace(scale=20.0);
+            the offsets are drawn again when the seed or the octaves change
+        """
+        args = dict(zip(("seed", "octaves", "scale", "persistence", "lacunarity", "offsets"), self.params()))
+        if "seed" in changes or "octaves" in changes:
+            args["offsets"] = None
+        args.update(changes)
+        return NoiseConfig(**args)
+
+    def fbm(self, xs, ys, offset=(0.0, 0.0), octaves=None, out=None, workers=None):
+        """
+        :param octaves: use only the first octaves octaves, all of them if None
+        :param workers: threads evaluating bands of rows, see kernel.fbm
+        :return: float32 heightfield indexed as [x, y], see perlin.fbm
+        """
+        offsets = self.offsets if octaves is None else self.offsets[:octaves]
+        return fbm(xs, ys, offsets, offset, self.scale, self.persistence, self.lacunarity,
+                   out=out, workers=workers)
+
+    def __eq__(self, other):
+        return isinstance(other, NoiseConfig) and self.params() == other.params()
+
+    def __hash__(self):
+        return hash(self.params())
+
+    def __repr__(self):
+        return (f"NoiseConfig(seed={self.seed}, octaves={self.octaves}, scale={self.scale!r}, "
+                f"persistence={self.persistence!r}, lacunarity={self.lacunarity!r})")
@@ -0,0 +1,81 @@
+"""
+CPU view frustum culling of terrain tiles.
+
+The six frustum planes come straight from the combined projection and
+modelview matrix (Gribb and Hartmann), so any camera set up with
+gluPerspective/glRotate or with the matrices.py generators works. Tiles are
+tested as axis-aligned boxes in the space the matrix transforms from, all
+tiles in one array pass: a box is culled when its corner furthest along a
+plane's normal is still behind that plane.
+"""
+import numpy as np
+
+
+def frustum_planes(clip):
+    """
+    :param clip: 4x4 row-major matrix taking points to clip space, e.g.
+        projection @ modelview, or the transpose of what glGetFloatv returns
+    :return: float64 (6, 4) planes (a, b, c, d), inside where a x + b y + c z + d >= 0
+    """
+    m = np.asarray(clip, dtype=np.float64).reshape(4, 4)
+    return np.stack([m[3] + m[0], m[3] - m[0], m[3] + m[1], m[3] - m[1], m[3] + m[2], m[3] - m[2]])
+
+
+def boxes_in_frustum(planes, lo, hi):
+    """
+    :param lo: (n, 3) minimum corners of the boxes
+    :param hi: (n, 3) maximum corners of the boxes
+    :return: bool (n,) array, False for boxes entirely outside one of the planes
+    """
+    lo = np.asarray(lo, dtype=np.float64)
+    hi = np.asarray(hi, dtype=np.float64)
+    normals = planes[:, :3]
+    # per box and plane, the corner furthest along the plane normal
+    corner = np.where(normals[None, :, :] > 0, hi[:, None, :], lo[:, None, :])
+    distance = np.einsum("npk,pk->np", corner, normals) + planes[:, 3]
+    return np.all(distance >= 0, axis=1)
+
+
+class FrustumCuller(object):
+    """
+    Frustum test with counters of tiles drawn and culled, for the last frame
+    and in total.
+    """
+
+    def __init__(self):
+        self.planes = None
+        self.frames = 0
+        self.drawn = 0
+        self.culled = 0
+        self.frame_drawn = 0
+        self.frame_culled = 0
+
+    def begin(self, clip):
+        """
+        Start a frame seen through the 4x4 row-major clip matrix.
+        """
+        self.planes = frustum_planes(clip)
+        self.frames += 1
+        self.frame_drawn = 0
+        self.frame_culled = 0
+
+    def cull(self, lo, hi):
+        """
+        :return: bool array of the boxes to draw
+        """
+        visible = boxes_in_frustum(self.planes, lo, hi)
+        drawn = int(np.count_nonzero(visible))
+        self.frame_drawn += drawn
+        self.frame_culled += visible.size - drawn
+        self.drawn += drawn
+        self.culled += visible.size - drawn
+        return visible
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "drawn": self.drawn,
+            "culled": self.culled,
+            "frame_drawn": self.frame_drawn,
+            "frame_culled": self.frame_culled,
+        }
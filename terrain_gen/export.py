@@ -0,0 +1,212 @@
+"""
+Headless heightmap export.
+
+Generates a heightmap of any size tile by tile and streams it to disk, so
+the whole map is never held in memory:
+
+    python -m terrain_gen export world.npy --width 16384 --height 16384 --seed 7
+
+Formats, picked from the file extension or --format:
+    npy    float32 .npy file written through np.lib.format.open_memmap
+    raw    headerless float32 file written through np.memmap
+    png    16-bit grayscale PNG, heights from --range mapped to 0..65535,
+           compressed and written one band of rows at a time
+
+Rows of the file are y and columns are x. Tiles are generated on a process
+pool; for npy and raw each worker writes its tile straight into the
+memory-mapped file, for png the bands come back in order to the writer.
+The workers are not forked from the caller (see kernel.process_context), so
+a script calling export() with more than one worker needs the usual
+if __name__ == "__main__": guard around it.
+"""
+import argparse
+import os
+import struct
+import sys
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .config import octave_offsets_for_seed
+from .kernel import fbm, process_context, set_threads
+
+FORMATS = ("npy", "raw", "png")
+
+
+def _heights(params, x0, y0, width, height):
+    octave_offsets, scale, persistence, lacunarity = params
+    tile = fbm(np.arange(x0, x0 + width), np.arange(y0, y0 + height), octave_offsets,
+               (0.0, 0.0), scale, persistence, lacunarity)
+    # fbm is indexed [x, y], files are written row (y) by row
+    return tile.T
+
+
+def _open(path, fmt, shape):
+    if fmt == "npy":
+        return np.lib.format.open_memmap(path, mode="r+")
+    return np.memmap(path, dtype=np.float32, mode="r+", shape=shape)
+
+
+def _write_tile(path, fmt, shape, params, x0, y0, width, height):
+    out = _open(path, fmt, shape)
+    out[y0:y0 + height, x0:x0 + width] = _heights(params, x0, y0, width, height)
+    out.flush()
+
+
+def _png_band(params, y0, width, height, value_range):
+    low, high = value_range
+    heights = _heights(params, 0, y0, width, height)
+    scaled = (np.clip(heights, low, high) - low) * (65535.0 / (high - low))
+    return np.round(scaled).astype(np.uint16)
+
+
+class PngWriter(object):
+    """
+    Streaming writer for 16-bit grayscale PNG files.
+    """
+
+    def __init__(self, f, width, height, chunk_size=1 << 20):
+        self.f = f
+        self.width = width
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(6)
+        self.pending = []
+        self.pending_bytes = 0
+
+        f.write(b"\x89PNG\r\n\x1a\n")
+        # bit depth 16, color type 0 (grayscale), deflate, adaptive filtering, no interlace
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 16, 0, 0, 0, 0))
+
+    def _chunk(self, kind, data):
+        self.f.write(struct.pack(">I", len(data)))
+        self.f.write(kind)
+        self.f.write(data)
+        self.f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def _push(self, data):
+        if data:
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+        if self.pending_bytes >= self.chunk_size:
+            self._chunk(b"IDAT", b"".join(self.pending))
+            self.pending = []
+            self.pending_bytes = 0
+
+    def write_rows(self, rows):
+        """
+        :param rows: (n, width) uint16 array
+        """
+        # PNG samples are big-endian, every scanline starts with its filter type (0 = none)
+        samples = np.ascontiguousarray(rows, dtype=">u2")
+        scanlines = np.zeros((rows.shape[0], 1 + 2 * self.width), dtype=np.uint8)
+        scanlines[:, 1:] = samples.view(np.uint8).reshape(rows.shape[0], -1)
+        self._push(self.compressor.compress(scanlines.tobytes()))
+
+    def close(self):
+        self._push(self.compressor.flush())
+        if self.pending:
+            self._chunk(b"IDAT", b"".join(self.pending))
+        self._chunk(b"IEND", b"")
+
+
+def export(path, width, height, octave_offsets, scale=15.0, persistence=0.5, lacunarity=2.0,
+           fmt=None, tile_size=1024, workers=None, value_range=(-1.0, 1.0), log=None):
+    """
+    Generate a width x height heightmap into path without holding it in memory.
+    :param fmt: one of FORMATS, taken from the extension of path if None
+    :param workers: number of worker processes, 1 generates in this process
+    :param value_range: heights mapped to the full 16-bit range for png
+    """
+    if fmt is None:
+        fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format {fmt!r}, expected one of {FORMATS}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    params = ([tuple(map(float, o)) for o in octave_offsets], scale, persistence, lacunarity)
+    shape = (height, width)
+
+    if fmt == "png":
+        _export_png(path, shape, params, tile_size, workers, value_range, log)
+        return
+
+    # create the file at full size, the tiles are written into it afterwards
+    if fmt == "npy":
+        np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=shape).flush()
+    else:
+        np.memmap(path, dtype=np.float32, mode="w+", shape=shape).flush()
+
+    jobs = [(path, fmt, shape, params, x0, y0, min(tile_size, width - x0), min(tile_size, height - y0))
+            for y0 in range(0, height, tile_size) for x0 in range(0, width, tile_size)]
+    if workers == 1:
+        for done, job in enumerate(jobs, 1):
+            _write_tile(*job)
+            _progress(log, done, len(jobs))
+        return
+    with ProcessPoolExecutor(workers, mp_context=process_context(), initializer=set_threads,
+                             initargs=(1,)) as pool:
+        futures = [pool.submit(_write_tile, *job) for job in jobs]
+        for done, future in enumerate(futures, 1):
+            future.result()
+            _progress(log, done, len(jobs))
+
+
+def _export_png(path, shape, params, tile_size, workers, value_range, log):
+    height, width = shape
+    starts = list(range(0, height, tile_size))
+    with open(path, "wb") as f:
+        writer = PngWriter(f, width, height)
+        if workers == 1:
+            for done, y0 in enumerate(starts, 1):
+                writer.write_rows(_png_band(params, y0, width, min(tile_size, height - y0), value_range))
+                _progress(log, done, len(starts))
+        else:
+            with ProcessPoolExecutor(workers, mp_context=process_context(), initializer=set_threads,
+                                     initargs=(1,)) as pool:
+                # keep a bounded number of bands in flight, they are written in order
+                queue = deque()
+                submitted = 0
+                for done in range(1, len(starts) + 1):
+                    while submitted < len(starts) and len(queue) < 2 * workers:
+                        y0 = starts[submitted]
+                        queue.append(pool.submit(_png_band, params, y0, width,
+                                                 min(tile_size, height - y0), value_range))
+                        submitted += 1
+                    writer.write_rows(queue.popleft().result())
+                    _progress(log, done, len(starts))
+        writer.close()
+
+
+def _progress(log, done, total):
+    if log is not None:
+        log.write(f"\r{done}/{total} tiles")
+        if done == total:
+            log.write("\n")
+        log.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m terrain_gen export",
+                                     description="Stream a large heightmap to disk.")
+    parser.add_argument("path")
+    parser.add_argument("--width", type=int, required=True)
+    parser.add_argument("--height", type=int, required=True)
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the octave offsets")
+    parser.add_argument("--octaves", type=int, default=8)
+    parser.add_argument("--scale", type=float, default=15.0)
+    parser.add_argument("--persistence", type=float, default=0.5)
+    parser.add_argument("--lacunarity", type=float, default=2.0)
+    parser.add_argument("--tile-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, help="defaults to the number of CPUs")
+    parser.add_argument("--range", type=float, nargs=2, default=(-1.0, 1.0), metavar=("LOW", "HIGH"),
+                        help="heights mapped to 0..65535 for png")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    export(args.path, args.width, args.height, octave_offsets_for_seed(args.seed, args.octaves),
+           args.scale, args.persistence, args.lacunarity, args.format, args.tile_size,
+           args.workers, tuple(args.range), log=None if args.quiet else sys.stderr)
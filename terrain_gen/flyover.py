@@ -0,0 +1,73 @@
+"""
+Mesh data for the terraingeneration.py flyover.
+
+The flyover mesh is parameters[0] x parameters[1] cells scaled by
+parameters[4], two triangles per cell like main.py draws, with heights taken
+from a backends.noise_backend() and stepped by the Perlin factor
+parameters[5].
+
+Each lattice point is one vertex, shared by the triangles around it: the
+vertex buffer is a ring of ringSize() rows of rowVertexCount() vertices,
+row after row, and the index buffer joins every ring row to the next one,
+index block b joining ring rows b and b + 1. Scrolling replaces the oldest
+row with generateRow(), which leaves the indices as they are: they already
+join it to the row before. The block joining the newest row back round to
+the oldest one is the seam and is not drawn.
+"""
+import numpy as np
+
+from .mesh import ring_indices
+
+
+# funtion to map noise values between Min and Max, works on arrays too
+def mapNoise(noiseValue, maxMap = 1, minMap = 0.75):
+    return np.where(noiseValue > 0, noiseValue * maxMap, noiseValue * minMap)
+
+
+# Number of vertices in one row of the flyover mesh
+def rowVertexCount(value):
+    return 2 * int(value[0] * value[4] / 2) + 1
+
+
+# Number of vertex rows in the ring, one more than rows of cells
+def ringSize(value):
+    return 2 * int(value[1] * value[4] / 2) + 1
+
+
+# Vertices of lattice rows startRow .. startRow + rows - 1, as (rows, rowVertexCount, 3),
+# written into out if given
+def buildRows(value, noise, startRow, rows, out=None):
+    halfDataX = int(value[0] * value[4] / 2)
+    halfDataY = int(value[1] * value[4] / 2)
+
+    scaledResolutionX = int(value[2] * value[4] / 2)
+    scaledResolutionY = int(value[3] * value[4] / 2)
+
+    latticeY = startRow + np.arange(rows)
+    heights = mapNoise(noise.grid(np.arange(2 * halfDataX + 1) * value[5], latticeY * value[5]))
+
+    data = np.empty((rows, 2 * halfDataX + 1, 3), dtype=np.float32) if out is None else out.reshape(rows, -1, 3)
+    data[:, :, 0] = np.arange(-halfDataX, halfDataX + 1)[None, :] / scaledResolutionX
+    data[:, :, 1] = (latticeY - halfDataY)[:, None] / scaledResolutionY
+    data[:, :, 2] = heights.T
+    return data
+
+
+# -- Building Data --
+# Unique vertices and uint32 triangle indices of the whole ring
+def generateTerrain(value, noise):
+    rows = ringSize(value)
+    data = buildRows(value, noise, 0, rows).reshape(-1, 3)
+    return data, ring_indices(rowVertexCount(value), rows)
+
+
+# Ring row that the row of vertices scrolling in after offset rows replaces
+def rowSlot(value, offset):
+    return offset % ringSize(value)
+
+
+# Vertices of the row scrolling in after offset rows, for ring row rowSlot(value, offset),
+# written into out (e.g. the ring's staging row) if given
+def generateRow(value, noise, offset, out=None):
+    return buildRows(value, noise, ringSize(value) + offset, 1, out)[0]
+
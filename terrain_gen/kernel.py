@@ -0,0 +1,191 @@
+"""
+Compiled fbm kernel.
+
+perlin.fbm runs octave by octave over whole arrays, so an 8 octave
+heightfield makes a few dozen full-size temporaries. With Numba installed,
+fbm() here instead compiles one loop that computes every octave of a cell in
+registers and writes the cell once, with the rows (x) of the heightfield
+split across threads by prange and the GIL released while it runs. The
+arithmetic is the same as perlin.fbm step for step, including the float32
+rounding of the sample coordinates, so both give bit-identical heights.
+
+Without Numba, or with TERRAIN_GEN_KERNEL=numpy in the environment, fbm()
+is perlin.fbm. KERNEL tells which one is in use.
+
+fbm(workers=n) instead cuts the heightfield into n bands of rows evaluated on
+a shared thread pool, each band written straight into its rows of the output
+by a single-threaded call. Both kernels run without the GIL for most of the
+work (NumPy inside its array loops), and every cell is computed on its own,
+so the result is bit-identical for any number of workers. run_bands() does
+the same for any function filling rows of an array.
+"""
+import importlib.util
+import math
+import multiprocessing
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .perlin import GRAD_X, GRAD_Y, PERM
+from .perlin import fbm as numpy_fbm
+
+# Numba takes a good fraction of a second to import, so only whether it is
+# installed is checked here; it is imported and the kernels compiled by
+# _load() the first time fbm() needs them, never in processes that do not
+if os.environ.get("TERRAIN_GEN_KERNEL", "numba") == "numpy" or importlib.util.find_spec("numba") is None:
+    KERNEL = "numpy"
+else:
+    KERNEL = "numba"
+
+# (numba, parallel kernel, serial kernel) once loaded
+_compiled = None
+# thread count set before Numba was loaded, applied when it is
+_threads = None
+
+
+def _load():
+    """
+    :return: (numba, parallel kernel, serial kernel), imported and built on
+        the first call, or None with the NumPy kernel
+    """
+    global _compiled
+    if _compiled is None and KERNEL == "numba":
+        _compiled = _build()
+        if _threads is not None:
+            set_threads(_threads)
+    return _compiled
+
+
+def _build():
+    import numba
+
+    @numba.njit(nogil=True, cache=True)
+    def _lattice(t, repeat):
+        i = int(math.floor(np.fmod(t, repeat)))
+        ii = np.fmod(i + 1, int(repeat))
+        t = t - math.floor(t)
+        return i & 255, ii & 255, t, t * t * t * (t * (t * 6 - 15) + 10)
+
+    @numba.njit(nogil=True, cache=True)
+    def _grad(h, x, y):
+        h = h & 15
+        return x * GRAD_X[h] + y * GRAD_Y[h]
+
+    @numba.njit(nogil=True, cache=True)
+    def _pnoise2(x, y):
+        # perlin.pnoise2 for one sample, repeating every 1024 units
+        i, ii, x, fx = _lattice(np.float64(np.float32(x)), 1024.0)
+        j, jj, y, fy = _lattice(np.float64(np.float32(y)), 1024.0)
+        a = PERM[i]
+        b = PERM[ii]
+        low = _grad(PERM[PERM[a + j]], x, y)
+        low += fx * (_grad(PERM[PERM[b + j]], x - 1, y) - low)
+        high = _grad(PERM[PERM[a + jj]], x, y - 1)
+        high += fx * (_grad(PERM[PERM[b + jj]], x - 1, y - 1) - high)
+        low += fy * (high - low)
+        return low
+
+    def _fbm_rows(xs, ys, offsets, offset_x, offset_y, scale, persistence, lacunarity, out):
+        for i in numba.prange(xs.shape[0]):
+            for j in range(ys.shape[0]):
+                total = 0.0
+                amplitude = 1.0
+                frequency = 1.0
+                for o in range(offsets.shape[0]):
+                    sample_x = frequency * (xs[i] + offsets[o, 0] + offset_x) / scale
+                    sample_y = frequency * (ys[j] + offsets[o, 1] + offset_y) / scale
+                    total += amplitude * _pnoise2(sample_x, sample_y)
+                    amplitude *= persistence
+                    frequency *= lacunarity
+                out[i, j] = total
+
+    # prange splits rows across Numba's threads; the serial build is for callers
+    # that are threads themselves, Numba's thread pool is not safe to enter from several
+    return (numba,
+            numba.njit(parallel=True, nogil=True, cache=True)(_fbm_rows),
+            numba.njit(nogil=True, cache=True)(_fbm_rows))
+
+
+# worker count -> ThreadPoolExecutor shared by run_bands() calls
+_pools = {}
+
+
+def run_bands(rows, workers, function):
+    """
+    Call function(band) for bands of rows covering range(rows), band being a
+    slice, on workers threads, and wait for all of them.
+    """
+    if workers is None or workers <= 1 or rows < 2:
+        function(slice(0, rows))
+        return
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = _pools[workers] = ThreadPoolExecutor(workers, thread_name_prefix="terrain-band")
+    bounds = np.linspace(0, rows, min(workers, rows) + 1).astype(int)
+    futures = [pool.submit(function, slice(start, stop)) for start, stop in zip(bounds[:-1], bounds[1:])]
+    for future in futures:
+        future.result()
+
+
+def fbm(xs, ys, octave_offsets, offset=(0.0, 0.0), scale=15.0, persistence=0.5,
+        lacunarity=2.0, out=None, workers=None):
+    """
+    perlin.fbm with all octaves fused into one pass per cell when Numba is
+    available, same arguments and result.
+    :param workers: number of threads evaluating bands of rows (xs), None for
+        one call, which the Numba kernel still splits across its own threads
+    """
+    xs = np.ascontiguousarray(xs, dtype=np.float64)
+    ys = np.ascontiguousarray(ys, dtype=np.float64)
+    if out is None:
+        out = np.empty((xs.size, ys.size), dtype=np.float32)
+    banded = workers is not None and workers > 1
+
+    compiled = _load()
+    if compiled is None:
+        def band(rows):
+            numpy_fbm(xs[rows], ys, octave_offsets, offset, scale, persistence, lacunarity, out=out[rows])
+    else:
+        offsets = np.asarray(octave_offsets, dtype=np.float64).reshape(-1, 2)
+        kernel = compiled[2] if banded else compiled[1]
+
+        def band(rows):
+            kernel(xs[rows], ys, offsets, float(offset[0]), float(offset[1]), float(scale),
+                   float(persistence), float(lacunarity), out[rows])
+
+    run_bands(xs.size, workers, band)
+    return out
+
+
+def threads():
+    """
+    :return: number of threads the kernel splits rows across
+    """
+    compiled = _load()
+    return 1 if compiled is None else compiled[0].get_num_threads()
+
+
+def set_threads(count):
+    """
+    Split rows across count threads from now on, at most the number of CPUs.
+    Does not load Numba, the count is applied when it is.
+    """
+    global _threads
+    _threads = count
+    if _compiled is not None:
+        numba = _compiled[0]
+        numba.set_num_threads(min(count, numba.config.NUMBA_NUM_THREADS))
+
+
+def process_context():
+    """
+    Start method for process pools whose workers call fbm. A forked child
+    gets the parent's Numba and run_bands thread pools without their threads
+    and can hang at exit once the parent has used them, so workers come
+    from a fork server instead, or are spawned where there is none. Either
+    way they rebuild their state from their arguments and initializer.
+    :return: multiprocessing context to pass as mp_context
+    """
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return multiprocessing.get_context(method)
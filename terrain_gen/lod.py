@@ -0,0 +1,312 @@
+"""
+Distance-based level of detail with a patch quadtree.
+
+The visible area is covered by square patches of patch_size x patch_size
+cells. A patch at level of detail lod spans patch_size * 2**lod world cells,
+sampled every 2**lod cells, so every patch costs the same number of
+vertices and triangles however much ground it covers. select() starts from
+patches at the coarsest level around the viewer and splits each one into
+four while the viewer is within lod_distance * 2**(lod - 1) cells of it, the
+same ranges doubling per level as CDLOD, then splits more until neighbouring
+patches differ by at most one level.
+
+Seams: a patch next to a coarser one gets that edge's heights from the
+coarser level, the shared vertices copied and the ones in between linearly
+interpolated, so its edge lies exactly on the coarser patch's edge and no
+cracks open between them. Coarser levels may be generated with fewer
+octaves (TiledWorld decimate=True), so the same world vertex can have a
+different height at each level; every vertex on a patch boundary takes the
+height of the coarsest patch touching it, corners included, which every
+patch sharing it agrees on.
+"""
+import math
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# x, y: first world cell, lod: level of detail,
+# coarse: (-x, +x, -y, +y) edges shared with a patch one level coarser,
+# corners: level whose height each corner takes, (x, y), (x + span, y), (x, y + span), (x + span, y + span)
+Patch = namedtuple("Patch", ["x", "y", "lod", "coarse", "corners"])
+
+# the four edges in Patch.coarse order, as (dx, dy) towards the neighbour
+EDGES = ((-1, 0), (1, 0), (0, -1), (0, 1))
+# the four corners in Patch.corners order, as 0 or 1 spans from (x, y)
+CORNERS = ((0, 0), (1, 0), (0, 1), (1, 1))
+
+
+class LodTerrain(object):
+    """
+    Patches around the viewer plus a slot array holding their heights, which
+    HeightfieldRenderer can upload slot by slot and draw with draw(patches).
+    """
+
+    def __init__(self, source, patch_size, levels, lod_distance, slots=256):
+        """
+        :param source: tiles.TiledWorld or scheduler.TileScheduler, read with lod=
+        :param patch_size: cells per patch side, a multiple of 4
+        :param levels: number of levels of detail, 0 .. levels - 1
+        :param lod_distance: distance from the viewer up to which level 0 is used
+        :param slots: maximum number of patches kept
+        """
+        # corners are sampled up to two levels coarser than their patch
+        if patch_size % 4:
+            raise ValueError(f"patch_size must be a multiple of 4, not {patch_size}")
+        self.source = source
+        self.patch_size = patch_size
+        self.levels = levels
+        self.lod_distance = lod_distance
+
+        n = patch_size + 1
+        self.heights = np.zeros((slots, n, n), dtype=np.float32)
+        # lowest and highest height of each slot, for bounding boxes
+        self.bounds = np.zeros((slots, 2), dtype=np.float32)
+        # patch -> slot of its heights
+        self.slots = {}
+        self.free = list(range(slots - 1, -1, -1))
+        # patches whose source tiles were not all ready, read again by update()
+        self.incomplete = set()
+        # (patch, slot) of the last update, the patches to draw
+        self.visible = []
+        # level 0 patch (x // patch_size, y // patch_size) -> level of the selected patch covering it
+        self.cells = {}
+        # quantized viewer and radius of the last selection
+        self.anchor = None
+        # (patch, slot) of selected patches not read yet, nearest first
+        self.queued = []
+        self.unread = set()
+
+    def span(self, lod):
+        return self.patch_size * 2 ** lod
+
+    def _distance(self, x, y, lod, viewer):
+        # from the viewer to the nearest point of the patch, taken at height 0
+        span = self.span(lod)
+        vx, vy, vz = viewer
+        dx = max(x - vx, 0.0, vx - (x + span))
+        dy = max(y - vy, 0.0, vy - (y + span))
+        return math.sqrt(dx * dx + dy * dy + vz * vz)
+
+    def select(self, viewer, radius):
+        """
+        :param viewer: (x, y, z) position of the viewer in world cells
+        :param radius: distance from the viewer in cells that has to be covered
+        :return: list of Patch covering the square of cells around the viewer
+        """
+        top = self.levels - 1
+        span = self.span(top)
+        vx, vy = viewer[0], viewer[1]
+        leaves = {}
+        stack = [(x * span, y * span, top)
+                 for x in range(math.floor((vx - radius) / span), math.floor((vx + radius) / span) + 1)
+                 for y in range(math.floor((vy - radius) / span), math.floor((vy + radius) / span) + 1)]
+        while stack:
+            x, y, lod = stack.pop()
+            if lod > 0 and self._distance(x, y, lod, viewer) < self.lod_distance * 2 ** (lod - 1):
+                stack.extend(self._children(x, y, lod))
+            else:
+                leaves[(x, y)] = lod
+
+        # level of the leaf covering each level 0 patch
+        cells = {}
+        for (x, y), lod in leaves.items():
+            self._cover(cells, x, y, lod, lod)
+
+        # split leaves bordering a leaf more than one level finer, until none is left
+        split = True
+        while split:
+            split = False
+            for (x, y), lod in list(leaves.items()):
+                if lod > 1 and min(self._neighbours(cells, x, y, lod), default=lod) < lod - 1:
+                    del leaves[(x, y)]
+                    for child in self._children(x, y, lod):
+                        leaves[child[:2]] = lod - 1
+                    self._cover(cells, x, y, lod, lod - 1)
+                    split = True
+
+        self.cells = cells
+        patches = []
+        n = self.patch_size
+        for (x, y), lod in leaves.items():
+            # a coarser neighbour covers the whole edge, its first cell is enough
+            coarse = tuple(self._edge(cells, x, y, lod, edge, 1)[:1] == [lod + 1] for edge in EDGES)
+            corners = []
+            for cx, cy in CORNERS:
+                px = x // n + cx * 2 ** lod
+                py = y // n + cy * 2 ** lod
+                around = [(px - 1, py - 1), (px, py - 1), (px - 1, py), (px, py)]
+                corners.append(max(cells[k] for k in around if k in cells))
+            patches.append(Patch(x, y, lod, coarse, tuple(corners)))
+        return patches
+
+    def _children(self, x, y, lod):
+        half = self.span(lod - 1)
+        return [(x, y, lod - 1), (x + half, y, lod - 1),
+                (x, y + half, lod - 1), (x + half, y + half, lod - 1)]
+
+    def _cover(self, cells, x, y, lod, level):
+        n = self.patch_size
+        count = 2 ** lod
+        for cx in range(x // n, x // n + count):
+            for cy in range(y // n, y // n + count):
+                cells[(cx, cy)] = level
+
+    def _edge(self, cells, x, y, lod, edge, count=None):
+        # levels of the leaves just across one edge of a patch (or its first count cells),
+        # nothing outside the selection
+        n = self.patch_size
+        size = 2 ** lod
+        count = size if count is None else count
+        cx, cy = x // n, y // n
+        dx, dy = edge
+        if dx:
+            column = cx - 1 if dx < 0 else cx + size
+            keys = [(column, cy + i) for i in range(count)]
+        else:
+            row = cy - 1 if dy < 0 else cy + size
+            keys = [(cx + i, row) for i in range(count)]
+        return [cells[k] for k in keys if k in cells]
+
+    def _neighbours(self, cells, x, y, lod):
+        return [level for edge in EDGES for level in self._edge(cells, x, y, lod, edge)]
+
+    def read(self, patch, out):
+        """
+        Fill out with the (patch_size + 1) x (patch_size + 1) heights of a
+        patch, with its boundary matched to the coarser patches around it.
+        :return: True if the source had every tile ready
+        """
+        n = self.patch_size
+        span = self.span(patch.lod)
+        step = 2 ** patch.lod
+        complete = self.source.read(patch.x // step, patch.y // step, out, lod=patch.lod)
+
+        # edges along a coarser patch: its heights at every second vertex, interpolated between
+        strip = np.empty(n // 2 + 1, dtype=np.float32)
+        edges = []
+        for (dx, dy), coarse in zip(EDGES, patch.coarse):
+            if not coarse:
+                continue
+            x = (patch.x + (span if dx > 0 else 0)) // (2 * step)
+            y = (patch.y + (span if dy > 0 else 0)) // (2 * step)
+            if dx:
+                complete &= self.source.read(x, patch.y // (2 * step), strip[None, :], lod=patch.lod + 1)
+                edge = out[0 if dx < 0 else n, :]
+            else:
+                complete &= self.source.read(patch.x // (2 * step), y, strip[:, None], lod=patch.lod + 1)
+                edge = out[:, 0 if dy < 0 else n]
+            edge[0::2] = strip
+            edges.append(edge)
+
+        # corners touching a coarser patch than this one's edges know about
+        sample = np.empty((1, 1), dtype=np.float32)
+        for (cx, cy), level in zip(CORNERS, patch.corners):
+            if level == patch.lod:
+                continue
+            corner_step = 2 ** level
+            complete &= self.source.read((patch.x + cx * span) // corner_step,
+                                         (patch.y + cy * span) // corner_step, sample, lod=level)
+            out[cx * n, cy * n] = sample[0, 0]
+
+        for edge in edges:
+            edge[1::2] = (edge[:-2:2] + edge[2::2]) * 0.5
+        return complete
+
+    def update(self, viewer, radius, deadline=None):
+        """
+        Select the patches around the viewer and read the heights of the ones
+        that are new or were incomplete. Slots of patches that went out of view
+        are reused, patches that find no free slot are left out of visible.
+        The selection is only redone once the viewer has moved by a quarter
+        patch, in between only incomplete or queued patches are read.
+        :param deadline: time.perf_counter() value after which no more patches
+            are read, the rest stay queued (out of visible) for the next call
+        :return: list of slots whose heights changed
+        """
+        quantum = self.patch_size / 4.0
+        anchor = tuple(math.floor(v / quantum) for v in viewer) + (radius,)
+        if anchor != self.anchor:
+            self.anchor = anchor
+            viewer = tuple((a + 0.5) * quantum for a in anchor[:3])
+
+            patches = self.select(viewer, radius)
+            wanted = set(patches)
+            for patch in [p for p in self.slots if p not in wanted]:
+                self.free.append(self.slots.pop(patch))
+                self.incomplete.discard(patch)
+
+            self.visible = []
+            self.queued = []
+            # nearest first, so running out of slots or time leaves out distant patches
+            patches.sort(key=lambda p: self._distance(p.x, p.y, p.lod, viewer))
+            for patch in patches:
+                slot = self.slots.get(patch)
+                if slot is not None and patch not in self.unread:
+                    self.visible.append((patch, slot))
+                elif slot is not None or self.free:
+                    if slot is None:
+                        slot = self.slots[patch] = self.free.pop()
+                    self.queued.append((patch, slot))
+            self.unread = {patch for patch, _ in self.queued}
+
+        changed = []
+        for patch, slot in self.visible:
+            if patch in self.incomplete and not self._late(deadline, changed):
+                self._fill(patch, slot)
+                changed.append(slot)
+        while self.queued and not self._late(deadline, changed):
+            patch, slot = self.queued.pop(0)
+            self.unread.discard(patch)
+            self._fill(patch, slot)
+            changed.append(slot)
+            self.visible.append((patch, slot))
+        return changed
+
+    @staticmethod
+    def _late(deadline, changed):
+        # always read at least one patch per call so everything arrives eventually
+        return deadline is not None and changed and time.perf_counter() >= deadline
+
+    def _fill(self, patch, slot):
+        heights = self.heights[slot]
+        if self.read(patch, heights):
+            self.incomplete.discard(patch)
+        else:
+            self.incomplete.add(patch)
+        self.bounds[slot] = heights.min(), heights.max()
+
+    def boxes(self):
+        """
+        :return: (lo, hi) float32 (n, 3) corners of the visible patches'
+            bounding boxes in world cells and heights, in visible order
+        """
+        lo = np.empty((len(self.visible), 3), dtype=np.float32)
+        hi = np.empty((len(self.visible), 3), dtype=np.float32)
+        for i, (patch, slot) in enumerate(self.visible):
+            span = self.span(patch.lod)
+            lo[i] = patch.x, patch.y, self.bounds[slot, 0]
+            hi[i] = patch.x + span, patch.y + span, self.bounds[slot, 1]
+        return lo, hi
+
+    def clear(self):
+        """
+        Forget every patch, call after changing the noise parameters.
+        """
+        self.free.extend(self.slots.values())
+        self.slots = {}
+        self.incomplete = set()
+        self.visible = []
+        self.cells = {}
+        self.anchor = None
+        self.queued = []
+        self.unread = set()
+
+    def stats(self):
+        """
+        :return: number of visible patches per level of detail
+        """
+        counts = [0] * self.levels
+        for patch, _ in self.visible:
+            counts[patch.lod] += 1
+        return {"patches": len(self.visible), "queued": len(self.queued), "per_lod": counts}
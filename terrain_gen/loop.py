@@ -0,0 +1,92 @@
+"""
+Fixed timestep update loop for the GLUT viewers.
+
+The simulation (scrolling the terrain) advances in ticks of a fixed length
+however often GLUT calls back, so scroll speed no longer depends on frame
+rate or on how long generation takes. Drawing happens in between at display
+rate, with alpha telling how far the clock is into the next tick so that
+positions can be interpolated. A call to advance() also sets a deadline
+budget seconds away that long-running work (tile polling, patch reads)
+checks to stop and carry on next frame.
+
+    ticks = loop.advance()
+    for _ in range(ticks):
+        tick()
+    update_terrain(deadline=loop.deadline)
+    if loop.take_redraw():
+        glutPostRedisplay()
+"""
+import time
+
+
+class FixedStepLoop(object):
+
+    def __init__(self, step, max_steps=5, budget=None, clock=time.perf_counter):
+        """
+        :param step: length of one tick in seconds
+        :param max_steps: most ticks run per advance(), time beyond that is dropped
+        :param budget: seconds of deferred work allowed per advance(), None for no limit
+        :param clock: function returning the time in seconds
+        """
+        self.step = step
+        self.max_steps = max_steps
+        self.budget = budget
+        self.clock = clock
+
+        self.last = None
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.deadline = None
+        self.ticks = 0
+        # seconds of simulation skipped because the loop fell more than max_steps behind
+        self.dropped = 0.0
+        self.redraw = True
+
+    def advance(self):
+        """
+        :return: number of ticks to run now
+        """
+        now = self.clock()
+        if self.last is None:
+            self.last = now
+        self.accumulator += now - self.last
+        self.last = now
+
+        ticks = int(self.accumulator // self.step)
+        if ticks > self.max_steps:
+            # too far behind to catch up, slow the simulation down instead of spiralling
+            self.dropped += (ticks - self.max_steps) * self.step
+            ticks = self.max_steps
+            self.accumulator = self.step * ticks
+        self.accumulator -= ticks * self.step
+        self.alpha = self.accumulator / self.step
+        self.ticks += ticks
+        self.deadline = None if self.budget is None else now + self.budget
+        if ticks:
+            self.redraw = True
+        return ticks
+
+    def out_of_time(self):
+        """
+        :return: True once the work budget of this advance() is spent
+        """
+        return self.deadline is not None and self.clock() >= self.deadline
+
+    def interpolate(self, previous, current):
+        """
+        :return: a value between the states before and after the last tick, at alpha
+        """
+        return previous + (current - previous) * self.alpha
+
+    def invalidate(self):
+        """
+        Ask for a redraw, e.g. after new terrain data arrived or the view moved.
+        """
+        self.redraw = True
+
+    def take_redraw(self):
+        """
+        :return: whether a redraw was asked for since the last call
+        """
+        redraw, self.redraw = self.redraw, False
+        return redraw
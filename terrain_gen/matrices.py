@@ -0,0 +1,100 @@
+"""
+4x4 transformation matrices for the shader viewer, as flat row-major float32
+arrays (upload with transpose set to GL_TRUE).
+"""
+import math
+
+import numpy as np
+
+
+# Rotation Matrix Generator
+def generateRotation(transformationData = None):
+    if not transformationData or transformationData[0] == "":
+        transformationMatrix = np.array(
+            [
+                1.0,0.0,0.0,0.0,
+                0.0,1.0,0.0,0.0,
+                0.0,0.0,1.0,0.0,
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+        return transformationMatrix
+    cTheta = np.cos(transformationData[1] / 180 * math.pi)
+    sTheta = np.sin(transformationData[1] / 180 * math.pi)
+
+    # x - axis rotation
+    if transformationData[0] == "pitch":
+        transformationMatrix = np.array(
+            [
+                1.0,0.0,0.0,0.0,
+                0.0,cTheta,-sTheta,0.0,
+                0.0,sTheta,cTheta,0.0,
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+
+    # y - axis rotation
+    elif transformationData[0] == "yaw":
+        transformationMatrix = np.array(
+            [
+                cTheta,0.0,sTheta,0.0,
+                0.0,1.0,0.0,0.0,
+                -sTheta,0.0,cTheta,0.0,
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+
+    # z - axis rotation
+    elif transformationData[0] == "roll":
+        transformationMatrix = np.array(
+            [
+                cTheta,-sTheta,0.0,0.0,
+                sTheta,cTheta,0.0,0.0,
+                0.0,0.0,1.0,0.0,
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+
+    return transformationMatrix
+
+# Translation Matrix Generator
+def generateTranslation(translationData = None):
+    if not translationData or translationData[0] == "":
+        transformationMatrix = np.array(
+            [
+                1.0,0.0,0.0,0.0,
+                0.0,1.0,0.0,0.0,
+                0.0,0.0,1.0,0.0,
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+
+        return transformationMatrix
+
+    transformationMatrix = np.array(
+            [
+                1.0,0.0,0.0,translationData[0],
+                0.0,1.0,0.0,translationData[1],
+                0.0,0.0,1.0,translationData[2],
+                0.0,0.0,0.0,1.0,
+            ],
+            np.float32,
+        )
+
+    return transformationMatrix
+
+# Perspective Projection Generatior based on Field of View
+def generatePerspective(fieldOfView=50):
+    fov = (fieldOfView * math.pi)/180
+    tanFOVHalf = np.tan(fov / 2.0)
+    f = 1/tanFOVHalf
+    projectionMatrix = np.array([f, 0.0, 0.0, 0.0,
+                                0.0, 1.0, 0.0, 0.0,
+                                0.0, 0.0, 1.0, 0.0,
+                                0.0, 0.0, 1.0, 1.0], dtype = np.float32)
+    return projectionMatrix
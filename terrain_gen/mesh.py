@@ -0,0 +1,257 @@
+"""
+NumPy mesh building for grid heightfields.
+
+A width x height grid of heights becomes width * height unique vertices,
+vertex (x, y) at index x * height + y so that the vertex array has the same
+[x, y] order as the heightfield, plus an index array with two triangles per
+cell, both wound counter-clockwise seen from above (+z).
+"""
+import numpy as np
+
+from .scroll import wrap_runs
+
+# interleaved vertex layout: position, normal, color
+VERTEX_FLOATS = 9
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+
+def grid_indices(width, height):
+    """
+    :return: uint32 array of 6 * (width - 1) * (height - 1) triangle indices
+    """
+    x, y = np.meshgrid(np.arange(width - 1, dtype=np.uint32),
+                       np.arange(height - 1, dtype=np.uint32), indexing="ij")
+    a = x * height + y
+    b = a + 1
+    c = a + height
+    d = c + 1
+    # (x, y + 1), (x, y), (x + 1, y + 1) then (x + 1, y + 1), (x, y), (x + 1, y),
+    # both counter-clockwise seen from above so that back face culling keeps them
+    return np.stack([b, a, d, d, a, c], axis=-1).ravel()
+
+
+def row_indices(width, rows, next_rows):
+    """
+    Triangle indices between lattice rows of a row-major grid, vertex
+    (x, row) at index row * width + x, wound like grid_indices. Rows do not
+    have to be neighbours in memory, so a ring buffer of rows can join its
+    newest row to the one before wherever they sit.
+    :param rows: int or 1D array of rows
+    :param next_rows: rows joined to them, same shape
+    :return: uint32 array of 6 * (width - 1) indices per row, row by row
+    """
+    x = np.arange(width - 1, dtype=np.uint32)
+    a = np.asarray(rows, dtype=np.uint32)[..., None] * width + x
+    c = np.asarray(next_rows, dtype=np.uint32)[..., None] * width + x
+    # (x, next), (x, row), (x + 1, next) then (x + 1, next), (x, row), (x + 1, row),
+    # both counter-clockwise with x and rows as x and y
+    return np.stack([c, a, c + 1, c + 1, a, a + 1], axis=-1).ravel()
+
+
+def ring_indices(width, rows):
+    """
+    :return: row_indices joining every row of a ring of rows to the next
+        one, the last row to the first
+    """
+    first = np.arange(rows)
+    return row_indices(width, first, (first + 1) % rows)
+
+
+def block_indices(width, height, block):
+    """
+    Triangle indices like grid_indices, but ordered block by block so that
+    each block x block cells of the grid is one contiguous range of indices
+    and can be drawn or culled on its own.
+    :return: (uint32 indices, int (n, 2) first index and index count per block,
+        int (n, 4) vertex x0, y0, x1, y1 spanned by each block, inclusive)
+    """
+    cells = grid_indices(width, height).reshape(width - 1, height - 1, 6)
+    parts = []
+    ranges = []
+    extents = []
+    first = 0
+    for x0 in range(0, width - 1, block):
+        for y0 in range(0, height - 1, block):
+            part = cells[x0:x0 + block, y0:y0 + block].ravel()
+            parts.append(part)
+            ranges.append((first, part.size))
+            extents.append((x0, y0, min(x0 + block, width - 1), min(y0 + block, height - 1)))
+            first += part.size
+    return np.concatenate(parts), np.array(ranges), np.array(extents)
+
+
+def index_runs(ranges, blocks):
+    """
+    :param ranges: (first index, index count) of every block
+    :param blocks: ids of the blocks to draw, or None for all of them
+    :return: list of (first index, index count), consecutive blocks merged
+    """
+    if blocks is None:
+        return [(0, int(ranges[:, 1].sum()))]
+    blocks = np.sort(np.asarray(blocks, dtype=np.intp))
+    if blocks.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(blocks) != 1) + 1
+    starts = blocks[np.concatenate([[0], breaks])]
+    ends = blocks[np.concatenate([breaks - 1, [blocks.size - 1]])]
+    firsts = ranges[starts, 0]
+    return list(zip(firsts.tolist(), (ranges[ends, 0] + ranges[ends, 1] - firsts).tolist()))
+
+
+def block_bounds(heights, block, wrap=None):
+    """
+    Lowest and highest height over the vertices of each block of
+    block_indices, for bounding boxes.
+    :param wrap: for a toroidal heightfield, the array index (x, y) of vertex
+        (0, 0), see scroll.ScrollingHeightfield.wrap
+    :return: (min, max) arrays of shape (blocks along x, blocks along y)
+    """
+    bounds = BlockBounds(heights.shape[0], heights.shape[1], block)
+    return bounds.update(heights, wrap)
+
+
+class BlockBounds(object):
+    """
+    block_bounds into arrays allocated once, for a heightfield whose bounds
+    are taken again every frame.
+    """
+
+    def __init__(self, width, height, block):
+        self.block = block
+        blocks_x = len(range(0, width - 1, block))
+        blocks_y = len(range(0, height - 1, block))
+        self.lo = np.empty((blocks_x, blocks_y), dtype=np.float32)
+        self.hi = np.empty((blocks_x, blocks_y), dtype=np.float32)
+        # heights reduced over the x vertices of each block, then the second run of a wrapped block
+        self._rows = np.empty((blocks_x, height), dtype=np.float32)
+        self._row = np.empty(height, dtype=np.float32)
+        # the same along y, a value per x block
+        self._column = np.empty(blocks_x, dtype=np.float32)
+        self._wrapped = np.empty(blocks_x, dtype=np.float32)
+
+    def update(self, heights, wrap=None):
+        """
+        :param heights: (width, height) heightfield, toroidal if wrap is given
+        :param wrap: see block_bounds
+        :return: (lo, hi), updated in place
+        """
+        wrap = (0, 0) if wrap is None else wrap
+        for reduce, bounds in ((np.minimum, self.lo), (np.maximum, self.hi)):
+            self._reduce(heights, 0, wrap[0], reduce, self._rows)
+            self._reduce(self._rows, 1, wrap[1], reduce, bounds)
+        return self.lo, self.hi
+
+    def _reduce(self, values, axis, index, reduce, out):
+        # out[k] along axis, each block reduced over the at most two runs of the torus it covers
+        size = values.shape[axis]
+        wrapped = self._row if axis == 0 else self._wrapped
+        for k, first in enumerate(range(0, size - 1, self.block)):
+            # a block also owns the first vertex of the next one
+            count = min(self.block, size - 1 - first) + 1
+            part = out[k] if axis == 0 else self._column
+            for r, (_, run, start) in enumerate(wrap_runs(index + first, count, size)):
+                cells = values[start:start + run] if axis == 0 else values[:, start:start + run]
+                if r == 0:
+                    reduce.reduce(cells, axis=axis, out=part)
+                else:
+                    reduce.reduce(cells, axis=axis, out=wrapped)
+                    reduce(part, wrapped, out=part)
+            if axis == 1:
+                out[:, k] = part
+
+
+def displaced_range(lo, hi, height_scale, flattening_threshold):
+    """
+    :return: (z of lo, z of hi) after displace(), so boxes of heights bound the drawn vertices
+    """
+    lo = np.asarray(lo)
+    hi = np.asarray(hi)
+    return (np.where(lo < flattening_threshold, 0.0, lo * height_scale),
+            np.where(hi < flattening_threshold, 0.0, hi * height_scale))
+
+
+def grid_positions(width, height):
+    """
+    :return: float32 (width * height, 2) array of vertex x, y in vertex order
+    """
+    x, y = np.meshgrid(np.arange(width, dtype=np.float32),
+                       np.arange(height, dtype=np.float32), indexing="ij")
+    return np.stack([x, y], axis=-1).reshape(-1, 2)
+
+
+def displace(heights, height_scale, flattening_threshold, out, mask=None):
+    """
+    Vertex z from heights: scaled, and 0 below the flattening threshold.
+    :param out: may be heights itself
+    :param mask: bool array of the heights' shape for the cells to flatten, allocated if None
+    """
+    mask = np.less(heights, flattening_threshold, out=mask)
+    np.multiply(heights, height_scale, out=out)
+    np.copyto(out, 0, where=mask)
+
+
+class GridMesh(object):
+    """
+    Interleaved float32 vertex array and shared index array for a height grid.
+    The x/y lattice and the indices are built once, update() only rewrites
+    the parts that depend on the heights.
+    """
+
+    def __init__(self, width, height, block=None):
+        """
+        :param block: order the indices in blocks of block x block cells, see block_indices
+        """
+        self.width = width
+        self.height = height
+
+        self.vertices = np.zeros((width * height, VERTEX_FLOATS), dtype=np.float32)
+        grid = self.vertices.reshape(width, height, VERTEX_FLOATS)
+        self.positions = grid[:, :, 0:3]
+        self.normals = grid[:, :, 3:6]
+        self.colors = grid[:, :, 6:9]
+
+        # heights of a block of vertices are displaced here before going into the strided z
+        self._z = np.empty(width * height, dtype=np.float32)
+        self._mask = np.empty(width * height, dtype=bool)
+
+        self.positions[:, :, 0] = np.arange(width)[:, None]
+        self.positions[:, :, 1] = np.arange(height)[None, :]
+        if block is None:
+            self.indices = grid_indices(width, height)
+            self.block_ranges = np.array([(0, self.indices.size)])
+            self.block_extents = np.array([(0, 0, width - 1, height - 1)])
+        else:
+            self.indices, self.block_ranges, self.block_extents = block_indices(width, height, block)
+
+    def update(self, heights, normals, colors, height_scale, flattening_threshold,
+               rows=slice(None)):
+        """
+        Rewrite z, normals and colors for a range of x rows.
+        :param heights: (width, height) heightfield
+        :param normals: (width, height, 3) normals
+        :param colors: (width, height, 3) RGB colors in 0..1
+        :param rows: slice of x rows to update
+        """
+        self.write(rows, slice(None), heights[rows], normals[rows], colors[rows],
+                   height_scale, flattening_threshold)
+
+    def write(self, xs, ys, heights, normals, colors, height_scale, flattening_threshold):
+        """
+        Rewrite z, normals and colors of a block of vertices from arrays of the
+        block's shape, e.g. one of the blocks of scroll.ScrollingHeightfield.blocks().
+        :param xs: slice of x vertices of the block
+        :param ys: slice of y vertices of the block
+        """
+        z = self._z[:heights.size].reshape(heights.shape)
+        z[...] = heights
+        displace(z, height_scale, flattening_threshold, z, self._mask[:z.size].reshape(z.shape))
+        self.positions[xs, ys, 2] = z
+        self.normals[xs, ys] = normals
+        self.colors[xs, ys] = colors
+
+    def vertex_range(self, rows=slice(None)):
+        """
+        :return: (first vertex, vertex count) covered by a slice of x rows
+        """
+        start, stop, _ = rows.indices(self.width)
+        return start * self.height, max(stop - start, 0) * self.height
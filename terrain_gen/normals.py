@@ -0,0 +1,219 @@
+"""
+Vectorized heightfield normals.
+
+Normals are computed from finite differences over whole blocks of the
+heightfield at once. Neighbours outside the heightfield are clamped to the
+edge. Results go into a (width, height, 3) float32 array in the same [x, y]
+order as the heights, which is also the vertex order of mesh.GridMesh, so
+the array (or GridMesh.normals itself) can be uploaded as is.
+
+scroll_normals keeps the normals of a scroll.ScrollingHeightfield in step
+with it, in the same toroidal layout as its heights, recomputing only next
+to the new cells and the view edges that moved. A ScrollingNormals does the
+same with scratch arrays allocated once, for doing it every frame: each
+block is gathered from the torus with np.take into a flat array and the
+differences are taken between shifted 1D views of it, the same operations
+in the same order as normal_map, so the normals are bit-identical.
+"""
+import numpy as np
+
+
+def _gradients(padded, method):
+    # padded holds the block plus one cell of neighbours on every side
+    if method == "central":
+        gx = (padded[2:, 1:-1] - padded[:-2, 1:-1]) * 0.5
+        gy = (padded[1:-1, 2:] - padded[1:-1, :-2]) * 0.5
+    elif method == "sobel":
+        gx = ((padded[2:, :-2] + 2 * padded[2:, 1:-1] + padded[2:, 2:])
+              - (padded[:-2, :-2] + 2 * padded[:-2, 1:-1] + padded[:-2, 2:])) * 0.125
+        gy = ((padded[:-2, 2:] + 2 * padded[1:-1, 2:] + padded[2:, 2:])
+              - (padded[:-2, :-2] + 2 * padded[1:-1, :-2] + padded[2:, :-2])) * 0.125
+    else:
+        raise ValueError(f"unknown normal method {method!r}")
+    return gx, gy
+
+
+def grow(block, size):
+    """
+    Widen a slice by one cell on each side, the normals of those cells depend
+    on the cells inside it.
+    """
+    start, stop, _ = block.indices(size)
+    return slice(max(start - 1, 0), min(stop + 1, size))
+
+
+def normal_map(heights, out=None, method="central", z=2.0, xs=slice(None), ys=slice(None)):
+    """
+    Unit normals of a heightfield, or of a block of it.
+    :param heights: (width, height) heightfield
+    :param out: (width, height, 3) array to write into, allocated if None
+    :param method: "central" differences or "sobel" filter
+    :param z: z component before normalizing, larger values give flatter shading
+    :param xs: slice of x cells to compute
+    :param ys: slice of y cells to compute
+    :return: out
+    """
+    width, height = heights.shape
+    if out is None:
+        out = np.empty((width, height, 3), dtype=np.float32)
+
+    x0, x1, _ = xs.indices(width)
+    y0, y1, _ = ys.indices(height)
+    if x1 <= x0 or y1 <= y0:
+        return out
+
+    # block plus neighbours, padded with the edge value where the heightfield ends
+    lo_x, hi_x = max(x0 - 1, 0), min(x1 + 1, width)
+    lo_y, hi_y = max(y0 - 1, 0), min(y1 + 1, height)
+    pad = ((1 - (x0 - lo_x), 1 - (hi_x - x1)), (1 - (y0 - lo_y), 1 - (hi_y - y1)))
+    padded = np.pad(heights[lo_x:hi_x, lo_y:hi_y], pad, mode="edge")
+    gx, gy = _gradients(padded, method)
+
+    block = out[x0:x1, y0:y1]
+    block[..., 0] = -gx
+    block[..., 1] = -gy
+    block[..., 2] = z
+    block /= np.sqrt(gx * gx + gy * gy + z * z)[..., None]
+    return out
+
+
+def scroll_normals(field, out, method="central", z=2.0):
+    """
+    Bring normals up to date after a ScrollingHeightfield.scroll_to call,
+    recomputing only around the cells that call wrote.
+    :param field: the scroll.ScrollingHeightfield
+    :param out: (size, size, 3) normals of the field before the call, laid
+        out toroidally like field.heights
+    :return: out
+    """
+    return ScrollingNormals(field.size, method, z).update(field, out)
+
+
+def changed_blocks(field):
+    """
+    :return: list of (xs, ys) view slices of the cells whose normals the last
+        scroll_to call of field changed
+    """
+    n = field.size
+    if field.regenerated:
+        return [(slice(0, n), slice(0, n))]
+    # in view cells from here on
+    blocks = [field.view_block(xs, ys) for xs, ys in field.dirty]
+    dx, dy = field.moved
+    # the new edge cells lost their neighbour across it and are clamped now
+    if dx > 0:
+        blocks.append((slice(0, 1), slice(0, n)))
+    elif dx < 0:
+        blocks.append((slice(n - 1, n), slice(0, n)))
+    if dy > 0:
+        blocks.append((slice(0, n), slice(0, 1)))
+    elif dy < 0:
+        blocks.append((slice(0, n), slice(n - 1, n)))
+    return [(grow(xs, n), grow(ys, n)) for xs, ys in blocks]
+
+
+class ScrollingNormals(object):
+    """
+    scroll_normals for a size x size ScrollingHeightfield without allocating
+    arrays once constructed.
+    """
+
+    def __init__(self, size, method="central", z=2.0):
+        if method not in ("central", "sobel"):
+            raise ValueError(f"unknown normal method {method!r}")
+        self.size = size
+        self.method = method
+        self.z = z
+        padded = size + 2
+        self._cells = np.arange(padded, dtype=np.intp)
+        self._rows = np.empty(padded, dtype=np.intp)
+        self._columns = np.empty(padded, dtype=np.intp)
+        # heights of a block plus its neighbours, and the half gathered along one axis
+        self._padded = np.empty(padded * padded, dtype=np.float32)
+        self._gathered = np.empty(size * padded, dtype=np.float32)
+        self._gx = np.empty(size * padded, dtype=np.float32)
+        self._gy = np.empty(size * padded, dtype=np.float32)
+        self._t = np.empty(size * padded, dtype=np.float32)
+        self._normals = np.empty((size * padded, 3), dtype=np.float32)
+
+    def update(self, field, out):
+        """
+        :param field: the scroll.ScrollingHeightfield, just scrolled
+        :param out: (size, size, 3) normals laid out toroidally like field.heights
+        :return: out
+        """
+        for xs, ys in changed_blocks(field):
+            normals = self._block(field, xs, ys)
+            for (ax, ay), (vx, vy) in field.blocks(xs, ys):
+                out[ax, ay] = normals[vx.start - xs.start:vx.stop - xs.start,
+                                      vy.start - ys.start:vy.stop - ys.start]
+        return out
+
+    def _indices(self, out, first, count, origin):
+        # array indices of count view cells from first, clamped to the view, mod size left to np.take
+        out = out[:count]
+        np.add(self._cells[:count], first, out=out)
+        np.clip(out, 0, self.size - 1, out=out)
+        np.add(out, origin, out=out)
+        return out
+
+    def _block(self, field, xs, ys):
+        # normals of view cells xs, ys as a (width, height + 2, 3) view, the last two columns unused
+        width, height = xs.stop - xs.start, ys.stop - ys.start
+        rows = width + 2
+        columns = height + 2
+        row_index = self._indices(self._rows, xs.start - 1, rows, field.origin[0])
+        column_index = self._indices(self._columns, ys.start - 1, columns, field.origin[1])
+        padded = self._padded[:rows * columns].reshape(rows, columns)
+        # along the axis that leaves the smaller intermediate first
+        if rows <= columns:
+            gathered = self._gathered[:rows * self.size].reshape(rows, self.size)
+            np.take(field.heights, row_index, axis=0, out=gathered, mode="wrap")
+            np.take(gathered, column_index, axis=1, out=padded, mode="wrap")
+        else:
+            gathered = self._gathered[:self.size * columns].reshape(self.size, columns)
+            np.take(field.heights, column_index, axis=1, out=gathered, mode="wrap")
+            np.take(gathered, row_index, axis=0, out=padded, mode="wrap")
+
+        # cell (i, j) of the block is padded[i + 1, j + 1], flat index (i + 1) * columns + j + 1;
+        # one pass over the flat indices from the first cell to the last also covers the
+        # pairs of padding cells between rows, whose results are dropped
+        p = self._padded[:rows * columns]
+        c = columns
+        length = width * c - 2
+        gx, gy, t = self._gx[:length], self._gy[:length], self._t[:length]
+        if self.method == "central":
+            np.subtract(p[2 * c + 1:2 * c + 1 + length], p[1:1 + length], out=gx)
+            np.multiply(gx, 0.5, out=gx)
+            np.subtract(p[c + 2:c + 2 + length], p[c:c + length], out=gy)
+            np.multiply(gy, 0.5, out=gy)
+        else:
+            self._sobel(gx, p, 2 * c, 0, 1)
+            self._sobel(gy, p, 2, 0, c)
+
+        normals = self._normals[:length]
+        np.negative(gx, out=normals[:, 0])
+        np.negative(gy, out=normals[:, 1])
+        normals[:, 2] = self.z
+        np.multiply(gx, gx, out=gx)
+        np.multiply(gy, gy, out=gy)
+        np.add(gx, gy, out=gx)
+        np.add(gx, self.z * self.z, out=gx)
+        np.sqrt(gx, out=gx)
+        for axis in range(3):
+            np.divide(normals[:, axis], gx, out=normals[:, axis])
+        return self._normals[:width * c].reshape(width, c, 3)
+
+    def _sobel(self, out, p, high, low, across):
+        # ((a + 2 b + c) - (d + 2 e + f)) / 8 of normal_map, with a, b, c the cells across from
+        # flat index high on, d, e, f the same from low; for cell (i, j), index k = i * columns + j
+        # is padded[i, j], the padding cell up-left of it
+        length = out.size
+        t = self._t[:length]
+        for start, target in ((high, out), (low, t)):
+            centre = start + across
+            np.multiply(p[centre:centre + length], 2, out=target)
+            np.add(p[start:start + length], target, out=target)
+            np.add(target, p[centre + across:centre + across + length], out=target)
+        np.subtract(out, t, out=out)
+        np.multiply(out, 0.125, out=out)
@@ -0,0 +1,46 @@
+"""
+On-screen text for the profiling overlay.
+
+Draws lines of text in the top left corner of the viewport with GLUT bitmap
+fonts, on top of whatever was drawn, from either viewer: it switches to the
+fixed function pipeline and pixel coordinates for the text and restores the
+program, matrices and enables it found.
+"""
+import OpenGL.GL as gl
+import OpenGL.GLUT as glut
+
+FONT = glut.GLUT_BITMAP_8_BY_13
+LINE_HEIGHT = 15
+
+
+def draw_text(lines, color=(1.0, 1.0, 0.0), margin=10):
+    if not lines:
+        return
+    _, _, width, height = gl.glGetIntegerv(gl.GL_VIEWPORT)
+    program = gl.glGetIntegerv(gl.GL_CURRENT_PROGRAM)
+
+    gl.glUseProgram(0)
+    gl.glPushAttrib(gl.GL_ENABLE_BIT | gl.GL_CURRENT_BIT)
+    gl.glDisable(gl.GL_LIGHTING)
+    gl.glDisable(gl.GL_DEPTH_TEST)
+    gl.glDisable(gl.GL_TEXTURE_1D)
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glPushMatrix()
+    gl.glLoadIdentity()
+    gl.glOrtho(0, width, 0, height, -1, 1)
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glPushMatrix()
+    gl.glLoadIdentity()
+
+    gl.glColor3f(*color)
+    for i, line in enumerate(lines):
+        gl.glRasterPos2i(margin, height - margin - (i + 1) * LINE_HEIGHT)
+        for character in line:
+            glut.glutBitmapCharacter(FONT, ord(character))
+
+    gl.glPopMatrix()
+    gl.glMatrixMode(gl.GL_PROJECTION)
+    gl.glPopMatrix()
+    gl.glMatrixMode(gl.GL_MODELVIEW)
+    gl.glPopAttrib()
+    gl.glUseProgram(program)
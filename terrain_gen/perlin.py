@@ -0,0 +1,132 @@
+"""
+Vectorized gradient (Perlin) noise and fractal Brownian motion.
+
+pnoise2 reproduces the `noise` C extension's noise.pnoise2 over whole arrays
+of sample coordinates, so a full heightfield costs one array pass per octave
+instead of one Python call per octave per cell.
+
+Accuracy: coordinates are rounded to float32 exactly like the C extension
+does when parsing its arguments, but the interpolation itself runs in float64.
+The only remaining difference is the extension's float32 arithmetic, so a
+single pnoise2 sample agrees to within PNOISE2_TOLERANCE (the error peaks
+around 1.4e-6 near the origin) and an 8 octave fbm heightfield to within
+FBM_TOLERANCE of the per-pixel loop it replaces. That is several
+orders of magnitude below the spacing of the color_heights bands, so
+coloring and the flattening threshold behave the same.
+"""
+import numpy as np
+
+# maximum absolute difference between pnoise2() and noise.pnoise2 for one sample
+PNOISE2_TOLERANCE = 2e-6
+# maximum absolute difference between fbm() and the per-pixel noise.pnoise2 loop
+FBM_TOLERANCE = 1e-5
+
+# Ken Perlin's reference permutation, doubled so PERM[A + j] never wraps
+PERM = np.array([
+    151, 160, 137, 91, 90, 15, 131, 13, 201, 95, 96, 53, 194, 233, 7, 225,
+    140, 36, 103, 30, 69, 142, 8, 99, 37, 240, 21, 10, 23, 190, 6, 148,
+    247, 120, 234, 75, 0, 26, 197, 62, 94, 252, 219, 203, 117, 35, 11, 32,
+    57, 177, 33, 88, 237, 149, 56, 87, 174, 20, 125, 136, 171, 168, 68,
+    175, 74, 165, 71, 134, 139, 48, 27, 166, 77, 146, 158, 231, 83, 111,
+    229, 122, 60, 211, 133, 230, 220, 105, 92, 41, 55, 46, 245, 40, 244,
+    102, 143, 54, 65, 25, 63, 161, 1, 216, 80, 73, 209, 76, 132, 187, 208,
+    89, 18, 169, 200, 196, 135, 130, 116, 188, 159, 86, 164, 100, 109,
+    198, 173, 186, 3, 64, 52, 217, 226, 250, 124, 123, 5, 202, 38, 147,
+    118, 126, 255, 82, 85, 212, 207, 206, 59, 227, 47, 16, 58, 17, 182,
+    189, 28, 42, 223, 183, 170, 213, 119, 248, 152, 2, 44, 154, 163, 70,
+    221, 153, 101, 155, 167, 43, 172, 9, 129, 22, 39, 253, 19, 98, 108,
+    110, 79, 113, 224, 232, 178, 185, 112, 104, 218, 246, 97, 228, 251,
+    34, 242, 193, 238, 210, 144, 12, 191, 179, 162, 241, 81, 51, 145, 235,
+    249, 14, 239, 107, 49, 192, 214, 31, 181, 199, 106, 157, 184, 84, 204,
+    176, 115, 121, 50, 45, 127, 4, 150, 254, 138, 236, 205, 93, 222, 114,
+    67, 29, 24, 72, 243, 141, 128, 195, 78, 66, 215, 61, 156, 180,
+] * 2, dtype=np.intp)
+
+# x and y components of the 16 gradients used by the 2D noise (GRAD3 in the C source)
+GRAD_X = np.array([1, -1, 1, -1, 1, -1, 1, -1, 0, 0, 0, 0, 1, -1, 0, 0], dtype=np.float64)
+GRAD_Y = np.array([1, 1, -1, -1, 0, 0, 0, 0, 1, -1, 1, -1, 0, 0, -1, 1], dtype=np.float64)
+
+
+def _lattice(t, repeat):
+    """
+    Per-axis part of pnoise2: lattice cells, fractional position and fade curve.
+    :param t: float64 coordinates (any shape)
+    :param repeat: period of the noise along this axis
+    :return: (cell, next cell, fractional part, faded fractional part)
+    """
+    i = np.floor(np.fmod(t, repeat)).astype(np.intp)
+    ii = np.fmod(i + 1, int(repeat))
+    t = t - np.floor(t)
+    fade = t * t * t * (t * (t * 6 - 15) + 10)
+    return i & 255, ii & 255, t, fade
+
+
+def _grad(h, x, y):
+    h = h & 15
+    return x * GRAD_X[h] + y * GRAD_Y[h]
+
+
+def pnoise2(x, y, repeatx=1024, repeaty=1024):
+    """
+    Array version of noise.pnoise2 (single octave).
+
+    x and y are broadcast against each other, and all per-axis work is done
+    before broadcasting, so passing a column and a row (x[:, None], y[None, :])
+    evaluates a whole grid while only the hashing and blending run per cell.
+    :param x: sample x coordinates
+    :param y: sample y coordinates
+    :return: float64 array of noise values
+    """
+    # the C extension parses its arguments as single precision floats
+    x = np.asarray(x, dtype=np.float32).astype(np.float64)
+    y = np.asarray(y, dtype=np.float32).astype(np.float64)
+
+    i, ii, x, fx = _lattice(x, repeatx)
+    j, jj, y, fy = _lattice(y, repeaty)
+
+    a = PERM[i]
+    b = PERM[ii]
+    aa = PERM[a + j]
+    ab = PERM[a + jj]
+    ba = PERM[b + j]
+    bb = PERM[b + jj]
+
+    low = _grad(PERM[aa], x, y)
+    low += fx * (_grad(PERM[ba], x - 1, y) - low)
+    high = _grad(PERM[ab], x, y - 1)
+    high += fx * (_grad(PERM[bb], x - 1, y - 1) - high)
+    low += fy * (high - low)
+    return low
+
+
+def fbm(xs, ys, octave_offsets, offset=(0.0, 0.0), scale=15.0, persistence=0.5,
+        lacunarity=2.0, out=None):
+    """
+    Multi-layered noise heightfield, same formula as calculate_terrain in main.py:
+
+        sum_i persistence**i * pnoise2(lacunarity**i * (x + ox_i + offset_x) / scale, ...)
+
+    :param xs: 1D array of cell x coordinates (first axis of the result)
+    :param ys: 1D array of cell y coordinates (second axis of the result)
+    :param octave_offsets: sequence of (x, y) offsets, one per octave
+    :param offset: world offset added to every cell coordinate
+    :param out: optional float32 array of shape (len(xs), len(ys)) to write into
+    :return: float32 heightfield indexed as [x, y]
+    """
+    xs = np.asarray(xs, dtype=np.float64)[:, None]
+    ys = np.asarray(ys, dtype=np.float64)[None, :]
+
+    total = np.zeros((xs.shape[0], ys.shape[1]), dtype=np.float64)
+    amplitude = 1.0
+    frequency = 1.0
+    for ox, oy in octave_offsets:
+        sampleX = frequency * (xs + ox + offset[0]) / scale
+        sampleY = frequency * (ys + oy + offset[1]) / scale
+        total += amplitude * pnoise2(sampleX, sampleY)
+        amplitude *= persistence
+        frequency *= lacunarity
+
+    if out is None:
+        return total.astype(np.float32)
+    out[...] = total
+    return out
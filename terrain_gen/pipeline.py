@@ -0,0 +1,115 @@
+"""
+Scrolling terrain kept in preallocated arrays.
+
+A ScrollingTerrain owns everything main.py derives from a
+scroll.ScrollingHeightfield: the clipped heights, normals, colors, cull
+block bounds and the GridMesh vertices, each one float32 C-contiguous array
+allocated once in the constructor. A frame only rewrites parts of them in
+place, the cells the scroll just read and their neighbours:
+
+    terrain = ScrollingTerrain(200, world, color_heights, palette, 10, 0.0125)
+    if terrain.scroll_to(x, y):
+        terrain.update_normals()
+        terrain.update_colors()
+        terrain.update_mesh()
+
+NumPy ufuncs working through 2D blocks that are not contiguous in memory
+fill iterator buffers on the way, so the blocks of the torus that are not
+whole rows go through contiguous scratch arrays, also allocated once, and
+a scrolled frame allocates no arrays at all once the tiles it reads are
+cached (see bench.py --steady and tests/test_pipeline.py). Smooth colors
+are the exception, they interpolate through temporaries.
+"""
+import numpy as np
+
+from .colors import colorize
+from .mesh import BlockBounds, GridMesh
+from .normals import ScrollingNormals
+from .scroll import ScrollingHeightfield
+
+
+class ScrollingTerrain(object):
+
+    def __init__(self, size, source, color_heights, palette, height_scale, flattening_threshold,
+                 block=25, floor=-0.71, smooth=False, normal_method="central"):
+        """
+        :param size: vertices per side
+        :param source: tiles.TiledWorld or scheduler.TileScheduler the heights are read from
+        :param block: cells per side of the cull blocks, see mesh.block_indices
+        :param floor: heights are clipped to at least this, the sea level
+        :param smooth: blend between the color bands, see colors.colorize
+        """
+        self.size = size
+        self.color_heights = color_heights
+        self.palette = palette
+        self.height_scale = height_scale
+        self.flattening_threshold = flattening_threshold
+        self.floor = floor
+        self.smooth = smooth
+
+        self.field = ScrollingHeightfield(size, source)
+        # toroidal like field.heights, which heights is
+        self.heights = self.field.heights
+        self.normals = np.zeros((size, size, 3), dtype=np.float32)
+        self.colors = np.zeros((size, size, 3), dtype=np.float32)
+        # lowest and highest height of each block of the mesh, in view order
+        self.bounds = BlockBounds(size, size, block)
+        # in view order, rewritten from the torus by update_mesh()
+        self.mesh = GridMesh(size, size, block=block)
+
+        # colorize converts the thresholds and palette on every call unless they are these,
+        # smooth colors still interpolate between the float64 palette
+        self._thresholds = np.asarray(color_heights[:len(palette) - 1], dtype=np.float32)
+        self._palette = palette if smooth else np.asarray(palette, dtype=np.float32)
+        self._normals = ScrollingNormals(size, normal_method)
+        self._heights = np.empty(size * size, dtype=np.float32)
+        self._mask = np.empty(size * size, dtype=bool)
+
+    def reset(self):
+        """
+        Regenerate everything on the next scroll_to, see ScrollingHeightfield.reset.
+        """
+        self.field.reset()
+
+    def scroll_to(self, x, y):
+        """
+        Move the view to world offset (x, y), reading and clipping the cells
+        that entered it and updating the block bounds.
+        :return: whether any heights changed, the other updates are only
+            needed then
+        """
+        self.field.scroll_to(x, y)
+        if self.field.generated == 0:
+            return False
+        for xs, ys in self.field.dirty:
+            block = self.heights[xs, ys]
+            heights = self._staged(block)
+            np.maximum(heights, self.floor, out=heights)
+            if heights is not block:
+                block[...] = heights
+        self.bounds.update(self.heights, self.field.wrap())
+        return True
+
+    def update_normals(self):
+        self._normals.update(self.field, self.normals)
+
+    def update_colors(self):
+        # laid out like heights, only the new blocks need coloring
+        for xs, ys in self.field.dirty:
+            heights = self._staged(self.heights[xs, ys])
+            colorize(heights, self._thresholds, self._palette, out=self.colors[xs, ys],
+                     smooth=self.smooth, mask=self._mask[:heights.size].reshape(heights.shape))
+
+    def update_mesh(self):
+        # the mesh is in view order, filled from the at most four runs of the torus
+        for (ax, ay), (vx, vy) in self.field.blocks():
+            self.mesh.write(vx, vy, self.heights[ax, ay], self.normals[ax, ay], self.colors[ax, ay],
+                            self.height_scale, self.flattening_threshold)
+
+    def _staged(self, heights):
+        # a block of heights itself if it is contiguous (whole rows), else a contiguous copy
+        if heights.flags.c_contiguous:
+            return heights
+        staged = self._heights[:heights.size].reshape(heights.shape)
+        staged[...] = heights
+        return staged
@@ -0,0 +1,190 @@
+"""
+Frame and stage timing for the viewers.
+
+A Profiler times named stages with perf_counter, counts per-frame values
+such as vertices drawn and bytes uploaded, and keeps the last window frames
+of each for rolling percentiles:
+
+    with profiler.stage("normals"):
+        calculate_normals()
+    profiler.count("bytes", renderer.upload())
+    ...
+    profiler.frame()    # once per displayed frame
+
+While disabled, stage() hands back one shared do-nothing context manager and
+count()/frame() return straight away, so the calls can stay in the frame
+loop. With record=True every frame is also kept for dump() to write as CSV
+or JSON.
+"""
+import csv
+import json
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+
+class _NullStage(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Profiler(object):
+
+    def __init__(self, enabled=False, window=600, record=False):
+        """
+        :param window: number of frames the percentiles are taken over
+        :param record: keep every frame for dump()
+        """
+        self.enabled = enabled
+        self.window = window
+        self.record = record
+        # name -> deque of the per-frame totals of the last window frames
+        self.stages = OrderedDict()
+        self.counters = OrderedDict()
+        self.frame_times = deque(maxlen=window)
+        self.frames = []
+        self.current = {}
+        self.current_counts = {}
+        self.last_frame = None
+        self.report = []
+        self.report_time = 0.0
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        # a pause is not a long frame
+        self.last_frame = None
+
+    def stage(self, name):
+        """
+        :return: context manager adding its wall time to stage name of this frame
+        """
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add(self, name, seconds):
+        if self.enabled:
+            self.current[name] = self.current.get(name, 0.0) + seconds
+
+    def count(self, name, value):
+        """
+        Add value to counter name of this frame, e.g. vertices or bytes.
+        """
+        if self.enabled:
+            self.current_counts[name] = self.current_counts.get(name, 0) + value
+
+    def frame(self):
+        """
+        Close the current frame, call once per displayed frame.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        frame_time = None if self.last_frame is None else now - self.last_frame
+        self.last_frame = now
+        if frame_time is not None:
+            self.frame_times.append(frame_time)
+
+        for name in self.current:
+            if name not in self.stages:
+                self.stages[name] = deque(maxlen=self.window)
+        for name in self.current_counts:
+            if name not in self.counters:
+                self.counters[name] = deque(maxlen=self.window)
+        # stages that did not run this frame took no time
+        for name, samples in self.stages.items():
+            samples.append(self.current.get(name, 0.0))
+        for name, samples in self.counters.items():
+            samples.append(self.current_counts.get(name, 0))
+
+        if self.record:
+            row = {"time": now, "frame_ms": None if frame_time is None else frame_time * 1000}
+            row.update((f"{name}_ms", seconds * 1000) for name, seconds in self.current.items())
+            row.update(self.current_counts)
+            self.frames.append(row)
+        self.current = {}
+        self.current_counts = {}
+
+    def summary(self):
+        """
+        :return: dict with fps, frame and stage p50/p95/p99/mean in
+            milliseconds and the mean of each counter per frame
+        """
+        result = {"frames": len(self.frame_times)}
+        if self.frame_times:
+            result["fps"] = len(self.frame_times) / sum(self.frame_times)
+            result["frame"] = _percentiles(self.frame_times)
+        result["stages"] = OrderedDict((name, _percentiles(samples))
+                                       for name, samples in self.stages.items())
+        result["counters"] = OrderedDict((name, float(np.mean(samples)))
+                                         for name, samples in self.counters.items())
+        return result
+
+    def lines(self, interval=0.5):
+        """
+        :return: text lines of the summary for an overlay, recomputed at most
+            every interval seconds
+        """
+        now = time.perf_counter()
+        if now - self.report_time < interval:
+            return self.report
+        self.report_time = now
+        summary = self.summary()
+        lines = []
+        if "fps" in summary:
+            frame = summary["frame"]
+            lines.append(f"{summary['fps']:6.1f} fps  frame p50 {frame['p50']:6.2f}  "
+                         f"p95 {frame['p95']:6.2f}  p99 {frame['p99']:6.2f} ms")
+        for name, stage in summary["stages"].items():
+            lines.append(f"{name:>10}  p50 {stage['p50']:6.2f}  p95 {stage['p95']:6.2f}  "
+                         f"p99 {stage['p99']:6.2f} ms")
+        for name, value in summary["counters"].items():
+            lines.append(f"{name:>10}  {value:12,.0f} / frame")
+        self.report = lines
+        return lines
+
+    def dump(self, path):
+        """
+        Write the recorded frames and the summary, as JSON if path ends in
+        .json and as CSV of the frames otherwise.
+        """
+        if path.endswith(".json"):
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "frames": self.frames}, f, indent=2)
+            return
+        columns = []
+        for row in self.frames:
+            columns.extend(name for name in row if name not in columns)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, columns)
+            writer.writeheader()
+            writer.writerows(self.frames)
+
+
+def _percentiles(samples):
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": p50, "p95": p95, "p99": p99, "mean": float(values.mean())}
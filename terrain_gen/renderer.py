@@ -0,0 +1,436 @@
+"""
+Retained-mode terrain drawing for main.py.
+
+MeshRenderer draws a GridMesh with the fixed function pipeline: interleaved
+vertices in one vertex buffer and the grid topology in one index buffer
+uploaded once, so a frame is a single glDrawElements call instead of a
+glVertex/glColor/glNormal call per vertex.
+
+HeightfieldRenderer keeps the x/y lattice on the GPU as well and only streams
+one float per vertex, a quarter of the xyz bytes and a ninth of a GridMesh.
+Colors come from a 1D palette texture of one texel per band, picked by
+comparing the height with the band thresholds in the shader.
+With several slots it draws lod.LodTerrain patches: one lattice and index
+buffer shared by every patch, each slot's heights placed and scaled by a
+uniform.
+
+ClipmapRenderer draws a clipmap.Clipmap the same way, with the heights of
+every level in one float texture the vertex shader reads with wrap-around
+addressing, so a level's toroidal array is uploaded block by block as it is.
+A scroll.ScrollingHeightfield is drawn by it as a clipmap of one level.
+"""
+import ctypes
+
+import numpy as np
+import OpenGL.GL as gl
+
+from .colors import palette_bands
+from .clipmap import level_indices
+from .mesh import VERTEX_STRIDE, block_indices, grid_indices, grid_positions, index_runs
+from .shaders import createProgram, createShader
+
+
+class MeshRenderer(object):
+
+    def __init__(self, mesh):
+        self.mesh = mesh
+        self.vertexBuffer, self.indexBuffer = gl.glGenBuffers(2)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, mesh.vertices.nbytes, mesh.vertices, gl.GL_DYNAMIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, mesh.indices.nbytes, mesh.indices,
+                        gl.GL_STATIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def upload(self, rows=slice(None)):
+        """
+        Push the vertices of a range of x rows to the vertex buffer.
+        :return: number of bytes uploaded
+        """
+        first, count = self.mesh.vertex_range(rows)
+        if count == 0:
+            return 0
+        data = self.mesh.vertices[first:first + count]
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, first * VERTEX_STRIDE, data.nbytes, data)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        return data.nbytes
+
+    def draw(self, blocks=None):
+        """
+        :param blocks: ids of the mesh blocks to draw (see GridMesh block), all if None
+        :return: number of vertices submitted, one per index drawn
+        """
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertexBuffer)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+
+        gl.glEnableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glEnableClientState(gl.GL_NORMAL_ARRAY)
+        gl.glEnableClientState(gl.GL_COLOR_ARRAY)
+        gl.glVertexPointer(3, gl.GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        gl.glNormalPointer(gl.GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(12))
+        gl.glColorPointer(3, gl.GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(24))
+
+        vertices = 0
+        for first, count in index_runs(self.mesh.block_ranges, blocks):
+            gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+            vertices += count
+
+        gl.glDisableClientState(gl.GL_VERTEX_ARRAY)
+        gl.glDisableClientState(gl.GL_NORMAL_ARRAY)
+        gl.glDisableClientState(gl.GL_COLOR_ARRAY)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        return vertices
+
+
+# Vertex Shader: displaces the static x/y lattice by the streamed heights
+heightfieldVertexShader = """
+    #version 120
+    attribute vec2 position;
+    attribute float height;
+    uniform vec3 patchTransform;
+    uniform float heightScale;
+    uniform float flatteningThreshold;
+    varying float terrainHeight;
+    varying vec3 eyePosition;
+
+    void main(){
+        float z = height < flatteningThreshold ? 0.0 : height * heightScale;
+        vec4 vertex = vec4(patchTransform.xy + position * patchTransform.z, z, 1.0);
+        terrainHeight = height;
+        eyePosition = vec3(gl_ModelViewMatrix * vertex);
+        gl_Position = gl_ModelViewProjectionMatrix * vertex;
+    }
+    """
+
+# most palette colors the fragment shader takes
+MAX_BANDS = 16
+
+# Fragment Shader: color from the palette texture, lighting from screen space derivatives
+heightfieldFragmentShader = """
+    #version 120
+    const int MAX_BANDS = %d;
+    uniform sampler1D palette;
+    // thresholds between the palette's texels, or their anchors when smooth, see colors.palette_bands
+    uniform float bandHeights[MAX_BANDS];
+    uniform int bandCount;
+    uniform bool smoothBands;
+    uniform vec3 lightDirection;
+    varying float terrainHeight;
+    varying vec3 eyePosition;
+
+    void main(){
+        float texel = 0.0;
+        for (int i = 0; i < MAX_BANDS - 1; i++) {
+            if (i < bandCount - 1 && terrainHeight >= bandHeights[i]) {
+                texel = smoothBands
+                    ? float(i) + clamp((terrainHeight - bandHeights[i])
+                                       / (bandHeights[i + 1] - bandHeights[i]), 0.0, 1.0)
+                    : float(i + 1);
+            }
+        }
+        vec3 color = texture1D(palette, (texel + 0.5) / float(bandCount)).rgb;
+        vec3 normal = normalize(cross(dFdx(eyePosition), dFdy(eyePosition)));
+        float diffuse = max(dot(normal, lightDirection), 0.0);
+        gl_FragColor = vec4(color * (0.2 + diffuse), 1.0);
+    }
+    """ % MAX_BANDS
+
+
+def _terrain_program(vertexShader, color_heights, palette, height_scale, flattening_threshold,
+                     light_direction, smooth):
+    """
+    Link vertexShader with heightfieldFragmentShader and set the uniforms they share.
+    :return: (program, 1D palette texture)
+    """
+    program = createProgram(
+        createShader(vertexShader, gl.GL_VERTEX_SHADER),
+        createShader(heightfieldFragmentShader, gl.GL_FRAGMENT_SHADER),
+    )
+    gl.glUseProgram(program)
+    gl.glUniform1f(gl.glGetUniformLocation(program, "heightScale"), height_scale)
+    gl.glUniform1f(gl.glGetUniformLocation(program, "flatteningThreshold"), flattening_threshold)
+    colors, bandHeights = palette_bands(color_heights, palette, smooth=smooth)
+    if len(colors) > MAX_BANDS:
+        raise ValueError(f"at most {MAX_BANDS} palette colors, not {len(colors)}")
+    gl.glUniform1i(gl.glGetUniformLocation(program, "palette"), 0)
+    gl.glUniform1fv(gl.glGetUniformLocation(program, "bandHeights"), len(bandHeights), bandHeights)
+    gl.glUniform1i(gl.glGetUniformLocation(program, "bandCount"), len(colors))
+    gl.glUniform1i(gl.glGetUniformLocation(program, "smoothBands"), int(smooth))
+    light = np.asarray(light_direction, dtype=np.float32)
+    gl.glUniform3fv(gl.glGetUniformLocation(program, "lightDirection"), 1,
+                    light / np.linalg.norm(light))
+    gl.glUseProgram(0)
+
+    # the palette as a 1D texture, coloring costs nothing on the CPU; smooth bands blend
+    # neighbouring texels by filtering, hard bands sample one texel's centre
+    paletteTexture = gl.glGenTextures(1)
+    textureFilter = gl.GL_LINEAR if smooth else gl.GL_NEAREST
+    gl.glBindTexture(gl.GL_TEXTURE_1D, paletteTexture)
+    gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MIN_FILTER, textureFilter)
+    gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_MAG_FILTER, textureFilter)
+    gl.glTexParameteri(gl.GL_TEXTURE_1D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+    gl.glTexImage1D(gl.GL_TEXTURE_1D, 0, gl.GL_RGB32F, colors.shape[0], 0, gl.GL_RGB,
+                    gl.GL_FLOAT, colors)
+    gl.glBindTexture(gl.GL_TEXTURE_1D, 0)
+    return program, paletteTexture
+
+
+class HeightfieldRenderer(object):
+    """
+    Draws a width x height heightfield from a static x/y lattice and index
+    buffer plus one streamed float per vertex, the vertex shader applies
+    height_scale and the flattening threshold.
+    """
+
+    def __init__(self, width, height, color_heights, palette, height_scale,
+                 flattening_threshold, light_direction=(1.0, 1.0, 1.0), smooth=False, slots=1,
+                 block=None):
+        """
+        :param color_heights: band thresholds, see colors.colorize
+        :param palette: RGB colors in 0..1, one per band
+        :param smooth: blend between band colors instead of hard bands
+        :param slots: number of width x height heightfields kept in the height buffer
+        :param block: order the indices in blocks of block x block cells that
+            draw() can be asked to draw alone, see mesh.block_indices
+        """
+        self.width = width
+        self.height = height
+        self.slots = slots
+        if block is None:
+            indices = grid_indices(width, height)
+            self.blockRanges = np.array([(0, indices.size)])
+            self.blockExtents = np.array([(0, 0, width - 1, height - 1)])
+        else:
+            indices, self.blockRanges, self.blockExtents = block_indices(width, height, block)
+
+        self.program, self.paletteTexture = _terrain_program(
+            heightfieldVertexShader, color_heights, palette, height_scale, flattening_threshold,
+            light_direction, smooth)
+        self.positionLocation = gl.glGetAttribLocation(self.program, "position")
+        self.heightLocation = gl.glGetAttribLocation(self.program, "height")
+        self.patchLocation = gl.glGetUniformLocation(self.program, "patchTransform")
+
+        self.positionBuffer, self.heightBuffer, self.indexBuffer = gl.glGenBuffers(3)
+
+        positions = grid_positions(width, height)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.positionBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, positions.nbytes, positions, gl.GL_STATIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.heightBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, slots * width * height * 4, None, gl.GL_DYNAMIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def upload(self, heights, rows=slice(None), slot=0):
+        """
+        Stream the heights of a range of x rows.
+        :param heights: float32 C-contiguous (width, height) heightfield
+        :param slot: which of the slots to write
+        :return: number of bytes uploaded
+        """
+        start, stop, _ = rows.indices(self.width)
+        if stop <= start:
+            return 0
+        data = heights[start:stop]
+        offset = (slot * self.width + start) * self.height * 4
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.heightBuffer)
+        gl.glBufferSubData(gl.GL_ARRAY_BUFFER, offset, data.nbytes, data)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        return data.nbytes
+
+    def draw(self, patches=((0, 0.0, 0.0, 1.0),), blocks=None):
+        """
+        :param patches: (slot, x, y, step) of each heightfield to draw, placing
+            vertex (i, j) of the slot at (x + i * step, y + j * step)
+        :param blocks: ids of the index blocks to draw of each patch, all if None
+        :return: number of vertices submitted, one per index drawn
+        """
+        runs = index_runs(self.blockRanges, blocks)
+        gl.glUseProgram(self.program)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_1D, self.paletteTexture)
+        gl.glEnableVertexAttribArray(self.positionLocation)
+        gl.glEnableVertexAttribArray(self.heightLocation)
+
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.positionBuffer)
+        gl.glVertexAttribPointer(self.positionLocation, 2, gl.GL_FLOAT, False, 8, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.heightBuffer)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        slotBytes = self.width * self.height * 4
+        for slot, x, y, step in patches:
+            gl.glVertexAttribPointer(self.heightLocation, 1, gl.GL_FLOAT, False, 4,
+                                     ctypes.c_void_p(slot * slotBytes))
+            gl.glUniform3f(self.patchLocation, x, y, step)
+            for first, count in runs:
+                gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+
+        gl.glDisableVertexAttribArray(self.positionLocation)
+        gl.glDisableVertexAttribArray(self.heightLocation)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindTexture(gl.GL_TEXTURE_1D, 0)
+        gl.glUseProgram(0)
+        return len(patches) * sum(count for _, count in runs)
+
+
+# Vertex Shader: places a clipmap level's lattice and reads its heights from the toroidal texture
+clipmapVertexShader = """
+    #version 120
+    attribute vec2 position;
+    uniform sampler2D heights;
+    uniform vec3 levelTransform;
+    uniform vec3 levelTexels;
+    uniform vec2 texelSize;
+    uniform float samples;
+    uniform bool stitch;
+    uniform float heightScale;
+    uniform float flatteningThreshold;
+    varying float terrainHeight;
+    varying vec3 eyePosition;
+
+    float fetch(vec2 vertex){
+        // levels are stacked along t, each one samples x samples with y along s
+        vec2 texel = mod(levelTexels.xy + vertex, samples);
+        return texture2DLod(heights, vec2(texel.y + 0.5, levelTexels.z + texel.x + 0.5) * texelSize, 0.0).r;
+    }
+
+    void main(){
+        float height = fetch(position);
+        // odd vertices on the outer edge lie halfway along an edge of the coarser level
+        float last = samples - 1.0;
+        if (stitch && (position.x == 0.0 || position.x == last) && mod(position.y, 2.0) == 1.0)
+            height = 0.5 * (fetch(position - vec2(0.0, 1.0)) + fetch(position + vec2(0.0, 1.0)));
+        if (stitch && (position.y == 0.0 || position.y == last) && mod(position.x, 2.0) == 1.0)
+            height = 0.5 * (fetch(position - vec2(1.0, 0.0)) + fetch(position + vec2(1.0, 0.0)));
+
+        float z = height < flatteningThreshold ? 0.0 : height * heightScale;
+        vec4 vertex = vec4(levelTransform.xy + position * levelTransform.z, z, 1.0);
+        terrainHeight = height;
+        eyePosition = vec3(gl_ModelViewMatrix * vertex);
+        gl_Position = gl_ModelViewProjectionMatrix * vertex;
+    }
+    """
+
+
+class ClipmapRenderer(object):
+    """
+    Draws the levels of a clipmap.Clipmap of size x size cells from one
+    static lattice and index buffer, with the heights in a float texture.
+    """
+
+    def __init__(self, size, levels, color_heights, palette, height_scale,
+                 flattening_threshold, light_direction=(1.0, 1.0, 1.0), smooth=False, block=None):
+        """
+        :param color_heights: band thresholds, see colors.colorize
+        :param palette: RGB colors in 0..1, one per band
+        :param smooth: blend between band colors instead of hard bands
+        :param block: order the indices in blocks of block x block cells, see
+            mesh.block_indices, instead of the blocks of clipmap.level_indices
+        """
+        self.samples = size + 1
+        self.levels = levels
+        if block is None:
+            indices, self.blockRanges = level_indices(size)
+        else:
+            indices, self.blockRanges, _ = block_indices(self.samples, self.samples, block)
+
+        self.program, self.paletteTexture = _terrain_program(
+            clipmapVertexShader, color_heights, palette, height_scale, flattening_threshold,
+            light_direction, smooth)
+        self.positionLocation = gl.glGetAttribLocation(self.program, "position")
+        self.levelLocation = gl.glGetUniformLocation(self.program, "levelTransform")
+        self.texelsLocation = gl.glGetUniformLocation(self.program, "levelTexels")
+        self.stitchLocation = gl.glGetUniformLocation(self.program, "stitch")
+        gl.glUseProgram(self.program)
+        gl.glUniform1i(gl.glGetUniformLocation(self.program, "heights"), 1)
+        gl.glUniform2f(gl.glGetUniformLocation(self.program, "texelSize"),
+                       1.0 / self.samples, 1.0 / (levels * self.samples))
+        gl.glUniform1f(gl.glGetUniformLocation(self.program, "samples"), self.samples)
+        gl.glUseProgram(0)
+
+        # one samples x samples block of texels per level, stacked along t
+        self.heightTexture = gl.glGenTextures(1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.heightTexture)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MIN_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_MAG_FILTER, gl.GL_NEAREST)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_S, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexParameteri(gl.GL_TEXTURE_2D, gl.GL_TEXTURE_WRAP_T, gl.GL_CLAMP_TO_EDGE)
+        gl.glTexImage2D(gl.GL_TEXTURE_2D, 0, gl.GL_R32F, self.samples, levels * self.samples, 0,
+                        gl.GL_RED, gl.GL_FLOAT, None)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+
+        self.positionBuffer, self.indexBuffer = gl.glGenBuffers(2)
+        positions = grid_positions(self.samples, self.samples)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.positionBuffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, positions.nbytes, positions, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def upload(self, heights, level, xs, ys):
+        """
+        Copy a block of a level's toroidal heights into the texture.
+        :param heights: the block, heights[level, xs, ys] of the clipmap
+        :param xs: slice of array x indices of the block
+        :param ys: slice of array y indices of the block
+        :return: number of bytes uploaded
+        """
+        data = heights
+        if data.dtype != np.float32 or data.strides[1] != 4 or data.strides[0] % 4:
+            data = np.ascontiguousarray(data, dtype=np.float32)
+        if data.size == 0:
+            return 0
+        # rows of a block of a larger array are read in place, strides[0] apart
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, data.strides[0] // 4)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.heightTexture)
+        gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, ys.start, level * self.samples + xs.start,
+                           data.shape[1], data.shape[0], gl.GL_RED, gl.GL_FLOAT,
+                           ctypes.c_void_p(data.ctypes.data))
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glPixelStorei(gl.GL_UNPACK_ROW_LENGTH, 0)
+        return data.nbytes
+
+    def draw(self, levels):
+        """
+        :param levels: (level, x, y, step, (first x, first y array index), blocks)
+            of each level to draw, see Clipmap.draws
+        :return: number of vertices submitted, one per index drawn
+        """
+        gl.glUseProgram(self.program)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_1D, self.paletteTexture)
+        gl.glActiveTexture(gl.GL_TEXTURE1)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, self.heightTexture)
+        gl.glEnableVertexAttribArray(self.positionLocation)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.positionBuffer)
+        gl.glVertexAttribPointer(self.positionLocation, 2, gl.GL_FLOAT, False, 8, ctypes.c_void_p(0))
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.indexBuffer)
+
+        vertices = 0
+        for level, x, y, step, (texelX, texelY), blocks in levels:
+            gl.glUniform3f(self.levelLocation, x, y, step)
+            gl.glUniform3f(self.texelsLocation, texelX, texelY, level * self.samples)
+            gl.glUniform1i(self.stitchLocation, int(level < self.levels - 1))
+            for first, count in index_runs(self.blockRanges, blocks):
+                gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+                vertices += count
+
+        gl.glDisableVertexAttribArray(self.positionLocation)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindTexture(gl.GL_TEXTURE_2D, 0)
+        gl.glActiveTexture(gl.GL_TEXTURE0)
+        gl.glBindTexture(gl.GL_TEXTURE_1D, 0)
+        gl.glUseProgram(0)
+        return vertices
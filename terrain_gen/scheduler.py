@@ -0,0 +1,200 @@
+"""
+Background tile generation.
+
+TileScheduler farms TiledWorld tiles out to a process pool so that GLUT
+callbacks never wait for noise. Workers write heights straight into slots of
+one shared memory slab and only send the slot number back, the main process
+copies a finished slot into the tile cache when poll() sees it done.
+
+It has the same read(x0, y0, out) interface as TiledWorld, but instead of
+generating missing tiles it queues them and fills their cells with
+placeholder, returning False so the caller knows to read that block again.
+Tiles already baked in the world's store are served from it without a job,
+and finished tiles are baked into it.
+
+A job that fails, a worker raising or dying, is logged and dropped and its
+slot freed, so the next read() of its cells queues the tile again; a pool
+broken by a dead worker is replaced by a new one on the next request.
+"""
+import logging
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from .kernel import process_context, set_threads
+from .tiles import TileKey, TiledWorld
+
+logger = logging.getLogger(__name__)
+
+# shared memory blocks attached by this worker process, by name
+_attached = {}
+
+
+def _generate_tile(world_args, key, shm_name, slot):
+    shm = _attached.get(shm_name)
+    if shm is None:
+        shm = _attached[shm_name] = SharedMemory(name=shm_name)
+    world = TiledWorld(*world_args)
+    n = world.tile_size
+    out = np.ndarray((n, n), dtype=np.float32, buffer=shm.buf, offset=slot * n * n * 4)
+    world.generate(key, out=out)
+    return slot
+
+
+class TileScheduler(object):
+
+    def __init__(self, world, workers=None, slots=64, placeholder=0.0):
+        """
+        :param world: TiledWorld providing the noise parameters and the tile cache
+        :param workers: number of worker processes, defaults to the number of CPUs
+        :param slots: maximum number of tiles being generated at once
+        :param placeholder: height written for cells whose tile is not ready
+        """
+        self.world = world
+        self.placeholder = placeholder
+
+        # created before the pool so its workers share this process's resource tracker
+        n = world.tile_size
+        self.shm = SharedMemory(create=True, size=slots * n * n * 4)
+        self.slab = np.ndarray((slots, n, n), dtype=np.float32, buffer=self.shm.buf)
+
+        self.workers = workers
+        self.pool = self._start_pool()
+        self.free = list(range(slots))
+        # key -> (future, slot) of the job generating it
+        self.pending = {}
+        # jobs started before the last cancel(), their results are thrown away
+        self.stale = []
+        # number of jobs that failed
+        self.failed = 0
+
+    def _start_pool(self):
+        # every worker is one core already, so the compiled kernel keeps to one thread in each
+        pool = ProcessPoolExecutor(self.workers, mp_context=process_context(), initializer=set_threads,
+                                   initargs=(1,))
+        # start the workers now rather than on the first request in a GLUT callback
+        pool.submit(int).result()
+        return pool
+
+    def request(self, key):
+        """
+        Queue a tile for generation unless it is resident, queued, baked or no slot is free.
+        :return: True if the tile is resident or queued
+        """
+        if key in self.world.cache or key in self.pending:
+            return True
+        tile = self.world.baked(key)
+        if tile is not None:
+            self.world.cache.put(key, tile)
+            return True
+        if not self.free:
+            return False
+        slot = self.free.pop()
+        try:
+            future = self.pool.submit(_generate_tile, self.world.params(), key, self.shm.name, slot)
+        except BrokenProcessPool:
+            # a worker died, the jobs it took down with the pool fail in poll()
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = self._start_pool()
+            future = self.pool.submit(_generate_tile, self.world.params(), key, self.shm.name, slot)
+        self.pending[key] = (future, slot)
+        return True
+
+    def poll(self, deadline=None):
+        """
+        Move finished tiles into the cache, never blocks.
+        :param deadline: time.perf_counter() value after which the remaining
+            finished tiles are left for the next call (at least one is moved)
+        :return: number of tiles that became resident
+        """
+        for future, slot in [job for job in self.stale if job[0].done()]:
+            self.stale.remove((future, slot))
+            self.free.append(slot)
+
+        done = [key for key, (future, _) in self.pending.items() if future.done()]
+        moved = 0
+        for index, key in enumerate(done):
+            if index and deadline is not None and time.perf_counter() >= deadline:
+                break
+            future, slot = self.pending.pop(key)
+            try:
+                future.result()
+            except Exception as error:
+                # dropped, read() queues the tile again the next time its cells are needed
+                self.failed += 1
+                logger.warning("generating tile %s failed: %r", key, error)
+            else:
+                tile = self.slab[slot].copy()
+                self.world.cache.put(key, tile)
+                self.world.bake(key, tile)
+                moved += 1
+            self.free.append(slot)
+        return moved
+
+    def cancel(self):
+        """
+        Forget queued work, call together with world.clear() after changing the
+        noise parameters. Slots of jobs already running are released once they finish.
+        """
+        for future, slot in self.pending.values():
+            if future.cancel():
+                self.free.append(slot)
+            else:
+                self.stale.append((future, slot))
+        self.pending = {}
+
+    def read(self, x0, y0, out, lod=0):
+        """
+        Copy the resident or baked part of a block of heights into out and queue the rest.
+        :return: True if every tile of the block was resident
+        """
+        complete = True
+        for tile_x, tile_y, block, part in self.world.blocks(x0, y0, *out.shape):
+            key = TileKey(tile_x, tile_y, lod)
+            tile = self.world.cache.get(key)
+            if tile is None:
+                tile = self.world.baked(key)
+                if tile is not None:
+                    self.world.cache.put(key, tile)
+            if tile is None:
+                self.request(key)
+                out[block] = self.placeholder
+                complete = False
+            else:
+                out[block] = tile[part]
+        return complete
+
+    def prefetch(self, x, y, width, height, velocity=(0.0, 0.0), ahead=60, lod=0):
+        """
+        Queue the tiles covering a view and the same view moved ahead, nearest first.
+        :param x: first x cell of the view
+        :param y: first y cell of the view
+        :param velocity: cells moved per tick along x and y
+        :param ahead: number of ticks to look ahead along velocity
+        """
+        n = self.world.tile_size
+        ahead_x = x + velocity[0] * ahead
+        ahead_y = y + velocity[1] * ahead
+        lo_x = math.floor(min(x, ahead_x)) // n
+        hi_x = math.floor(max(x, ahead_x) + width) // n
+        lo_y = math.floor(min(y, ahead_y)) // n
+        hi_y = math.floor(max(y, ahead_y) + height) // n
+
+        center_x = (x + width / 2.0) / n - 0.5
+        center_y = (y + height / 2.0) / n - 0.5
+        keys = [TileKey(tile_x, tile_y, lod)
+                for tile_x in range(lo_x, hi_x + 1) for tile_y in range(lo_y, hi_y + 1)]
+        keys.sort(key=lambda k: (k.tile_x - center_x) ** 2 + (k.tile_y - center_y) ** 2)
+        for key in keys:
+            if not self.request(key):
+                break
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
+        self.slab = None
+        self.shm.close()
+        self.shm.unlink()
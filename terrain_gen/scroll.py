@@ -0,0 +1,200 @@
+"""
+Incrementally scrolled toroidal heightfield.
+
+The sample lattice is anchored to integer world cells, so moving the camera
+by a fraction of a cell changes nothing and moving it by whole cells only
+generates the rows/columns that scrolled into view, the same idea as the
+ring buffer in terraingeneration.animate. The remaining sub-cell part of the
+offset is applied as a translation when drawing.
+
+The heights are addressed toroidally: world cell (x, y) lives at
+heights[x % size, y % size], so view cell (i, j), counted from origin, is at
+heights[(origin_x + i) % size, (origin_y + j) % size]. Moving the view only
+moves origin and overwrites the rows and columns that left it with the ones
+that entered; nothing is shifted, whatever the distance. Consumers that need
+view order get it without copying as at most two contiguous runs per axis
+(runs(), blocks()), or read the toroidal array as it is, see
+renderer.ClipmapRenderer.
+
+Heights come from a source with a read(x0, y0, out) method filling out with
+the block of cells starting at (x0, y0), normally a tiles.TiledWorld so that
+strips scrolling back into view are served from the tile cache.
+"""
+import math
+
+import numpy as np
+
+
+def wrap_runs(start, count, size):
+    """
+    :return: list of (first cell, cell count, first index) of the at most two
+        runs that count cells from start fall into in a torus of size
+    """
+    index = start % size
+    first = min(count, size - index)
+    runs = [(start, first, index)]
+    if count > first:
+        runs.append((start + first, count - first, 0))
+    return runs
+
+
+class ScrollingHeightfield(object):
+    """
+    size x size float32 toroidal heightfield indexed as [x, y], world cell
+    (x, y) at heights[x % size, y % size] for the size x size cells from origin.
+    """
+
+    def __init__(self, size, source):
+        self.size = size
+        self.source = source
+
+        self.heights = np.zeros((size, size), dtype=np.float32)
+        self.origin = None
+        # what the last scroll_to call did, for keeping derived arrays (normals...) in sync:
+        # number of cells read from the source, whether everything was replaced,
+        # the (dx, dy) the view moved by and the (xs, ys) array blocks written, each of
+        # them contiguous in view order as well or spanning the whole axis, so that
+        # columns scrolling in along x are whole rows of the array
+        self.generated = 0
+        self.regenerated = False
+        self.moved = (0, 0)
+        self.dirty = []
+        # world blocks (x0, y0, width, height) the source could not fully provide yet
+        self.pending = []
+
+    def reset(self):
+        """
+        Forget the current contents, the next scroll_to regenerates everything.
+        Call after changing the noise parameters of the source.
+        """
+        self.origin = None
+        self.pending = []
+
+    def fraction(self, x, y):
+        """
+        :return: sub-cell part of the world offset (x, y) relative to origin
+        """
+        return x - self.origin[0], y - self.origin[1]
+
+    def wrap(self):
+        """
+        :return: array index (x, y) of view cell (0, 0)
+        """
+        return self.origin[0] % self.size, self.origin[1] % self.size
+
+    def runs(self, axis, cells=slice(None)):
+        """
+        :param axis: 0 for x, 1 for y
+        :param cells: slice of view cells along axis
+        :return: list of (array slice, view slice) of the at most two
+            contiguous runs of the array holding those cells, in view order
+        """
+        start, stop, _ = cells.indices(self.size)
+        if stop <= start:
+            return []
+        return [(slice(index, index + count), slice(first - self.origin[axis], first - self.origin[axis] + count))
+                for first, count, index in wrap_runs(self.origin[axis] + start, stop - start, self.size)]
+
+    def blocks(self, xs=slice(None), ys=slice(None)):
+        """
+        :return: list of ((array xs, array ys), (view xs, view ys)) of the at
+            most four contiguous blocks of the array holding a block of view
+            cells; heights[array xs, array ys] are views, not copies
+        """
+        return [((ax, ay), (vx, vy)) for ax, vx in self.runs(0, xs) for ay, vy in self.runs(1, ys)]
+
+    def view_block(self, xs, ys):
+        """
+        :return: view slices of a block of the array lying in one run of the
+            view along each axis or spanning all of it, such as the dirty blocks
+        """
+        return self._view_run(xs, 0), self._view_run(ys, 1)
+
+    def _view_run(self, cells, axis):
+        start, stop, _ = cells.indices(self.size)
+        if stop - start == self.size:
+            return slice(0, self.size)
+        first = (start - self.origin[axis]) % self.size
+        return slice(first, first + stop - start)
+
+    def take(self, xs=slice(None), ys=slice(None), array=None):
+        """
+        :param array: toroidal array laid out like heights, heights if None
+        :return: a block of view cells in view order, a copy
+        """
+        array = self.heights if array is None else array
+        rows = (self.origin[0] + np.arange(self.size)[xs]) % self.size
+        columns = (self.origin[1] + np.arange(self.size)[ys]) % self.size
+        return array[np.ix_(rows, columns)]
+
+    def scroll_to(self, x, y):
+        """
+        Move the view so that it starts at world offset (x, y).
+        :return: the toroidal heights array (updated in place)
+        """
+        new_origin = (math.floor(x), math.floor(y))
+        n = self.size
+        self.generated = 0
+        self.regenerated = False
+        self.moved = (0, 0)
+        self.dirty = []
+
+        if self.origin is None:
+            self.origin = new_origin
+            self.regenerated = True
+            self._fill(new_origin[0], new_origin[1], n, n)
+            return self.heights
+
+        # blocks left incomplete by an asynchronous source are read again first
+        self._retry()
+
+        old_origin = self.origin
+        dx = new_origin[0] - old_origin[0]
+        dy = new_origin[1] - old_origin[1]
+        if dx == 0 and dy == 0:
+            return self.heights
+
+        self.origin = new_origin
+        if abs(dx) >= n or abs(dy) >= n:
+            self.pending = []
+            self.regenerated = True
+            self._fill(new_origin[0], new_origin[1], n, n)
+            return self.heights
+        self.moved = (dx, dy)
+
+        # newly exposed columns along x, then rows along y over the surviving columns,
+        # each written over the cells that left the view on the other side
+        if dx > 0:
+            self._fill(old_origin[0] + n, new_origin[1], dx, n)
+        elif dx < 0:
+            self._fill(new_origin[0], new_origin[1], -dx, n)
+        kept = max(new_origin[0], old_origin[0])
+        if dy > 0:
+            self._fill(kept, old_origin[1] + n, n - abs(dx), dy)
+        elif dy < 0:
+            self._fill(kept, new_origin[1], n - abs(dx), -dy)
+        return self.heights
+
+    def _fill(self, x0, y0, width, height):
+        n = self.size
+        x_runs = wrap_runs(x0, width, n)
+        y_runs = wrap_runs(y0, height, n)
+        for x, w, i in x_runs:
+            for y, h, j in y_runs:
+                if not self.source.read(x, y, self.heights[i:i + w, j:j + h]):
+                    self.pending.append((x, y, w, h))
+        self.generated += width * height
+        # the runs of a block spanning a whole axis make up all of it, one block of the array
+        xs = [slice(0, n)] if width == n else [slice(i, i + w) for _, w, i in x_runs]
+        ys = [slice(0, n)] if height == n else [slice(j, j + h) for _, h, j in y_runs]
+        self.dirty.extend((x, y) for x in xs for y in ys)
+
+    def _retry(self):
+        pending, self.pending = self.pending, []
+        ox, oy = self.origin
+        for x0, y0, width, height in pending:
+            # only the part still inside the view matters
+            lo_x, hi_x = max(x0, ox), min(x0 + width, ox + self.size)
+            lo_y, hi_y = max(y0, oy), min(y0 + height, oy + self.size)
+            if lo_x < hi_x and lo_y < hi_y:
+                self._fill(lo_x, lo_y, hi_x - lo_x, hi_y - lo_y)
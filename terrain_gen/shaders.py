@@ -0,0 +1,41 @@
+"""
+Shader compilation helpers shared by the viewers.
+"""
+import OpenGL.GL as gl
+
+
+# function to request and compiler shader slots from GPU
+def createShader(source, type):
+    # request shader
+    shader = gl.glCreateShader(type)
+
+    # set shader source using the code
+    gl.glShaderSource(shader, source)
+
+    gl.glCompileShader(shader)
+    if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
+        error = gl.glGetShaderInfoLog(shader).decode()
+        print(error)
+        raise RuntimeError(f"{source} shader compilation error")
+
+    return shader
+
+
+# function to build and activate program
+def createProgram(vertex, fragment):
+    program = gl.glCreateProgram()
+
+    # attach shader objects to the program
+    gl.glAttachShader(program, vertex)
+    gl.glAttachShader(program, fragment)
+
+    gl.glLinkProgram(program)
+    if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
+        print(gl.glGetProgramInfoLog(program))
+        raise RuntimeError("Linking error")
+
+    # Get rid of shaders (no more needed)
+    gl.glDetachShader(program, vertex)
+    gl.glDetachShader(program, fragment)
+
+    return program
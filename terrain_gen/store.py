@@ -0,0 +1,170 @@
+"""
+Persistent on-disk tile store.
+
+Baked tiles live in one memory-mapped data file of equally shaped slots,
+with a JSON index next to it (path + ".json") mapping each tile to its slot.
+Tiles are keyed by the parameters that produced them, hashed into a stable
+string, and by a tuple such as a tiles.TileKey, so worlds with different
+seeds or noise settings share the file without colliding.
+
+get() returns a view of the mapped file, not a copy, which can be handed to
+glBufferSubData or copied into a heightfield as it is. put() hands the tile
+to a background thread that writes it into the file and only then adds it to
+the index, so a tile is never listed before its data is on disk.
+"""
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def params_key(params):
+    """
+    :param params: tuple of numbers and strings, possibly nested
+    :return: stable string identifying params across runs
+    """
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+
+def _tile_key(key):
+    return ",".join(str(int(k)) for k in key)
+
+
+class TileStore(object):
+
+    def __init__(self, path, shape, dtype=np.float32, capacity=None, grow=256, flush_every=64):
+        """
+        :param path: data file, created if missing
+        :param shape: shape of every tile in the store
+        :param capacity: maximum number of tiles kept, later puts are dropped
+        :param grow: number of slots added to the file when it runs full
+        :param flush_every: write the index after this many new tiles
+        """
+        self.path = path
+        self.index_path = path + ".json"
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.grow = grow
+        self.flush_every = flush_every
+        self.tile_bytes = int(np.prod(self.shape)) * self.dtype.itemsize
+
+        self.lock = threading.Lock()
+        # params_key -> tile key string -> slot
+        self.index = {}
+        if os.path.exists(self.index_path) and os.path.exists(path):
+            with open(self.index_path) as f:
+                header = json.load(f)
+            if tuple(header["shape"]) != self.shape or np.dtype(header["dtype"]) != self.dtype:
+                raise ValueError(f"{path} holds {header['dtype']} tiles of shape {tuple(header['shape'])}, "
+                                 f"not {self.dtype.name} tiles of shape {self.shape}")
+            self.index = header["tiles"]
+        # slots are handed out in order, a crash can leave holes but never reuses one
+        self.used = max((slot + 1 for tiles in self.index.values() for slot in tiles.values()), default=0)
+        # (params_key, tile key string) of tiles queued for writing
+        self.pending = set()
+        self.unflushed = 0
+
+        if not os.path.exists(path):
+            open(path, "wb").close()
+        self.slots = os.path.getsize(path) // self.tile_bytes
+        self.data = self._map() if self.slots else None
+        self.writer = ThreadPoolExecutor(1)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(tiles) for tiles in self.index.values())
+
+    def _map(self):
+        return np.memmap(self.path, dtype=self.dtype, mode="r+", shape=(self.slots,) + self.shape)
+
+    def get(self, params, key):
+        """
+        :return: read-only view of the baked tile in the mapped file, or None
+        """
+        with self.lock:
+            slot = self.index.get(params_key(params), {}).get(_tile_key(key))
+            if slot is None:
+                return None
+            tile = self.data[slot].view(np.ndarray)
+        tile.flags.writeable = False
+        return tile
+
+    def put(self, params, key, tile):
+        """
+        Queue a tile to be written in the background, unless it is already
+        baked, queued or the store is full. tile must not change afterwards.
+        """
+        entry = (params_key(params), _tile_key(key))
+        with self.lock:
+            if entry[1] in self.index.get(entry[0], {}) or entry in self.pending:
+                return
+            if self.capacity is not None and self.used >= self.capacity:
+                return
+            slot = self.used
+            self.used += 1
+            if slot >= self.slots:
+                self.slots += self.grow
+                with open(self.path, "r+b") as f:
+                    f.truncate(self.slots * self.tile_bytes)
+                # views handed out earlier keep the old mapping of the same file alive
+                self.data = self._map()
+            self.pending.add(entry)
+        self.writer.submit(self._write, entry, slot, tile)
+
+    def load(self, params, key, generate):
+        """
+        :param generate: zero-argument function computing the tile if it is not baked
+        :return: the baked tile, or the generated one after queueing it to be baked
+        """
+        tile = self.get(params, key)
+        if tile is None:
+            tile = generate()
+            self.put(params, key, tile)
+        return tile
+
+    def _write(self, entry, slot, tile):
+        with self.lock:
+            data = self.data
+        data[slot] = tile
+        with self.lock:
+            self.index.setdefault(entry[0], {})[entry[1]] = slot
+            self.pending.discard(entry)
+            self.unflushed += 1
+            flush = self.unflushed >= self.flush_every
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the data file and then the index of every tile written so far.
+        """
+        with self.lock:
+            data = self.data
+            header = {"shape": list(self.shape), "dtype": self.dtype.name,
+                      "tiles": {k: dict(tiles) for k, tiles in self.index.items()}}
+            self.unflushed = 0
+        if data is not None:
+            data.flush()
+        # replace the index in one step so a crash leaves the old or the new one
+        with open(self.index_path + ".tmp", "w") as f:
+            json.dump(header, f)
+        os.replace(self.index_path + ".tmp", self.index_path)
+
+    def close(self):
+        """
+        Finish the queued writes and save the index.
+        """
+        self.writer.shutdown(wait=True)
+        self.flush()
+
+    def stats(self):
+        return {
+            "tiles": len(self),
+            "slots": self.slots,
+            "pending": len(self.pending),
+            "bytes": self.slots * self.tile_bytes,
+        }
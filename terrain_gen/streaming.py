@@ -0,0 +1,213 @@
+"""
+Ring buffer of streamed terrain rows.
+
+A RowRing keeps rows of vertices in one vertex buffer used as a ring, with a
+float32 NumPy staging array of the same layout on the CPU side. New rows are
+written straight into their slot of the staging array (row() hands out the
+view), write() records the slot as the newest one, and flush() uploads every
+row written since the last flush in one go, once per frame:
+
+    slot = ring.advance()
+    generate_row(out=ring.row(slot))
+    ring.write(slot)
+    ...
+    ring.flush()
+    ring.draw(visible)
+
+Only the rows written since the last flush are sent, as contiguous runs of
+rows, except with orphan:
+
+    map       glMapBufferRange with GL_MAP_INVALIDATE_RANGE_BIT over each
+              run, copied from the staging array; never waits for the GPU
+              to finish drawing the old contents (default)
+    subdata   plain glBufferSubData per run, which may stall
+    orphan    glBufferData(None) hands the old storage to the driver, which
+              loses its contents, so the whole staging array goes into the
+              fresh storage; for drivers where mapping is slow
+
+The index buffer joins every row to the next one (block b joins rows b and
+b + 1, see mesh.ring_indices) and never changes. draw() submits the blocks
+from the oldest row to the newest as at most two contiguous index ranges,
+the ones after the newest row and the ones before it, so wrapping round the
+ring needs no reordering; the block joining the newest row back to the
+oldest one is left out.
+
+All GL calls go through the gl object given to the constructor, OpenGL.GL
+by default, so a recording stand-in can check what would be sent.
+"""
+import ctypes
+
+import numpy as np
+
+from .mesh import index_runs
+
+UPLOADS = ("map", "subdata", "orphan")
+
+
+class RowRing(object):
+
+    def __init__(self, rows, row_vertices, components=3, upload="map", gl=None):
+        """
+        :param rows: number of rows in the ring
+        :param row_vertices: vertices per row
+        :param components: floats per vertex
+        :param upload: one of UPLOADS
+        :param gl: module or object with the OpenGL functions and constants used
+        """
+        if upload not in UPLOADS:
+            raise ValueError(f"unknown upload {upload!r}, expected one of {UPLOADS}")
+        if gl is None:
+            import OpenGL.GL as gl
+        self.gl = gl
+        self.rows = rows
+        self.row_vertices = row_vertices
+        self.upload = upload
+
+        self.staging = np.zeros((rows, row_vertices, components), dtype=np.float32)
+        self.row_bytes = self.staging[0].nbytes
+        # lowest and highest corner of the vertices of each row, for culling
+        self.bounds = np.zeros((rows, 2, components), dtype=np.float32)
+        # slot of the newest row, the oldest is the one after it
+        self.head = rows - 1
+        self.dirty = set()
+
+        self.vertex_buffer = None
+        self.index_buffer = None
+        # (first index, index count) of every block
+        self.ranges = None
+
+    def allocate(self, indices, vertices=None):
+        """
+        Create the GL buffers and upload the staging array and the ring's
+        indices, once there is a GL context.
+        :param indices: uint32 indices, the same number for every block
+        :param vertices: initial contents of every row, copied into the staging array
+        """
+        gl = self.gl
+        if vertices is not None:
+            self.staging[...] = vertices.reshape(self.staging.shape)
+        block = indices.size // self.rows
+        self.ranges = np.column_stack([np.arange(self.rows) * block, np.full(self.rows, block)])
+        for row in range(self.rows):
+            self._bound(row)
+
+        self.vertex_buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertex_buffer)
+        gl.glBufferData(gl.GL_ARRAY_BUFFER, self.staging.nbytes, self.staging, gl.GL_STREAM_DRAW)
+        self.index_buffer = gl.glGenBuffers(1)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        gl.glBufferData(gl.GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, gl.GL_STATIC_DRAW)
+        self.dirty.clear()
+
+    def advance(self):
+        """
+        :return: slot of the row after the newest one, which replaces the oldest
+        """
+        return (self.head + 1) % self.rows
+
+    def row(self, slot):
+        """
+        :return: (row_vertices, components) view of the staging array to write a row into
+        """
+        return self.staging[slot]
+
+    def write(self, slot, data=None):
+        """
+        Make slot the newest row, its contents uploaded by the next flush().
+        :param data: vertices to copy into the slot, None if they were written into row(slot)
+        """
+        if data is not None:
+            self.staging[slot] = data
+        self._bound(slot)
+        self.head = slot
+        self.dirty.add(slot)
+
+    def _bound(self, slot):
+        row = self.staging[slot]
+        row.min(axis=0, out=self.bounds[slot, 0])
+        row.max(axis=0, out=self.bounds[slot, 1])
+
+    def block_bounds(self):
+        """
+        :return: (lo, hi) (rows, components) corners of each index block, which
+            spans its row and the next one
+        """
+        lo = np.minimum(self.bounds[:, 0], np.roll(self.bounds[:, 0], -1, axis=0))
+        hi = np.maximum(self.bounds[:, 1], np.roll(self.bounds[:, 1], -1, axis=0))
+        return lo, hi
+
+    def dirty_runs(self):
+        """
+        :return: list of (first slot, slot count) of the rows written since the last flush
+        """
+        runs = []
+        for slot in sorted(self.dirty):
+            if runs and runs[-1][0] + runs[-1][1] == slot:
+                runs[-1][1] += 1
+            else:
+                runs.append([slot, 1])
+        return [tuple(run) for run in runs]
+
+    def flush(self):
+        """
+        Upload the rows written since the last flush.
+        :return: number of bytes uploaded
+        """
+        if not self.dirty:
+            return 0
+        gl = self.gl
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, self.vertex_buffer)
+        uploaded = 0
+        if self.upload == "orphan":
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, self.staging.nbytes, None, gl.GL_STREAM_DRAW)
+            gl.glBufferSubData(gl.GL_ARRAY_BUFFER, 0, self.staging.nbytes, self.staging)
+            uploaded = self.staging.nbytes
+        else:
+            for first, count in self.dirty_runs():
+                offset = first * self.row_bytes
+                size = count * self.row_bytes
+                rows = self.staging[first:first + count]
+                if self.upload == "map":
+                    pointer = gl.glMapBufferRange(gl.GL_ARRAY_BUFFER, offset, size,
+                                                  gl.GL_MAP_WRITE_BIT | gl.GL_MAP_INVALIDATE_RANGE_BIT)
+                    ctypes.memmove(_address(pointer), rows.ctypes.data, size)
+                    gl.glUnmapBuffer(gl.GL_ARRAY_BUFFER)
+                else:
+                    gl.glBufferSubData(gl.GL_ARRAY_BUFFER, offset, size, rows)
+                uploaded += size
+        self.dirty.clear()
+        return uploaded
+
+    def runs(self, visible=None):
+        """
+        :param visible: bool array of the blocks to draw, all of them if None
+        :return: list of (first index, index count) in oldest to newest order,
+            at most two when every block is visible
+        """
+        older = np.arange(self.head + 1, self.rows)
+        newer = np.arange(self.head)
+        if visible is not None:
+            older = older[visible[older]]
+            newer = newer[visible[newer]]
+        return index_runs(self.ranges, older) + index_runs(self.ranges, newer)
+
+    def draw(self, visible=None):
+        """
+        Draw the ring's triangles, with the vertex attributes already pointing
+        into vertex_buffer.
+        :return: number of indices drawn
+        """
+        gl = self.gl
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
+        drawn = 0
+        for first, count in self.runs(visible):
+            gl.glDrawElements(gl.GL_TRIANGLES, count, gl.GL_UNSIGNED_INT, ctypes.c_void_p(first * 4))
+            drawn += count
+        return drawn
+
+
+def _address(pointer):
+    # PyOpenGL hands back mapped pointers as ints or as ctypes pointers depending on version
+    if isinstance(pointer, int):
+        return pointer
+    return ctypes.cast(pointer, ctypes.c_void_p).value
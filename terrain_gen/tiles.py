@@ -0,0 +1,203 @@
+"""
+Tiled world backed by an LRU tile cache.
+
+The world is cut into tile_size x tile_size tiles of heights, each generated
+with the fbm of a config.NoiseConfig on its own and kept in a TileCache keyed by (tile_x, tile_y, lod).
+Level of detail lod samples every 2**lod world cells, so a tile at lod 1
+covers four times the area of a lod 0 tile with the same number of heights,
+and can leave out the octaves too fine to show at that spacing.
+With a store.TileStore attached, tiles missing from the cache are looked up
+in the store before being generated, and generated tiles are baked into it,
+under the config's stable key so that any later run with the same config
+reads them back.
+"""
+import math
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+TileKey = namedtuple("TileKey", ["tile_x", "tile_y", "lod"])
+
+
+def lod_octaves(octaves, lod, lacunarity=2.0):
+    """
+    Number of octaves worth generating at a level of detail: every level
+    doubles the sample spacing, which hides the octaves whose frequency went
+    up by less than that factor since the finest octave kept.
+    :return: the first n octaves to keep, at least 1
+    """
+    if lod <= 0 or lacunarity <= 1:
+        return octaves
+    return max(octaves - math.ceil(lod * math.log(2) / math.log(lacunarity)), 1)
+
+
+class TileCache(object):
+    """
+    Least recently used cache of tile arrays bounded by total size in bytes.
+    """
+
+    def __init__(self, budget=64 * 1024 * 1024):
+        """
+        :param budget: maximum number of bytes of tile data kept resident
+        """
+        self.budget = budget
+        self.tiles = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def __contains__(self, key):
+        return key in self.tiles
+
+    def get(self, key):
+        """
+        :return: the cached tile (marked as most recently used) or None
+        """
+        tile = self.tiles.get(key)
+        if tile is None:
+            self.misses += 1
+            return None
+        self.tiles.move_to_end(key)
+        self.hits += 1
+        return tile
+
+    def put(self, key, tile):
+        old = self.tiles.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self.tiles[key] = tile
+        self.nbytes += tile.nbytes
+        # never evict the tile that was just added, even if it alone exceeds the budget
+        while self.nbytes > self.budget and len(self.tiles) > 1:
+            _, evicted = self.tiles.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        self.tiles.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            "tiles": len(self.tiles),
+            "bytes": self.nbytes,
+            "budget": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TiledWorld(object):
+    """
+    Infinite fbm heightfield generated and cached one tile at a time.
+    """
+
+    def __init__(self, tile_size, noise, decimate=False, cache=None, store=None, workers=None):
+        """
+        :param noise: config.NoiseConfig of the heights
+        :param decimate: generate only lod_octaves() octaves for tiles with lod > 0
+        :param cache: TileCache of resident tiles, a new one if None
+        :param store: optional store.TileStore of (tile_size, tile_size) tiles
+        :param workers: threads generating bands of rows of each tile, see kernel.fbm
+        """
+        self.tile_size = tile_size
+        self.noise = noise
+        self.decimate = decimate
+        self.cache = cache if cache is not None else TileCache()
+        self.store = store
+        self.workers = workers
+
+    def params(self):
+        """
+        :return: the parameters the tiles depend on, in TiledWorld argument order
+        """
+        return (self.tile_size, self.noise, self.decimate)
+
+    def key(self):
+        """
+        :return: stable key of params() for the store, the same in every run
+        """
+        return (self.tile_size, self.noise.key, self.decimate)
+
+    def baked(self, key):
+        """
+        :return: the tile from the store, or None if it is not baked or there is no store
+        """
+        if self.store is None:
+            return None
+        return self.store.get(self.key(), key)
+
+    def bake(self, key, tile):
+        """
+        Queue a generated tile to be written to the store, if there is one.
+        """
+        if self.store is not None:
+            self.store.put(self.key(), key, tile)
+
+    def clear(self):
+        """
+        Drop every cached tile, call after replacing noise. Baked tiles stay in
+        the store under the old config's key.
+        """
+        self.cache.clear()
+
+    def generate(self, key, out=None):
+        """
+        Compute a tile without touching the cache.
+        :param out: optional float32 (tile_size, tile_size) array to write into
+        :return: float32 array of shape (tile_size, tile_size) indexed as [x, y]
+        """
+        step = 2 ** key.lod
+        cells = np.arange(self.tile_size)
+        xs = (key.tile_x * self.tile_size + cells) * step
+        ys = (key.tile_y * self.tile_size + cells) * step
+        octaves = None
+        if self.decimate:
+            octaves = lod_octaves(self.noise.octaves, key.lod, self.noise.lacunarity)
+        return self.noise.fbm(xs, ys, octaves=octaves, out=out, workers=self.workers)
+
+    def tile(self, tile_x, tile_y, lod=0):
+        key = TileKey(tile_x, tile_y, lod)
+        tile = self.cache.get(key)
+        if tile is None:
+            tile = self.baked(key)
+            if tile is None:
+                tile = self.generate(key)
+                self.bake(key, tile)
+            self.cache.put(key, tile)
+        return tile
+
+    def blocks(self, x0, y0, width, height):
+        """
+        Split a block of cells into the parts covered by each tile.
+        :return: iterator of (tile_x, tile_y, block slices, tile slices)
+        """
+        n = self.tile_size
+        for tile_x in range(x0 // n, (x0 + width - 1) // n + 1):
+            for tile_y in range(y0 // n, (y0 + height - 1) // n + 1):
+                lo_x = max(x0, tile_x * n)
+                hi_x = min(x0 + width, (tile_x + 1) * n)
+                lo_y = max(y0, tile_y * n)
+                hi_y = min(y0 + height, (tile_y + 1) * n)
+                yield (tile_x, tile_y,
+                       (slice(lo_x - x0, hi_x - x0), slice(lo_y - y0, hi_y - y0)),
+                       (slice(lo_x - tile_x * n, hi_x - tile_x * n),
+                        slice(lo_y - tile_y * n, hi_y - tile_y * n)))
+
+    def read(self, x0, y0, out, lod=0):
+        """
+        Copy the block of heights starting at cell (x0, y0) into out, generating
+        only the tiles that are not resident.
+        :param x0: first x cell, in units of 2**lod world cells
+        :param y0: first y cell, in units of 2**lod world cells
+        :param out: 2D array to fill, its shape gives the block size
+        :return: True, the block is always complete
+        """
+        for tile_x, tile_y, block, part in self.blocks(x0, y0, *out.shape):
+            out[block] = self.tile(tile_x, tile_y, lod)[part]
+        return True
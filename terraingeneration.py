@@ -2,20 +2,49 @@ import os
 import sys
 import ctypes
 import numpy as np
-import math
 import OpenGL.GL as gl
 import OpenGL.GLUT as glut
-from perlin_noise import PerlinNoise
+
+from terrain_gen.backends import noise_backend
+from terrain_gen.culling import FrustumCuller
+from terrain_gen.flyover import generateRow, generateTerrain, ringSize, rowVertexCount
+from terrain_gen.loop import FixedStepLoop
+from terrain_gen.matrices import generatePerspective, generateRotation, generateTranslation
+from terrain_gen.overlay import draw_text
+from terrain_gen.profiling import Profiler
+from terrain_gen.shaders import createProgram, createShader
+from terrain_gen.store import TileStore
+from terrain_gen.streaming import RowRing
 
 # Initializing Global Parameters
-noise = PerlinNoise()
+noise = None
+# rows baked to disk when a seed is given on the command line
+store = None
+storeParams = None
+storePath = "flyover-grid.tiles"
+# vertex and index buffers of the mesh, rows stream into it as the terrain scrolls; how the
+# rows are uploaded is one of terrain_gen.streaming.UPLOADS
+ring = None
+ringUpload = "map"
+# rows of triangles outside the view are not drawn
+culler = FrustumCuller()
+# 'p' toggles the timing overlay, with profileOutput set to a .csv or .json path
+# every frame is recorded and written there on exit
+showProfile = False
+profileOutput = None
+profiler = Profiler(enabled=profileOutput is not None, record=profileOutput is not None)
 fieldOfView = 50
-byteOffset = 0
+# one row scrolls in per tick of the loop's clock, however late GLUT's timer fires
+loop = FixedStepLoop(0.01)
+rowOffset = 0
 perlinNoiseFactor = 0.12
-
-# Setting perlin Noise factor through Command Line Arguments
-if len(sys.argv) == 2:
-    perlinNoiseFactor = float(sys.argv[1])
+# the same seed gives the same flyover on every launch; the perlin_noise backend takes 0
+# as "pick a random seed", so seeds have to be positive
+defaultSeed = 1
+# one of terrain_gen.backends.BACKENDS: numpy, pnoise2 or perlin_noise for the old look
+noiseBackend = "numpy"
+# threads sharing each noise grid of the flyover in bands of rows, None for one
+noiseWorkers = os.cpu_count()
 
 # Paramters [ Mesh Size, Screen Reoslution, Scaling Size, Perlin Factor]
 parameters = [48, 25, 8, 4, 4, perlinNoiseFactor]
@@ -40,237 +69,47 @@ fragmentShaderCode = """
     }
     """
 
-# -- Building Data --
-def generateTerrain(value):
-    global data 
-    global noise
-    
-    data = []
-
-    halfDataX = int(value[0] * value[4] / 2)
-    halfDataY = int(value[1] * value[4] / 2)
-
-    scaledResolutionX = int(value[2] * value[4] / 2)
-    scaledResolutionY = int(value[3] * value[4] / 2)
-
-    startX = 0
-    startY = 0
-    for j in range(-halfDataY, halfDataY):
-        for i in range(-halfDataX, halfDataX):
-            iData = i / scaledResolutionX
-            jData = j / scaledResolutionY
-            nextiData = (i + 1) / scaledResolutionX
-            nextjData = (j + 1) / scaledResolutionY
-            data.append([iData, jData, mapNoise(noise([startX, startY]))])
-            data.append([iData, nextjData, mapNoise(noise([startX, (startY + value[5])]))])
-            data.append([nextiData, jData, mapNoise(noise([(startX + value[5]), startY]))])
-            startX = startX + value[5]
-        
-        startY = startY + value[5]
-        startX = 0
-
-    data = np.array(data, dtype = np.float32)
-    return data
-
-Animate function to create a dynamically flowing terrain through y-axis [called every 10 microsecond]
-def animate(offset):
-    global noise
-    global byteOffset
-    global parameters
-    global fieldOfView
-
-    offsetY = int(parameters[1] * parameters[4] / 2) + offset
-    
-    halfDataX = int(parameters[0] * parameters[4] / 2)
-
-    scaledResolutionX = int(parameters[2] * parameters[4] / 2)
-    scaledResolutionY = int(parameters[3] * parameters[4] / 2)
-
-    noOfData = 2 * halfDataX * 3
-
-    translation = generateTranslation([0.0, -offset/scaledResolutionY, 0.0])
-
-    loc = gl.glGetUniformLocation(program, "translate")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, translation)
-
-    projectionMatrix = generatePerspective()  
-
-    loc = gl.glGetUniformLocation(program, "projectionMatrix")
-    gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, projectionMatrix)
-
-    data = []
-    nextjData = (offsetY + 1) / scaledResolutionY
-    jData = offsetY / scaledResolutionY
-    startY = ((parameters[1] * parameters[4]) + offset) * parameters[5]
-    startX = 0
-    for i in range(-halfDataX, halfDataX):
-        iData = i / scaledResolutionX
-        nextiData = (i + 1) / scaledResolutionX
-        data.append([iData, jData, mapNoise(noise([startX, startY]))])
-        data.append([iData, nextjData, mapNoise(noise([startX, (startY + parameters[5])]))])
-        data.append([nextiData, jData, mapNoise(noise([(startX + parameters[5]), startY]))])
-        startX = startX + parameters[5]
-    data = np.array(data, dtype = np.float32)
-
-    rowBytes = noOfData * data.strides[0]
-    maxBuffer = int(parameters[1] * parameters[4]) -1 
-
-    # Set Byte Offset to 0 on reaching maximum bytes
-    if  byteOffset > maxBuffer:
-        byteOffset = 0
-
-    # Substitute the Buffer Data based on byte offset
-    gl.glBufferSubData(gl.GL_ARRAY_BUFFER, byteOffset * rowBytes, rowBytes, data)
-    
-    byteOffset = byteOffset + 1
-
-    # Call oneself every 10 microsecond
-    glut.glutTimerFunc(10, animate, offset + 1)
-
-# funtion to map noise values between Min and Max
-def mapNoise(noiseValue, maxMap = 1, minMap = 0.75):
-    if noiseValue > 0:
-        return noiseValue * maxMap
-    else:
-        return noiseValue * minMap
-
-# function to request and compiler shader slots from GPU
-def createShader(source, type):
-    # request shader
-    shader = gl.glCreateShader(type)
-
-    # set shader source using the code
-    gl.glShaderSource(shader, source)
-
-    gl.glCompileShader(shader)
-    if not gl.glGetShaderiv(shader, gl.GL_COMPILE_STATUS):
-        error = gl.glGetShaderInfoLog(shader).decode()
-        print(error)
-        raise RuntimeError(f"{source} shader compilation error")
-
-    return shader
-
-# function to build and activate program
-def createProgram(vertex, fragment):
-    program = gl.glCreateProgram()
-
-    # attach shader objects to the program
-    gl.glAttachShader(program, vertex)
-    gl.glAttachShader(program, fragment)
-
-    gl.glLinkProgram(program)
-    if not gl.glGetProgramiv(program, gl.GL_LINK_STATUS):
-        print(gl.glGetProgramInfoLog(program))
-        raise RuntimeError("Linking error")
-
-    # Get rid of shaders (no more needed)
-    gl.glDetachShader(program, vertex)
-    gl.glDetachShader(program, fragment)
-
-    return program
-
-# Rotation Matrix Generator
-def generateRotation(transformationData = None):
-    if not transformationData or transformationData[0] == "":
-        transformationMatrix = np.array(
-            [
-                1.0,0.0,0.0,0.0,
-                0.0,1.0,0.0,0.0,
-                0.0,0.0,1.0,0.0,
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-        return transformationMatrix
-    cTheta = np.cos(transformationData[1] / 180 * math.pi)
-    sTheta = np.sin(transformationData[1] / 180 * math.pi)
-
-    # x - axis rotation
-    if transformationData[0] == "pitch":
-        transformationMatrix = np.array(
-            [
-                1.0,0.0,0.0,0.0,
-                0.0,cTheta,-sTheta,0.0,
-                0.0,sTheta,cTheta,0.0,
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-
-    # y - axis rotation
-    elif transformationData[0] == "yaw":
-        transformationMatrix = np.array(
-            [
-                cTheta,0.0,sTheta,0.0,
-                0.0,1.0,0.0,0.0,
-                -sTheta,0.0,cTheta,0.0,
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-
-    # z - axis rotation
-    elif transformationData[0] == "roll":
-        transformationMatrix = np.array(
-            [
-                cTheta,-sTheta,0.0,0.0,
-                sTheta,cTheta,0.0,0.0,
-                0.0,0.0,1.0,0.0,
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-    
-    return transformationMatrix
-
-# Translation Matrix Generator
-def generateTranslation(translationData = None):
-    if not translationData or translationData[0] == "":
-        transformationMatrix = np.array(
-            [
-                1.0,0.0,0.0,0.0,
-                0.0,1.0,0.0,0.0,
-                0.0,0.0,1.0,0.0,
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-
-        return transformationMatrix
-
-    transformationMatrix = np.array(
-            [
-                1.0,0.0,0.0,translationData[0],
-                0.0,1.0,0.0,translationData[1],
-                0.0,0.0,1.0,translationData[2],
-                0.0,0.0,0.0,1.0,
-            ],
-            np.float32,
-        )
-
-    return transformationMatrix
-
-# Perspective Projection Generatior based on Field of View
-def generatePerspective():
-    global fieldOfView
-
-    fov = (fieldOfView * math.pi)/180
-    tanFOVHalf = np.tan(fov / 2.0)
-    f = 1/tanFOVHalf
-    projectionMatrix = np.array([f, 0.0, 0.0, 0.0,
-                                0.0, 1.0, 0.0, 0.0,
-                                0.0, 0.0, 1.0, 0.0,
-                                0.0, 0.0, 1.0, 1.0], dtype = np.float32)    
-    return projectionMatrix
-
+# Animate function to create a dynamically flowing terrain through y-axis, one row every tick
+def animate(_):
+    global rowOffset
+
+    ticks = loop.advance()
+    for _ in range(ticks):
+        scrollRow(rowOffset)
+        rowOffset = rowOffset + 1
+
+    # Upload every row of this frame in one go
+    if ticks:
+        with profiler.stage("upload"):
+            profiler.count("bytes", ring.flush())
+
+    # draw only when a row scrolled in or the view changed
+    if loop.take_redraw():
+        glut.glutPostRedisplay()
+
+    glut.glutTimerFunc(4, animate, 0)
+
+# Replace the oldest row of the ring with the row offset rows ahead
+def scrollRow(offset):
+    slot = ring.advance()
+    with profiler.stage("row"):
+        if store is None:
+            generateRow(parameters, noise, offset, out=ring.row(slot))
+            ring.write(slot)
+        else:
+            # baked rows are copied out of the mapped file into the staging row
+            ring.write(slot, store.load(storeParams, (offset,), lambda: generateRow(parameters, noise, offset)))
 
 # initialization function
 def initialize():
     global program
     global data
     global parameters
-    global vertexBuffer
+    global ring
     global fieldOfView
+    global projectionMatrix
+    global translation
+    global transformationMatrix
 
     # Enabling Depth Buffer Test
     gl.glEnable(gl.GL_DEPTH_TEST)
@@ -285,10 +124,11 @@ def initialize():
     )
     
     # building data
-    data = generateTerrain(parameters)
+    data, indices = generateTerrain(parameters, noise)
+    ring = RowRing(ringSize(parameters), rowVertexCount(parameters), upload=ringUpload)
     
     # generating projection, translation and rotation matrix
-    projectionMatrix = generatePerspective()
+    projectionMatrix = generatePerspective(fieldOfView)
     
     translationMatrix =generateTranslation([0, 0.0, 0.3])
     
@@ -300,18 +140,15 @@ def initialize():
     # make program the default program
     gl.glUseProgram(program)
 
-    # Generate Vexter Buffer
-    vertexBuffer = gl.glGenBuffers(1)
-
-    # Make this generated Buffer to be Array Buffer
-    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vertexBuffer)
+    # Generate the Vertex and Index Buffers of the ring and upload data
+    ring.allocate(indices, data)
 
     # Bind the position attribute
     stride = data.strides[0]
     offset = ctypes.c_void_p(0)
     loc = gl.glGetAttribLocation(program, "position")
     gl.glEnableVertexAttribArray(loc)
-    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vertexBuffer)
+    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, ring.vertex_buffer)
     gl.glVertexAttribPointer(loc, 3, gl.GL_FLOAT, False, stride, offset)
 
     # Bind the transformation, rotation and projection matrices to vertex shader's uniforms
@@ -324,27 +161,62 @@ def initialize():
     loc = gl.glGetUniformLocation(program, "translate")
     gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, translation)
 
-    # Upload data
-    gl.glBufferData(gl.GL_ARRAY_BUFFER, data.nbytes, data, gl.GL_DYNAMIC_DRAW)
-
 
 def display():
+    global projectionMatrix
+    global translation
+
     gl.glClear(gl.GL_COLOR_BUFFER_BIT | gl.GL_DEPTH_BUFFER_BIT)
 
+    # Slide between the last two rows by how far the clock is into the next tick
+    scaledResolutionY = int(parameters[3] * parameters[4] / 2)
+    scrolled = rowOffset - 1 + loop.alpha if rowOffset else 0.0
+    translation = generateTranslation([0.0, -scrolled/scaledResolutionY, 0.0])
+
+    loc = gl.glGetUniformLocation(program, "translate")
+    gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, translation)
+
+    projectionMatrix = generatePerspective(fieldOfView)
+
+    loc = gl.glGetUniformLocation(program, "projectionMatrix")
+    gl.glUniformMatrix4fv(loc, 1, gl.GL_TRUE, projectionMatrix)
+
     # Set Drwaing mode to Lines instead of Fill
     gl.glPolygonMode(gl.GL_FRONT_AND_BACK, gl.GL_LINE)
 
-    # Draw Traingular Meshes
-    gl.glDrawArrays(gl.GL_TRIANGLES, 0, data.shape[0])
+    # Draw the Traingular Meshes of the rows inside the view frustum
+    with profiler.stage("cull"):
+        clip = (projectionMatrix.reshape(4, 4) @ transformationMatrix[0].reshape(4, 4)
+                @ transformationMatrix[1].reshape(4, 4) @ translation.reshape(4, 4))
+        culler.begin(clip)
+        visible = culler.cull(*ring.block_bounds())
+    # Oldest rows first, in two ranges either side of the newest row
+    with profiler.stage("draw"):
+        profiler.count("vertices", ring.draw(visible))
+    profiler.count("drawn", culler.frame_drawn)
+    profiler.count("culled", culler.frame_culled)
+    if showProfile:
+        draw_text(profiler.lines())
     glut.glutSwapBuffers()
-    glut.glutPostRedisplay()
+    profiler.frame()
 
 def reshape(width, height):
     gl.glViewport(0, 0, width, height)
+    loop.invalidate()
 
 # Exit on Escape
 def keyboard(key, x, y):
+    global showProfile
+    if key == b"p":
+        showProfile = not showProfile
+        if profileOutput is None:
+            profiler.toggle()
+        loop.invalidate()
     if key == b"\x1b":
+        if store is not None:
+            store.close()
+        if profileOutput is not None:
+            profiler.dump(profileOutput)
         os._exit(1)
 
 # Track the change in Mouse Pointer on Drag to modify Field of View
@@ -358,21 +230,50 @@ def mouse(x ,y):
         fieldOfView = 70
     else:
         fieldOfView = (fieldOfView + (delX * 0.0050)) % 180
+    loop.invalidate()
+
+def main(argv=None):
+    global noise
+    global parameters
+    global store
+    global storeParams
+
+    if argv is None:
+        argv = sys.argv
 
-# GLUT init
-glut.glutInit()
-glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA | glut.GLUT_DEPTH)
-glut.glutCreateWindow("Graphics Window")
-glut.glutReshapeWindow(1920, 1080)
-glut.glutReshapeFunc(reshape)
+    # Setting perlin Noise factor, seed and noise backend through Command Line Arguments
+    if len(argv) >= 2:
+        parameters[5] = float(argv[1])
+    seed = int(argv[2]) if len(argv) >= 3 else defaultSeed
+    if seed <= 0:
+        raise ValueError(f"seed must be a positive integer, not {seed}")
+    backend = argv[3] if len(argv) >= 4 else noiseBackend
+
+    noise = noise_backend(backend, seed, noiseWorkers)
+
+    # bake the rows when a seed is given on the command line, they are the same on every launch
+    if len(argv) >= 3:
+        store = TileStore(storePath, (rowVertexCount(parameters), 3), capacity=8192)
+        storeParams = ("flyover", backend, seed, tuple(parameters))
+
+    # GLUT init
+    glut.glutInit()
+    glut.glutInitDisplayMode(glut.GLUT_DOUBLE | glut.GLUT_RGBA | glut.GLUT_DEPTH)
+    glut.glutCreateWindow("Graphics Window")
+    glut.glutReshapeWindow(1920, 1080)
+    glut.glutReshapeFunc(reshape)
+
+    initialize()
+
+    glut.glutDisplayFunc(display)
+    glut.glutPostRedisplay()
+    glut.glutTimerFunc(0, animate, 0)
+    glut.glutKeyboardFunc(keyboard)
+    glut.glutMotionFunc(mouse)
 
-initialize()
-animate(0)
+    # enter the mainloop
+    glut.glutMainLoop()
 
-glut.glutDisplayFunc(display)
-glut.glutPostRedisplay()
-glut.glutKeyboardFunc(keyboard)
-glut.glutMotionFunc(mouse)
 
-# enter the mainloop
-glut.glutMainLoop()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
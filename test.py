@@ -1,9 +1,10 @@
-import noise
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 
+from terrain_gen import fbm
+
 movement_speed = 0.3
 rotation_angle = 0.3
 
@@ -42,6 +43,7 @@ terrain_size = 200
 terrain = []
 offset = Vector(0, 0, 50)
 target_offset = Vector(0, 0, 50)
+cells = np.arange(terrain_size)
 normals = np.zeros((terrain_size, terrain_size, 3), dtype=np.float32)
 
 # Smooth interpolation factor
@@ -67,32 +69,10 @@ def animate(_):
 
 def calculate_terrain():
     global terrain
-    terrain = []
-    for y in range(terrain_size):
-        terrain.append([])
-        for x in range(terrain_size):
-            terrain[-1].append(0)
+    terrain = fbm(cells, cells, [(o.x, o.y) for o in octaveOffsets],
+                  (offset.x, offset.y), scale, persistence, lacunarity)
 
-    for y in range(terrain_size):
-        for x in range(terrain_size):
-            amplitude = 1
-            frequency = 1
-            noiseHeight = 0
-            for i in range(octaves):
-                sampleX = frequency * \
-                    (x + octaveOffsets[i].x + offset.x) / scale
-                sampleY = frequency * \
-                    (y + octaveOffsets[i].y + offset.y) / scale
-                noiseHeight += amplitude * noise.pnoise2(sampleX, sampleY)
-                amplitude *= persistence
-                frequency *= lacunarity
-            terrain[x][y] = noiseHeight
-
-    min_val = np.min(terrain)
-    max_val = np.max(terrain)
-
-    terrain = np.array(terrain)
-    np.clip(terrain, -0.71, max_val)
+    np.clip(terrain, -0.71, terrain.max(), out=terrain)
 
     calculate_normals()
 
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from terrain_gen.backends import BACKENDS, NumpyNoise, noise_backend
+from terrain_gen.flyover import generateRow, generateTerrain, mapNoise, ringSize, rowVertexCount
+from terrain_gen.perlin import PNOISE2_TOLERANCE
+
+# the terraingeneration.py flyover settings
+PARAMETERS = [48, 25, 8, 4, 4, 0.12]
+
+
+def lattice():
+    # the flyover's sample spacing, beyond the 1024 unit period of pnoise2 along y
+    return np.arange(193) * 0.12, (np.arange(0, 40) + 9000) * 0.12
+
+
+@pytest.mark.parametrize("seed", [1, 7])
+def test_numpy_grid_matches_pnoise2_backend(seed):
+    if "pnoise2" not in BACKENDS:
+        pytest.skip("the noise module is not installed")
+    xs, ys = lattice()
+    np.testing.assert_allclose(noise_backend("numpy", seed).grid(xs, ys),
+                               noise_backend("pnoise2", seed).grid(xs, ys), rtol=0, atol=PNOISE2_TOLERANCE)
+
+
+def test_numpy_grid_same_for_any_workers():
+    xs, ys = lattice()
+    expected = NumpyNoise(3).grid(xs, ys)
+    for workers in (1, 2, 5):
+        np.testing.assert_array_equal(NumpyNoise(3, workers).grid(xs, ys), expected)
+
+
+def test_perlin_noise_backend_matches_per_point_calls():
+    perlin_noise = pytest.importorskip("perlin_noise")
+    # the flyover used to call the package once per vertex
+    backend = noise_backend("perlin_noise", 4)
+    old = perlin_noise.PerlinNoise(seed=4)
+    vertices, _ = generateTerrain(PARAMETERS, backend)
+    width = rowVertexCount(PARAMETERS)
+    half_x, half_y = width // 2, ringSize(PARAMETERS) // 2
+    for index in (0, 5, 98, vertices.shape[0] - 1):
+        row, column = divmod(index, width)
+        expected = mapNoise(old([column * PARAMETERS[5], row * PARAMETERS[5]]))
+        assert vertices[index, 2] == np.float32(expected)
+        assert vertices[index, 0] == np.float32((column - half_x) / int(PARAMETERS[2] * PARAMETERS[4] / 2))
+        assert vertices[index, 1] == np.float32((row - half_y) / int(PARAMETERS[3] * PARAMETERS[4] / 2))
+
+
+@pytest.mark.parametrize("name", sorted(BACKENDS))
+def test_rows_match_terrain(name):
+    backend = noise_backend(name, 2)
+    vertices, indices = generateTerrain(PARAMETERS, backend)
+    rows = ringSize(PARAMETERS)
+    width = rowVertexCount(PARAMETERS)
+    terrain = vertices.reshape(rows, width, 3)
+    # offset -rows is the first row of the ring, generateRow counts from the row after it
+    for row in (0, 1, rows // 2, rows - 1):
+        np.testing.assert_array_equal(generateRow(PARAMETERS, backend, row - rows), terrain[row])
+    out = np.empty((width, 3), dtype=np.float32)
+    generateRow(PARAMETERS, backend, 3 - rows, out=out)
+    np.testing.assert_array_equal(out, terrain[3])
@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+from terrain_gen import bench
+
+
+def test_numpy_backend_does_not_load_numba():
+    code = ("import sys; from terrain_gen import bench; "
+            "results = bench.run([16], [2], ['numpy'], repeat=1); "
+            "assert len(results) == 5, results; sys.exit('numba' in sys.modules)")
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+def test_run_results():
+    results = bench.run([16, 24], [1, 3], ["numpy"], repeat=1)
+    assert [(r["size"], r["octaves"], r["stage"]) for r in results[:5]] == [
+        (16, 1, stage) for stage in ("generate", "normals", "colors", "mesh", "upload")]
+    assert len(results) == 2 * 2 * 5
+    assert all(r["threads"] == 1 and r["seconds"] >= 0 for r in results)
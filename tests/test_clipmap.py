@@ -0,0 +1,125 @@
+import random
+
+import numpy as np
+import pytest
+
+from terrain_gen.clipmap import Clipmap, level_indices, ring_segments
+from terrain_gen.config import NoiseConfig
+from terrain_gen.tiles import TiledWorld
+
+SIZE = 32
+LEVELS = 4
+
+
+class FlakySource(object):
+    """
+    Source that leaves a third of its reads incomplete, like a TileScheduler
+    whose tiles are still being generated.
+    """
+
+    def __init__(self, world, seed):
+        self.world = world
+        self.random = random.Random(seed)
+
+    def read(self, x0, y0, out, lod=0):
+        if self.random.random() < 1 / 3:
+            out[...] = np.nan
+            return False
+        return self.world.read(x0, y0, out, lod=lod)
+
+
+def moves(steps, seed=1):
+    # small moves both ways with a jump past every level now and then
+    rng = random.Random(seed)
+    viewer = [10.3, -7.2]
+    for step in range(steps):
+        viewer[0] += rng.uniform(-9, 9)
+        viewer[1] += rng.uniform(-9, 9)
+        if step % 100 == 99:
+            viewer[0] += rng.choice((-1, 1)) * 600
+        yield tuple(viewer)
+
+
+def direct(world, clipmap, level):
+    ox, oy = clipmap.origins[level]
+    out = np.empty((SIZE + 1, SIZE + 1), dtype=np.float32)
+    world.read(ox, oy, out, lod=level)
+    return out
+
+
+def check_level_hole(clipmap, level):
+    # the blocks left out of a level are exactly the cells the finer level covers
+    fine = clipmap.origins[level - 1]
+    origin = clipmap.origins[level]
+    hole = np.zeros((SIZE, SIZE), dtype=bool)
+    hx, hy = fine[0] // 2 - origin[0], fine[1] // 2 - origin[1]
+    hole[hx:hx + SIZE // 2, hy:hy + SIZE // 2] = True
+    drawn = np.zeros((SIZE, SIZE), dtype=bool)
+    segments = ring_segments(SIZE)
+    for block in clipmap.blocks(level):
+        (x0, x1), (y0, y1) = segments[block // 5], segments[block % 5]
+        drawn[x0:x1, y0:y1] = True
+    np.testing.assert_array_equal(drawn, ~hole)
+
+
+def test_windows_match_direct_reads():
+    world = TiledWorld(32, NoiseConfig(3, octaves=3))
+    clipmap = Clipmap(world, SIZE, LEVELS)
+    # every write is reported by take_dirty, so applying them keeps a copy in step
+    shadow = np.zeros_like(clipmap.heights)
+    for viewer in moves(300):
+        clipmap.update(viewer)
+        for level, xs, ys in clipmap.take_dirty():
+            shadow[level, xs, ys] = clipmap.heights[level, xs, ys]
+        np.testing.assert_array_equal(shadow, clipmap.heights)
+        assert clipmap.pending == []
+
+        for level in range(LEVELS):
+            np.testing.assert_array_equal(clipmap.window(level), direct(world, clipmap, level))
+            ox, oy = clipmap.origins[level]
+            step = 2 ** level
+            assert ox * step <= viewer[0] <= (ox + SIZE) * step
+            assert oy * step <= viewer[1] <= (oy + SIZE) * step
+        assert clipmap.blocks(0) is None
+        for level in range(1, LEVELS):
+            check_level_hole(clipmap, level)
+            # the finer window lies on the samples of the coarser one
+            fine = clipmap.origins[level - 1]
+            origin = clipmap.origins[level]
+            hx, hy = fine[0] // 2 - origin[0], fine[1] // 2 - origin[1]
+            np.testing.assert_array_equal(clipmap.window(level - 1)[::2, ::2],
+                                          clipmap.window(level)[hx:hx + SIZE // 2 + 1, hy:hy + SIZE // 2 + 1])
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_incomplete_reads_are_retried(seed):
+    world = TiledWorld(32, NoiseConfig(3, octaves=3))
+    clipmap = Clipmap(FlakySource(world, seed), SIZE, LEVELS)
+    for viewer in moves(150, seed):
+        clipmap.update(viewer)
+        for level in range(LEVELS):
+            # every sample missing from a window is in a pending block, the rest are right
+            missing = np.zeros((SIZE + 1, SIZE + 1), dtype=bool)
+            ox, oy = clipmap.origins[level]
+            for pending_level, x0, y0, width, height in clipmap.pending:
+                if pending_level == level:
+                    missing[max(x0 - ox, 0):max(x0 + width - ox, 0), max(y0 - oy, 0):max(y0 + height - oy, 0)] = True
+            window = clipmap.window(level)
+            assert not np.isnan(window[~missing]).any()
+            np.testing.assert_array_equal(window[~missing], direct(world, clipmap, level)[~missing])
+
+    # standing still, the pending blocks are read again until none are left
+    for _ in range(50):
+        if not clipmap.pending:
+            break
+        clipmap.update(viewer)
+    assert clipmap.pending == []
+    for level in range(LEVELS):
+        np.testing.assert_array_equal(clipmap.window(level), direct(world, clipmap, level))
+
+
+def test_level_indices_cover_every_cell_once():
+    indices, ranges = level_indices(SIZE)
+    assert indices.size == SIZE * SIZE * 6
+    assert ranges[:, 1].sum() == indices.size
+    np.testing.assert_array_equal(ranges[1:, 0], np.cumsum(ranges[:-1, 1]))
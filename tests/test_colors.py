@@ -0,0 +1,44 @@
+import numpy as np
+
+from terrain_gen.bench import COLOR_HEIGHTS, PALETTE
+from terrain_gen.colors import colorize, palette_bands
+
+
+def _shader_texel(heights, band_heights, bands, smooth):
+    # heightfieldFragmentShader's texel position, in float32 like the GPU
+    texel = np.zeros(heights.shape, dtype=np.float32)
+    for i in range(bands - 1):
+        above = heights >= band_heights[i]
+        if smooth:
+            t = np.clip((heights - band_heights[i]) / (band_heights[i + 1] - band_heights[i]), 0, 1)
+            texel = np.where(above, i + t, texel)
+        else:
+            texel = np.where(above, np.float32(i + 1), texel)
+    return texel
+
+
+def _heights():
+    rng = np.random.default_rng(3)
+    heights = rng.uniform(-1.0, 1.2, 20000).astype(np.float32)
+    thresholds = np.asarray(COLOR_HEIGHTS, dtype=np.float32)
+    # on every threshold and the float32 values either side of it
+    edges = np.concatenate([np.nextafter(thresholds, -np.inf), thresholds, np.nextafter(thresholds, np.inf)])
+    return np.concatenate([heights, edges])
+
+
+def test_palette_bands_put_band_edges_where_colorize_does():
+    heights = _heights()
+    colors, band_heights = palette_bands(COLOR_HEIGHTS, PALETTE)
+    texel = _shader_texel(heights, band_heights, len(colors), smooth=False)
+    np.testing.assert_array_equal(colors[texel.astype(int)], colorize(heights, COLOR_HEIGHTS, PALETTE))
+
+
+def test_smooth_palette_bands_blend_like_colorize():
+    heights = _heights()
+    colors, band_heights = palette_bands(COLOR_HEIGHTS, PALETTE, smooth=True)
+    texel = _shader_texel(heights, band_heights, len(colors), smooth=True)
+    # what linear filtering between texel centres gives
+    low = np.minimum(np.floor(texel).astype(int), len(colors) - 2)
+    t = (texel - low)[:, None]
+    blended = colors[low] * (1 - t) + colors[low + 1] * t
+    np.testing.assert_allclose(blended, colorize(heights, COLOR_HEIGHTS, PALETTE, smooth=True), atol=1e-5)
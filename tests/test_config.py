@@ -0,0 +1,50 @@
+import numpy as np
+
+from terrain_gen.config import OFFSET_RANGE, NoiseConfig, octave_offsets_for_seed
+from terrain_gen.export import main as export_main
+from terrain_gen.tiles import TiledWorld
+
+
+def test_equal_configs_share_hash_and_key():
+    a = NoiseConfig(7, octaves=4, scale=15, persistence=0.5, lacunarity=2)
+    b = NoiseConfig(7, octaves=4, scale=15.0, persistence=0.5, lacunarity=2.0)
+    assert a == b
+    assert hash(a) == hash(b)
+    assert a.key == b.key
+    assert len({a, b}) == 1
+    assert NoiseConfig(7, octaves=4, offsets=a.offsets) == a
+
+
+def test_replace_changes_key():
+    config = NoiseConfig(7, octaves=4)
+    assert config.replace().key == config.key
+    keys = {config.key}
+    for changes in ({"scale": 20.0}, {"persistence": 0.4}, {"lacunarity": 2.5}, {"seed": 8}, {"octaves": 5}):
+        changed = config.replace(**changes)
+        assert changed != config
+        keys.add(changed.key)
+    assert len(keys) == 6
+    # new offsets for a new seed, the old ones otherwise
+    assert config.replace(seed=8).offsets == NoiseConfig(8, octaves=4).offsets
+    assert config.replace(scale=20.0).offsets == config.offsets
+
+
+def test_seeded_offsets_are_pinned():
+    # fixed by SeedSequence's design; a change here changes every world and baked store
+    assert octave_offsets_for_seed(7, 4) == [(9832.0, -6735.0), (-4790.0, 8000.0),
+                                             (-8305.0, -5829.0), (572.0, 4413.0)]
+    assert octave_offsets_for_seed(0, 2) == [(1710.0, -841.0), (761.0, -9654.0)]
+    assert NoiseConfig(7, octaves=4).key == "b80e9210fe9c7cf8"
+    offsets = np.array(octave_offsets_for_seed(123, 64))
+    assert offsets.min() >= -OFFSET_RANGE and offsets.max() < OFFSET_RANGE
+
+
+def test_export_matches_tiled_world(tmp_path):
+    path = str(tmp_path / "map.npy")
+    export_main([path, "--width", "40", "--height", "24", "--seed", "7", "--octaves", "4",
+                 "--tile-size", "16", "--workers", "1", "--quiet"])
+    world = TiledWorld(16, NoiseConfig(7, octaves=4))
+    heights = np.empty((40, 24), dtype=np.float32)
+    world.read(-3, 5, heights)
+    # the file's rows are y, the world is indexed [x, y]
+    np.testing.assert_array_equal(np.load(path)[5:, :37], heights[3:, :19].T)
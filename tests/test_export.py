@@ -0,0 +1,97 @@
+import io
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from terrain_gen.export import PngWriter, export
+from terrain_gen.perlin import fbm
+
+WIDTH = 40
+HEIGHT = 26
+OFFSETS = [(-512.0, 3071.0), (88.0, -9000.0), (4096.0, 17.0)]
+# narrower than the heights, so both ends get clipped
+RANGE = (-0.5, 0.4)
+
+
+def expected():
+    # rows of the file are y
+    return fbm(np.arange(WIDTH), np.arange(HEIGHT), OFFSETS, (0.0, 0.0), 15.0, 0.5, 2.0).T
+
+
+def read_png(data):
+    """
+    :return: (IHDR fields, uint16 samples, number of IDAT chunks), checking every chunk's CRC
+    """
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = []
+    at = 8
+    while at < len(data):
+        length, = struct.unpack(">I", data[at:at + 4])
+        kind = data[at + 4:at + 8]
+        body = data[at + 8:at + 8 + length]
+        crc, = struct.unpack(">I", data[at + 8 + length:at + 12 + length])
+        assert crc == zlib.crc32(kind + body), kind
+        chunks.append((kind, body))
+        at += 12 + length
+    kinds = [kind for kind, _ in chunks]
+    assert kinds[0] == b"IHDR" and kinds[-1] == b"IEND" and set(kinds[1:-1]) == {b"IDAT"}
+
+    header = struct.unpack(">IIBBBBB", chunks[0][1])
+    width, height = header[:2]
+    raw = zlib.decompress(b"".join(body for kind, body in chunks if kind == b"IDAT"))
+    scanlines = np.frombuffer(raw, dtype=np.uint8).reshape(height, 1 + 2 * width)
+    # filter type 0 on every row
+    assert not scanlines[:, 0].any()
+    samples = scanlines[:, 1:].copy().view(">u2").astype(np.uint16)
+    return header, samples, len(kinds) - 2
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_npy(tmp_path, workers):
+    path = str(tmp_path / "map.npy")
+    export(path, WIDTH, HEIGHT, OFFSETS, tile_size=16, workers=workers)
+    heights = np.load(path)
+    assert heights.dtype == np.float32
+    np.testing.assert_array_equal(heights, expected())
+
+
+def test_raw(tmp_path):
+    path = str(tmp_path / "map.bin")
+    export(path, WIDTH, HEIGHT, OFFSETS, fmt="raw", tile_size=16, workers=1)
+    np.testing.assert_array_equal(np.fromfile(path, dtype=np.float32).reshape(HEIGHT, WIDTH), expected())
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_png(tmp_path, workers):
+    path = str(tmp_path / "map.png")
+    export(path, WIDTH, HEIGHT, OFFSETS, tile_size=16, workers=workers, value_range=RANGE)
+    with open(path, "rb") as f:
+        header, samples, _ = read_png(f.read())
+    # 16-bit grayscale, deflate, no filter method, no interlace
+    assert header == (WIDTH, HEIGHT, 16, 0, 0, 0, 0)
+    low, high = RANGE
+    heights = np.clip(expected(), low, high)
+    np.testing.assert_array_equal(samples, np.round((heights - low) * (65535.0 / (high - low))))
+    # the range reaches both ends of the 16-bit range
+    assert samples.min() == 0 and samples.max() == 65535
+
+
+def test_png_writer_chunks():
+    # noise compresses badly, so the compressor hands out data before close()
+    rows = np.random.default_rng(3).integers(0, 65536, (60, 300)).astype(np.uint16)
+    f = io.BytesIO()
+    writer = PngWriter(f, 300, 60, chunk_size=4096)
+    for start in range(0, 60, 7):
+        writer.write_rows(rows[start:start + 7])
+    writer.close()
+    header, samples, idat = read_png(f.getvalue())
+    assert header[:2] == (300, 60)
+    assert idat > 1
+    np.testing.assert_array_equal(samples, rows)
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        export(str(tmp_path / "map.tif"), WIDTH, HEIGHT, OFFSETS)
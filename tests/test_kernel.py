@@ -0,0 +1,48 @@
+import os
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from terrain_gen import kernel
+from terrain_gen.perlin import fbm as numpy_fbm
+
+OFFSETS = [(137.0, -2048.0), (-9013.0, 511.0), (4.0, 77.0), (-600.0, -6000.0)]
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def test_importing_the_package_does_not_load_numba():
+    code = ("import sys, terrain_gen; from terrain_gen import kernel; kernel.set_threads(1); "
+            "sys.exit('numba' in sys.modules)")
+    assert subprocess.run([sys.executable, "-c", code]).returncode == 0
+
+
+@pytest.mark.parametrize("workers", [None, 1, 3])
+def test_kernel_matches_numpy_fbm_bit_for_bit(workers):
+    xs = np.arange(-20, 37)
+    ys = np.arange(5, 48)
+    expected = numpy_fbm(xs, ys, OFFSETS, (3.5, -1.25))
+    np.testing.assert_array_equal(kernel.fbm(xs, ys, OFFSETS, (3.5, -1.25), workers=workers), expected)
+
+
+@pytest.mark.parametrize("suffix", ["npy", "png"])
+def test_process_pool_after_kernel_exits(tmp_path, suffix):
+    # forked workers of a parent that ran the parallel kernel used to hang it at exit
+    script = tmp_path / "export_after_kernel.py"
+    script.write_text(textwrap.dedent(f"""
+        import numpy as np
+        from terrain_gen import kernel
+        from terrain_gen.export import export
+
+        if __name__ == "__main__":
+            kernel.fbm(np.arange(64), np.arange(64), {OFFSETS!r})
+            export({str(tmp_path / ("out." + suffix))!r}, 64, 48, {OFFSETS!r}, tile_size=32, workers=2)
+            print("exported")
+    """))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])))
+    result = subprocess.run([sys.executable, str(script)], env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "exported"
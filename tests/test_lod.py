@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from terrain_gen.config import NoiseConfig
+from terrain_gen.lod import LodTerrain
+from terrain_gen.tiles import TiledWorld
+
+PATCH = 16
+
+
+def _edges(terrain):
+    # every patch edge as (fixed axis, fixed coordinate, first, last, heights along it)
+    edges = []
+    for patch, slot in terrain.visible:
+        heights = terrain.heights[slot]
+        span = terrain.span(patch.lod)
+        origin = (patch.x, patch.y)
+        for axis in (0, 1):
+            for side in (0, PATCH):
+                along = heights[side, :] if axis == 0 else heights[:, side]
+                edges.append((axis, origin[axis] + side // PATCH * span, origin[1 - axis],
+                              origin[1 - axis] + span, along.astype(np.float64)))
+    return edges
+
+
+@pytest.mark.parametrize("viewer", [(40.0, 25.0, 10.0), (-100.0, 317.0, 30.0)])
+def test_patch_edges_meet_without_cracks(viewer):
+    world = TiledWorld(PATCH, NoiseConfig(5, octaves=6), decimate=True)
+    terrain = LodTerrain(world, PATCH, levels=4, lod_distance=32)
+    terrain.update(viewer, 200)
+    assert {patch.lod for patch, _ in terrain.visible} == {0, 1, 2, 3}
+
+    edges = _edges(terrain)
+    # each vertex on an edge has to lie on every other edge through it, linearly interpolated there
+    by_line = {}
+    for edge in edges:
+        by_line.setdefault(edge[:2], []).append(edge)
+    checked = 0
+    for line in by_line.values():
+        for _, _, first, last, heights in line:
+            positions = np.linspace(first, last, PATCH + 1)
+            for _, _, other_first, other_last, other in line:
+                inside = (positions >= other_first) & (positions <= other_last)
+                if other is heights or not inside.any():
+                    continue
+                other_positions = np.linspace(other_first, other_last, PATCH + 1)
+                expected = np.interp(positions[inside], other_positions, other)
+                np.testing.assert_allclose(heights[inside], expected, atol=1e-6)
+                checked += 1
+    assert checked > 0
@@ -0,0 +1,89 @@
+from terrain_gen.loop import FixedStepLoop
+
+
+class FakeClock(object):
+    # times below are multiples of powers of two, exact in floats
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_ticks_and_alpha():
+    clock = FakeClock()
+    loop = FixedStepLoop(0.25, clock=clock)
+    # the first call only starts the clock
+    assert loop.advance() == 0
+    assert loop.alpha == 0.0
+
+    clock.now += 0.125
+    assert loop.advance() == 0
+    assert loop.alpha == 0.5
+    assert loop.interpolate(10.0, 20.0) == 15.0
+    clock.now += 0.5
+    assert loop.advance() == 2
+    assert loop.alpha == 0.5
+    clock.now += 0.125
+    assert loop.advance() == 1
+    assert loop.alpha == 0.0
+    assert loop.ticks == 3
+    assert loop.dropped == 0.0
+
+
+def test_max_steps_drops_the_rest():
+    clock = FakeClock()
+    loop = FixedStepLoop(0.25, max_steps=3, clock=clock)
+    loop.advance()
+    # 10 ticks behind, 3 run and the other 7 are skipped
+    clock.now += 2.5625
+    assert loop.advance() == 3
+    assert loop.dropped == 7 * 0.25
+    # the fraction past the last whole tick is dropped too, the next tick starts afresh
+    assert loop.alpha == 0.0
+    clock.now += 0.3125
+    assert loop.advance() == 1
+    assert loop.alpha == 0.25
+    assert loop.ticks == 4
+    assert loop.dropped == 7 * 0.25
+
+
+def test_deadline():
+    clock = FakeClock()
+    loop = FixedStepLoop(0.25, budget=0.0078125, clock=clock)
+    loop.advance()
+    assert loop.deadline == 100.0078125
+    assert not loop.out_of_time()
+    clock.now += 0.00390625
+    assert not loop.out_of_time()
+    clock.now += 0.00390625
+    assert loop.out_of_time()
+    # every advance sets a new deadline
+    loop.advance()
+    assert not loop.out_of_time()
+
+    unlimited = FixedStepLoop(0.25, clock=clock)
+    unlimited.advance()
+    assert unlimited.deadline is None
+    clock.now += 1000
+    assert not unlimited.out_of_time()
+
+
+def test_redraw():
+    clock = FakeClock()
+    loop = FixedStepLoop(0.25, clock=clock)
+    # the first frame is drawn
+    assert loop.take_redraw()
+    assert not loop.take_redraw()
+    # no tick, nothing to draw
+    loop.advance()
+    clock.now += 0.125
+    loop.advance()
+    assert not loop.take_redraw()
+    clock.now += 0.125
+    assert loop.advance() == 1
+    assert loop.take_redraw()
+    assert not loop.take_redraw()
+    loop.invalidate()
+    assert loop.take_redraw()
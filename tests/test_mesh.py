@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from terrain_gen.clipmap import level_indices
+from terrain_gen.mesh import BlockBounds, block_bounds, block_indices, grid_indices, grid_positions, row_indices
+
+
+def _signed_areas(positions, indices):
+    corners = positions[indices.reshape(-1, 3)]
+    u = corners[:, 1] - corners[:, 0]
+    v = corners[:, 2] - corners[:, 0]
+    return u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]
+
+
+@pytest.mark.parametrize("width, height", [(2, 2), (5, 3), (26, 51)])
+def test_grid_triangles_are_all_counter_clockwise(width, height):
+    areas = _signed_areas(grid_positions(width, height), grid_indices(width, height))
+    assert np.all(areas > 0)
+
+
+def test_block_and_level_triangles_are_all_counter_clockwise():
+    indices, _, _ = block_indices(51, 51, 25)
+    assert np.all(_signed_areas(grid_positions(51, 51), indices) > 0)
+    indices, _ = level_indices(16)
+    assert np.all(_signed_areas(grid_positions(17, 17), indices) > 0)
+
+
+def test_row_triangles_are_all_counter_clockwise():
+    width, rows = 7, 4
+    # vertex (x, row) at row * width + x
+    y, x = np.meshgrid(np.arange(rows), np.arange(width), indexing="ij")
+    positions = np.stack([x, y], axis=-1).reshape(-1, 2).astype(np.float64)
+    first = np.arange(rows - 1)
+    assert np.all(_signed_areas(positions, row_indices(width, first, first + 1)) > 0)
+
+
+@pytest.mark.parametrize("width, height, block", [(200, 10, 2), (10, 200, 2), (51, 51, 25), (37, 64, 9)])
+def test_wrapped_block_bounds_match_unwrapped(width, height, block):
+    heights = np.random.default_rng(width * height).random((width, height)).astype(np.float32)
+    bounds = BlockBounds(width, height, block)
+    for wrap in [(0, 0), (width - 1, 1), (width // 3, height // 2), (1, height - 1)]:
+        lo, hi = bounds.update(heights, wrap)
+        # a toroidal field starting at wrap is the same field rolled to start at 0
+        expected_lo, expected_hi = block_bounds(np.roll(heights, (-wrap[0], -wrap[1]), axis=(0, 1)), block)
+        np.testing.assert_array_equal(lo, expected_lo)
+        np.testing.assert_array_equal(hi, expected_hi)
+    # a block covers its vertices and the first ones of the next block
+    lo, hi = block_bounds(heights, block)
+    assert lo[0, 0] == heights[:block + 1, :block + 1].min()
+    assert hi[-1, -1] == heights[(lo.shape[0] - 1) * block:, (lo.shape[1] - 1) * block:].max()
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from terrain_gen.perlin import FBM_TOLERANCE, PNOISE2_TOLERANCE, fbm, pnoise2
+
+noise = pytest.importorskip("noise")
+
+
+@pytest.mark.parametrize("extent", [2.0, 50.0, 1100.0, 20000.0])
+def test_pnoise2_matches_c_extension(extent):
+    rng = np.random.default_rng(0)
+    xs = rng.uniform(-extent, extent, 5000)
+    ys = rng.uniform(-extent, extent, 5000)
+    expected = np.array([noise.pnoise2(float(x), float(y)) for x, y in zip(xs, ys)])
+    assert np.abs(pnoise2(xs, ys) - expected).max() <= PNOISE2_TOLERANCE
+
+
+def test_fbm_matches_per_pixel_loop():
+    offsets = [(137.0, -2048.0), (-9013.0, 511.0), (4.0, 77.0), (-600.0, -6000.0),
+               (1.0, 2.0), (9999.0, -9999.0), (321.0, 123.0), (-45.0, 54.0)]
+    size = 24
+    expected = np.empty((size, size))
+    for x in range(size):
+        for y in range(size):
+            amplitude, frequency, total = 1.0, 1.0, 0.0
+            for ox, oy in offsets:
+                total += amplitude * noise.pnoise2(frequency * (x + ox) / 15.0, frequency * (y + oy) / 15.0)
+                amplitude *= 0.5
+                frequency *= 2.0
+            expected[x, y] = total
+    heights = fbm(np.arange(size), np.arange(size), offsets)
+    assert np.abs(heights - expected).max() <= FBM_TOLERANCE
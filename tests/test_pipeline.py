@@ -0,0 +1,111 @@
+import contextlib
+import math
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from terrain_gen.bench import COLOR_HEIGHTS, FLATTENING_THRESHOLD, HEIGHT_SCALE, PALETTE
+from terrain_gen.colors import colorize
+from terrain_gen.config import NoiseConfig
+from terrain_gen.mesh import GridMesh
+from terrain_gen.normals import normal_map
+from terrain_gen.pipeline import ScrollingTerrain
+from terrain_gen.tiles import TiledWorld
+
+# ticks per lap of the closed loop, each moving about STEP cells
+FRAMES = 24
+STEP = 5
+# view sizes compared, both past the cached small ints (-5..256) so that the
+# slices and indices a tick creates are the same Python objects at either size
+SMALL = 300
+LARGE = 900
+
+
+def terrain(size, normal_method="central"):
+    world = TiledWorld(64, NoiseConfig(1, octaves=3))
+    # as many cull blocks at every size, only the arrays grow with it
+    return ScrollingTerrain(size, world, COLOR_HEIGHTS, PALETTE, HEIGHT_SCALE, FLATTENING_THRESHOLD,
+                            block=size // 8, normal_method=normal_method)
+
+
+def lap(terrain, staging):
+    # a figure of eight, over the same cells, and so the same cached tiles, every lap
+    radius = FRAMES * STEP / (2 * math.pi)
+    for frame in range(FRAMES):
+        angle = 2 * math.pi * frame / FRAMES
+        if terrain.scroll_to(radius * math.cos(angle), radius * math.sin(2 * angle)):
+            terrain.update_normals()
+            terrain.update_colors()
+            terrain.update_mesh()
+            np.copyto(staging, terrain.mesh.vertices)
+
+
+def traced_peak(terrain, staging, laps):
+    # peak bytes allocated on top of what was allocated when the laps started
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    for _ in range(laps):
+        lap(terrain, staging)
+    return tracemalloc.get_traced_memory()[1] - start
+
+
+@contextlib.contextmanager
+def warmed(terrain, staging):
+    # the first lap generates the tiles, the first traced one replaces the
+    # objects (last dirty slices, NumPy's argument caches) that predate tracing
+    lap(terrain, staging)
+    tracemalloc.start()
+    try:
+        lap(terrain, staging)
+        yield
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize("normal_method", ["central", "sobel"])
+def test_steady_ticks_keep_no_arrays(normal_method):
+    scrolling = terrain(SMALL, normal_method)
+    staging = np.empty_like(scrolling.mesh.vertices)
+    arrays = tracemalloc.DomainFilter(True, np.lib.tracemalloc_domain)
+    with warmed(scrolling, staging):
+        before = tracemalloc.take_snapshot().filter_traces([arrays])
+        short = traced_peak(scrolling, staging, 1)
+        long = traced_peak(scrolling, staging, 3)
+        after = tracemalloc.take_snapshot().filter_traces([arrays])
+
+    # no array allocated by the ticks is still alive...
+    assert [d for d in after.compare_to(before, "lineno") if d.size_diff > 0] == []
+    # ...and three times the ticks peak no higher than one lap of them, nothing builds up
+    assert long <= short
+
+
+def test_steady_peak_independent_of_size():
+    peaks = {}
+    for size in (SMALL, LARGE):
+        scrolling = terrain(size)
+        staging = np.empty_like(scrolling.mesh.vertices)
+        with warmed(scrolling, staging):
+            peaks[size] = traced_peak(scrolling, staging, 1)
+    # what a tick allocates is Python objects (slices, tuples, views) of a
+    # few KiB, the same at any size. Any temporary array a tick made, even
+    # one bool per cell of a single scrolled-in row, would be LARGE - SMALL
+    # bytes bigger at LARGE; the peaks are measured equal, this is the bound
+    assert abs(peaks[LARGE] - peaks[SMALL]) < LARGE - SMALL
+
+
+def test_matches_whole_view():
+    scrolling = terrain(64)
+    staging = np.empty_like(scrolling.mesh.vertices)
+    lap(scrolling, staging)
+    heights = scrolling.field.take()
+    assert heights.min() >= scrolling.floor
+
+    normals = normal_map(heights)
+    colors = colorize(heights, COLOR_HEIGHTS, PALETTE)
+    assert np.array_equal(scrolling.field.take(array=scrolling.normals), normals)
+    assert np.array_equal(scrolling.field.take(array=scrolling.colors), colors)
+
+    mesh = GridMesh(64, 64)
+    mesh.update(heights, normals, colors, HEIGHT_SCALE, FLATTENING_THRESHOLD)
+    assert np.array_equal(staging, mesh.vertices)
@@ -0,0 +1,96 @@
+import csv
+import json
+import types
+
+import numpy as np
+import pytest
+
+from terrain_gen import profiling
+from terrain_gen.profiling import Profiler
+
+# frames 1/64 s apart, exact in floats
+FRAME = 0.015625
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=10.0)
+    monkeypatch.setattr(profiling, "time", types.SimpleNamespace(perf_counter=lambda: clock.now))
+    return clock
+
+
+def run(profiler, clock, frames):
+    # stage "normals" takes i ms in frame i, "upload" runs every other frame
+    for i in range(1, frames + 1):
+        with profiler.stage("scroll"):
+            clock.now += 0.001
+        profiler.add("normals", i / 1000)
+        if i % 2 == 0:
+            profiler.add("upload", 0.002)
+        profiler.count("bytes", 100 * i)
+        clock.now += FRAME - 0.001
+        profiler.frame()
+
+
+def test_percentiles(clock):
+    profiler = Profiler(enabled=True, window=10)
+    run(profiler, clock, 20)
+    summary = profiler.summary()
+    # the first frame has no previous one to time it against
+    assert summary["frames"] == 10
+    assert summary["fps"] == pytest.approx(64)
+    assert summary["frame"]["p50"] == pytest.approx(FRAME * 1000)
+
+    # only the last 10 frames count, normals 11..20 ms
+    normals = summary["stages"]["normals"]
+    assert normals["p50"] == pytest.approx(15.5)
+    assert normals["p95"] == pytest.approx(11 + 0.95 * 9)
+    assert normals["p99"] == pytest.approx(11 + 0.99 * 9)
+    assert normals["mean"] == pytest.approx(15.5)
+    assert summary["stages"]["scroll"]["p95"] == pytest.approx(1.0)
+    # frames without the stage count as 0 ms
+    assert summary["stages"]["upload"]["p50"] == pytest.approx(1.0)
+    assert summary["stages"]["upload"]["mean"] == pytest.approx(1.0)
+    assert summary["counters"]["bytes"] == pytest.approx(100 * 15.5)
+    assert list(summary["stages"]) == ["scroll", "normals", "upload"]
+
+
+def test_dump(clock, tmp_path):
+    profiler = Profiler(enabled=True, record=True)
+    run(profiler, clock, 4)
+    assert len(profiler.frames) == 4
+
+    path = str(tmp_path / "frames.csv")
+    profiler.dump(path)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == ["time", "frame_ms", "scroll_ms", "normals_ms", "bytes", "upload_ms"]
+    assert rows[0]["frame_ms"] == "" and rows[0]["upload_ms"] == ""
+    assert [float(row["frame_ms"]) for row in rows[1:]] == pytest.approx([FRAME * 1000] * 3)
+    assert [float(row["normals_ms"]) for row in rows] == pytest.approx([1, 2, 3, 4])
+    assert [row["upload_ms"] for row in rows[1:]] == ["2.0", "", "2.0"]
+    assert [int(row["bytes"]) for row in rows] == [100, 200, 300, 400]
+
+    path = str(tmp_path / "frames.json")
+    profiler.dump(path)
+    with open(path) as f:
+        dumped = json.load(f)
+    assert [frame["normals_ms"] for frame in dumped["frames"]] == pytest.approx([1, 2, 3, 4])
+    assert dumped["summary"]["stages"]["normals"]["p50"] == pytest.approx(2.5)
+    assert dumped["summary"]["frames"] == 3
+
+
+def test_disabled_does_nothing(clock):
+    profiler = Profiler(record=True)
+    # one shared context manager, nothing allocated per call
+    assert profiler.stage("scroll") is profiler.stage("normals")
+    run(profiler, clock, 5)
+    assert profiler.frames == []
+    assert profiler.summary() == {"frames": 0, "stages": {}, "counters": {}}
+
+    # toggling on starts timing afresh, the pause is not a frame
+    profiler.toggle()
+    clock.now += 5.0
+    run(profiler, clock, 3)
+    assert profiler.summary()["frame"]["p99"] == pytest.approx(FRAME * 1000)
+    assert np.array_equal(profiler.stages["normals"], [0.001, 0.002, 0.003])
@@ -0,0 +1,94 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from terrain_gen.config import NoiseConfig
+from terrain_gen.scheduler import TileScheduler
+from terrain_gen.tiles import TiledWorld, TileKey
+
+TILE = 16
+
+
+class FailingNoise(NoiseConfig):
+    """
+    NoiseConfig whose tiles left of x = 0 raise in the worker, or kill it with die.
+    """
+
+    def __init__(self, die=False):
+        NoiseConfig.__init__(self, 5, octaves=3)
+        self.die = die
+
+    def fbm(self, xs, ys, offset=(0.0, 0.0), octaves=None, out=None, workers=None):
+        if xs[0] < 0:
+            if self.die:
+                os._exit(1)
+            raise RuntimeError("no heights left of x = 0")
+        return NoiseConfig.fbm(self, xs, ys, offset, octaves, out, workers)
+
+
+def settle(scheduler, timeout=60):
+    # poll until every queued tile is done, as animate does every tick
+    moved = 0
+    start = time.perf_counter()
+    while scheduler.pending:
+        assert time.perf_counter() - start < timeout
+        moved += scheduler.poll()
+        time.sleep(0.01)
+    return moved
+
+
+@pytest.fixture
+def scheduler(request):
+    scheduler = TileScheduler(TiledWorld(TILE, request.param), workers=1, slots=8, placeholder=-5.0)
+    yield scheduler
+    scheduler.shutdown()
+
+
+@pytest.mark.parametrize("scheduler", [NoiseConfig(5, octaves=3)], indirect=True)
+def test_request_poll_read(scheduler):
+    out = np.empty((20, 30), dtype=np.float32)
+    # (9, 3) to (29, 33) covers tiles 0..1 along x and 0..2 along y
+    assert not scheduler.read(9, 3, out)
+    assert np.all(out == -5.0)
+    assert len(scheduler.pending) == 6
+    assert len(scheduler.free) == 2
+
+    assert settle(scheduler) == 6
+    assert sorted(scheduler.free) == list(range(8))
+    assert scheduler.failed == 0
+    assert scheduler.read(9, 3, out)
+    expected = np.empty_like(out)
+    TiledWorld(TILE, NoiseConfig(5, octaves=3)).read(9, 3, expected)
+    np.testing.assert_array_equal(out, expected)
+
+
+@pytest.mark.parametrize("scheduler", [FailingNoise()], indirect=True)
+def test_failed_job_frees_its_slot(scheduler):
+    bad, good = TileKey(-1, 0, 0), TileKey(0, 0, 0)
+    assert scheduler.request(bad) and scheduler.request(good)
+    assert settle(scheduler) == 1
+    assert scheduler.failed == 1
+    assert sorted(scheduler.free) == list(range(8))
+    assert good in scheduler.world.cache and bad not in scheduler.world.cache
+
+    # dropped, the next read of its cells queues it again
+    out = np.empty((TILE, TILE), dtype=np.float32)
+    assert not scheduler.read(-TILE, 0, out)
+    assert bad in scheduler.pending
+    assert settle(scheduler) == 0
+    assert scheduler.failed == 2
+
+
+@pytest.mark.parametrize("scheduler", [FailingNoise(die=True)], indirect=True)
+def test_dead_worker_replaces_the_pool(scheduler):
+    assert scheduler.request(TileKey(-1, 0, 0))
+    assert settle(scheduler) == 0
+    assert scheduler.failed == 1
+    assert sorted(scheduler.free) == list(range(8))
+
+    # the broken pool is replaced on the next request
+    assert scheduler.request(TileKey(0, 0, 0))
+    assert settle(scheduler) == 1
+    assert TileKey(0, 0, 0) in scheduler.world.cache
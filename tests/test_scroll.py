@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+import pytest
+
+from terrain_gen.config import NoiseConfig
+from terrain_gen.mesh import BlockBounds, block_bounds
+from terrain_gen.normals import ScrollingNormals, normal_map, scroll_normals
+from terrain_gen.scroll import ScrollingHeightfield
+from terrain_gen.tiles import TiledWorld
+
+SIZE = 40
+
+
+def path(steps, seed=3):
+    # small steps both ways, with a few jumps past the whole view
+    rng = random.Random(seed)
+    x, y = 10.5, -20.25
+    for step in range(steps):
+        x += rng.uniform(-7, 7)
+        y += rng.uniform(-7, 7)
+        if step % 25 == 24:
+            x += rng.choice((-1, 1)) * rng.uniform(SIZE, 3 * SIZE)
+        yield x, y
+
+
+def world():
+    return TiledWorld(16, NoiseConfig(7, octaves=4))
+
+
+def test_view_matches_direct_read():
+    source = world()
+    field = ScrollingHeightfield(SIZE, source)
+    direct = np.empty((SIZE, SIZE), dtype=np.float32)
+    for x, y in path(120):
+        field.scroll_to(x, y)
+        source.read(field.origin[0], field.origin[1], direct)
+        view = field.take()
+        assert np.array_equal(view, direct)
+
+        # the blocks are views of the torus that put the view back together
+        assembled = np.full((SIZE, SIZE), np.nan, dtype=np.float32)
+        for (ax, ay), (vx, vy) in field.blocks():
+            assert np.shares_memory(field.heights[ax, ay], field.heights)
+            assembled[vx, vy] = field.heights[ax, ay]
+        assert np.array_equal(assembled, direct)
+
+        # every dirty block holds the view cells its array cells stand for,
+        # the ones view_block covers
+        wrap = field.wrap()
+        for xs, ys in field.dirty:
+            rows = (np.arange(SIZE)[xs] - wrap[0]) % SIZE
+            columns = (np.arange(SIZE)[ys] - wrap[1]) % SIZE
+            assert np.array_equal(field.heights[xs, ys], direct[np.ix_(rows, columns)])
+            vx, vy = field.view_block(xs, ys)
+            assert set(rows) <= set(range(SIZE)[vx]) and set(columns) <= set(range(SIZE)[vy])
+
+
+@pytest.mark.parametrize("method", ["central", "sobel"])
+def test_normals_match_normal_map(method):
+    field = ScrollingHeightfield(SIZE, world())
+    incremental = np.zeros((SIZE, SIZE, 3), dtype=np.float32)
+    preallocated = np.zeros((SIZE, SIZE, 3), dtype=np.float32)
+    normals = ScrollingNormals(SIZE, method)
+    for x, y in path(80):
+        field.scroll_to(x, y)
+        scroll_normals(field, incremental, method)
+        normals.update(field, preallocated)
+        expected = normal_map(field.take(), method=method)
+        assert np.array_equal(field.take(array=incremental), expected)
+        assert np.array_equal(field.take(array=preallocated), expected)
+
+
+def test_wrapped_bounds_match_view():
+    field = ScrollingHeightfield(SIZE, world())
+    bounds = BlockBounds(SIZE, SIZE, 9)
+    for x, y in path(60):
+        field.scroll_to(x, y)
+        lo, hi = bounds.update(field.heights, field.wrap())
+        expected_lo, expected_hi = block_bounds(field.take(), 9)
+        assert np.array_equal(lo, expected_lo)
+        assert np.array_equal(hi, expected_hi)
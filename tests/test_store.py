@@ -0,0 +1,114 @@
+import json
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from terrain_gen.store import TileStore, params_key
+from terrain_gen.tiles import TileKey
+
+SHAPE = (8, 8)
+PARAMS = (16, "seed 7", False)
+
+
+def tile(value):
+    return np.arange(np.prod(SHAPE), dtype=np.float32).reshape(SHAPE) + value
+
+
+def written(store):
+    # the writer is one thread, anything submitted after the puts runs after their writes
+    store.writer.submit(int).result()
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "tiles.bin")
+
+
+def test_round_trip_before_and_after_flush(path):
+    store = TileStore(path, SHAPE)
+    store.put(PARAMS, TileKey(0, 0, 0), tile(0))
+    store.put(PARAMS, TileKey(-3, 5, 1), tile(100))
+    written(store)
+    np.testing.assert_array_equal(store.get(PARAMS, TileKey(0, 0, 0)), tile(0))
+    np.testing.assert_array_equal(store.get(PARAMS, TileKey(-3, 5, 1)), tile(100))
+    assert store.get(PARAMS, TileKey(0, 1, 0)) is None
+    assert store.get((16, "seed 8", False), TileKey(0, 0, 0)) is None
+
+    store.flush()
+    np.testing.assert_array_equal(store.get(PARAMS, TileKey(0, 0, 0)), tile(0))
+    with open(path + ".json") as f:
+        assert json.load(f)["tiles"] == {params_key(PARAMS): {"0,0,0": 0, "-3,5,1": 1}}
+    store.close()
+
+
+def test_reopen_from_index(path):
+    store = TileStore(path, SHAPE)
+    for x in range(3):
+        store.put(PARAMS, TileKey(x, 0, 0), tile(x))
+    store.close()
+
+    store = TileStore(path, SHAPE)
+    assert len(store) == 3
+    for x in range(3):
+        np.testing.assert_array_equal(store.get(PARAMS, TileKey(x, 0, 0)), tile(x))
+    # new tiles go after the ones already in the file
+    store.put(PARAMS, TileKey(9, 9, 0), tile(9))
+    store.close()
+    assert TileStore(path, SHAPE).index[params_key(PARAMS)]["9,9,0"] == 3
+
+
+def test_grows_and_stops_at_capacity(path):
+    store = TileStore(path, SHAPE, capacity=5, grow=2)
+    for x in range(7):
+        store.put(PARAMS, TileKey(x, 0, 0), tile(x))
+    written(store)
+    assert store.slots == 6
+    assert os.path.getsize(path) == 6 * store.tile_bytes
+    assert len(store) == 5
+    for x in range(5):
+        np.testing.assert_array_equal(store.get(PARAMS, TileKey(x, 0, 0)), tile(x))
+    assert store.get(PARAMS, TileKey(5, 0, 0)) is None
+    store.close()
+
+
+def test_shape_mismatch(path):
+    TileStore(path, SHAPE).close()
+    with pytest.raises(ValueError):
+        TileStore(path, (16, 16))
+    with pytest.raises(ValueError):
+        TileStore(path, SHAPE, dtype=np.float64)
+
+
+def test_get_is_read_only_view(path):
+    store = TileStore(path, SHAPE)
+    store.put(PARAMS, TileKey(0, 0, 0), tile(0))
+    written(store)
+    view = store.get(PARAMS, TileKey(0, 0, 0))
+    assert not view.flags.writeable
+    assert np.shares_memory(view, store.data)
+    with pytest.raises(ValueError):
+        view[0, 0] = 1.0
+    store.close()
+
+
+def test_not_indexed_before_written(path):
+    store = TileStore(path, SHAPE)
+    release = threading.Event()
+    # hold the writer thread so the put stays queued
+    store.writer.submit(release.wait)
+    store.put(PARAMS, TileKey(0, 0, 0), tile(0))
+    assert store.get(PARAMS, TileKey(0, 0, 0)) is None
+    assert store.stats()["pending"] == 1
+    # queued tiles are not queued again
+    store.put(PARAMS, TileKey(0, 0, 0), tile(1))
+    store.flush()
+    with open(path + ".json") as f:
+        assert json.load(f)["tiles"] == {}
+
+    release.set()
+    written(store)
+    assert store.stats()["pending"] == 0
+    np.testing.assert_array_equal(store.get(PARAMS, TileKey(0, 0, 0)), tile(0))
+    store.close()
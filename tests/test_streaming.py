@@ -0,0 +1,134 @@
+import ctypes
+
+import numpy as np
+import pytest
+
+from terrain_gen.mesh import ring_indices
+from terrain_gen.streaming import UPLOADS, RowRing
+
+
+class RecordingGL(object):
+    """
+    Stand-in for OpenGL.GL that records every call and keeps the contents
+    of each buffer, so what reached the GPU can be compared with the staging array.
+    """
+    GL_ARRAY_BUFFER = 0x8892
+    GL_ELEMENT_ARRAY_BUFFER = 0x8893
+    GL_STREAM_DRAW = 0x88E0
+    GL_STATIC_DRAW = 0x88E4
+    GL_MAP_WRITE_BIT = 0x0002
+    GL_MAP_INVALIDATE_RANGE_BIT = 0x0004
+    GL_TRIANGLES = 0x0004
+    GL_UNSIGNED_INT = 0x1405
+
+    def __init__(self):
+        self.calls = []
+        self.buffers = {}
+        self.bound = {}
+
+    def glGenBuffers(self, count):
+        name = len(self.buffers) + 1
+        self.buffers[name] = None
+        return name
+
+    def glBindBuffer(self, target, name):
+        self.calls.append(("bind", target, name))
+        self.bound[target] = name
+
+    def glBufferData(self, target, size, data, usage):
+        self.calls.append(("data", target, size, data is not None))
+        store = (ctypes.c_char * size)()
+        if data is not None:
+            ctypes.memmove(store, np.ascontiguousarray(data).ctypes.data, size)
+        self.buffers[self.bound[target]] = store
+
+    def glBufferSubData(self, target, offset, size, data):
+        self.calls.append(("subdata", target, offset, size))
+        ctypes.memmove(ctypes.addressof(self.buffers[self.bound[target]]) + offset,
+                       np.ascontiguousarray(data).ctypes.data, size)
+
+    def glMapBufferRange(self, target, offset, size, access):
+        self.calls.append(("map", target, offset, size, access))
+        return ctypes.addressof(self.buffers[self.bound[target]]) + offset
+
+    def glUnmapBuffer(self, target):
+        self.calls.append(("unmap", target))
+        return True
+
+    def glDrawElements(self, mode, count, kind, offset):
+        self.calls.append(("draw", count, offset.value or 0))
+
+    def contents(self, name, dtype=np.float32):
+        return np.frombuffer(self.buffers[name], dtype=dtype)
+
+    def take(self, kind):
+        # the calls of one kind since the last take, which forgets every call
+        calls = [call[1:] for call in self.calls if call[0] == kind]
+        self.calls = []
+        return calls
+
+
+ROWS = 5
+WIDTH = 4
+
+
+def _ring(upload):
+    gl = RecordingGL()
+    ring = RowRing(ROWS, WIDTH, upload=upload, gl=gl)
+    vertices = np.arange(ROWS * WIDTH * 3, dtype=np.float32)
+    ring.allocate(ring_indices(WIDTH, ROWS), vertices)
+    gl.calls = []
+    return ring, gl
+
+
+def _write_rows(ring, count, value):
+    for _ in range(count):
+        slot = ring.advance()
+        ring.row(slot)[...] = value + slot
+        ring.write(slot)
+
+
+@pytest.mark.parametrize("upload", ["map", "subdata"])
+def test_flush_uploads_only_the_rows_written(upload):
+    ring, gl = _ring(upload)
+    row_bytes = WIDTH * 3 * 4
+    # head is the last slot, so two rows wrap to slots 0 and 1
+    _write_rows(ring, 2, 100)
+    assert ring.flush() == 2 * row_bytes
+    kind = "map" if upload == "map" else "subdata"
+    assert [call[1:3] for call in gl.take(kind)] == [(0, 2 * row_bytes)]
+    # slots 2, 3, 4 and round to 0: two runs
+    _write_rows(ring, 4, 200)
+    assert ring.flush() == 4 * row_bytes
+    assert [call[1:3] for call in gl.take(kind)] == [(0, row_bytes), (2 * row_bytes, 3 * row_bytes)]
+    np.testing.assert_array_equal(gl.contents(ring.vertex_buffer), ring.staging.ravel())
+    assert ring.flush() == 0
+    assert gl.calls == []
+
+
+def test_default_upload_maps_ranges():
+    assert RowRing(2, 2, gl=RecordingGL()).upload == "map"
+
+
+def test_orphan_replaces_the_whole_buffer():
+    ring, gl = _ring("orphan")
+    _write_rows(ring, 1, 7)
+    assert ring.flush() == ring.staging.nbytes
+    assert gl.take("data") == [(RecordingGL.GL_ARRAY_BUFFER, ring.staging.nbytes, False)]
+    np.testing.assert_array_equal(gl.contents(ring.vertex_buffer), ring.staging.ravel())
+
+
+@pytest.mark.parametrize("upload", UPLOADS)
+def test_draw_across_the_wrap_is_two_ranges_without_the_seam(upload):
+    ring, gl = _ring(upload)
+    block = 6 * (WIDTH - 1)
+    # newest row in slot 2: blocks 3, 4 (oldest first) then 0, 1; block 2 joins newest to oldest
+    _write_rows(ring, 3, 0)
+    assert ring.head == 2
+    assert ring.draw() == 4 * block
+    assert gl.take("draw") == [(2 * block, 3 * block * 4), (2 * block, 0)]
+    # with block 4 culled the older range shrinks
+    visible = np.ones(ROWS, dtype=bool)
+    visible[4] = False
+    ring.draw(visible)
+    assert gl.take("draw") == [(block, 3 * block * 4), (2 * block, 0)]
@@ -0,0 +1,72 @@
+import numpy as np
+
+from terrain_gen.config import NoiseConfig
+from terrain_gen.tiles import TileCache, TiledWorld, TileKey, lod_octaves
+
+TILE = 16
+# bytes of one float32 TILE x TILE tile
+TILE_BYTES = TILE * TILE * 4
+
+
+def tile(value):
+    return np.full((TILE, TILE), value, dtype=np.float32)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TileCache(budget=3 * TILE_BYTES)
+    for x in range(3):
+        cache.put(TileKey(x, 0, 0), tile(x))
+    # 0 is used again, so 1 is now the least recently used
+    assert cache.get(TileKey(0, 0, 0))[0, 0] == 0
+    assert cache.get(TileKey(5, 0, 0)) is None
+    cache.put(TileKey(3, 0, 0), tile(3))
+    assert TileKey(1, 0, 0) not in cache
+    assert [key.tile_x for key in cache.tiles] == [2, 0, 3]
+
+    # replacing a tile does not count it twice
+    cache.put(TileKey(2, 0, 0), tile(20))
+    assert cache.stats() == {"tiles": 3, "bytes": 3 * TILE_BYTES, "budget": 3 * TILE_BYTES,
+                             "hits": 1, "misses": 1, "evictions": 1}
+
+    # a tile larger than the budget still stays, alone
+    cache.put(TileKey(9, 9, 0), np.zeros((2 * TILE, 2 * TILE), dtype=np.float32))
+    assert list(cache.tiles) == [TileKey(9, 9, 0)]
+    assert cache.stats()["evictions"] == 4
+
+
+def test_world_counters():
+    world = TiledWorld(TILE, NoiseConfig(3, octaves=4), cache=TileCache(budget=4 * TILE_BYTES))
+    out = np.empty((20, 20), dtype=np.float32)
+    # cells 10..29 cover tiles 0 and 1 along each axis
+    world.read(10, 10, out)
+    assert world.cache.stats() == {"tiles": 4, "bytes": 4 * TILE_BYTES, "budget": 4 * TILE_BYTES,
+                                   "hits": 0, "misses": 4, "evictions": 0}
+    world.read(10, 10, out)
+    assert world.cache.stats()["hits"] == 4
+    # tiles are read x by x, so the two new ones along y push out column x = 0
+    world.read(10, 40, out[:, :4])
+    assert world.cache.stats() == {"tiles": 4, "bytes": 4 * TILE_BYTES, "budget": 4 * TILE_BYTES,
+                                   "hits": 4, "misses": 6, "evictions": 2}
+    assert set(world.cache.tiles) == {TileKey(1, 0, 0), TileKey(1, 1, 0), TileKey(0, 2, 0), TileKey(1, 2, 0)}
+
+
+def test_read_across_tiles_equals_one_fbm():
+    noise = NoiseConfig(3, octaves=4)
+    world = TiledWorld(TILE, noise)
+    out = np.empty((45, 30), dtype=np.float32)
+    assert world.read(-20, 7, out)
+    np.testing.assert_array_equal(out, noise.fbm(np.arange(-20, 25), np.arange(7, 37)))
+
+    # lod 1 samples every other world cell
+    world.read(-20, 7, out, lod=1)
+    np.testing.assert_array_equal(out, noise.fbm(np.arange(-20, 25) * 2, np.arange(7, 37) * 2))
+
+
+def test_decimated_levels_drop_octaves():
+    noise = NoiseConfig(3, octaves=6)
+    world = TiledWorld(TILE, noise, decimate=True)
+    out = np.empty((TILE, TILE), dtype=np.float32)
+    world.read(0, 0, out, lod=2)
+    assert lod_octaves(6, 2) == 4
+    cells = np.arange(TILE) * 4
+    np.testing.assert_array_equal(out, noise.fbm(cells, cells, octaves=4))